@@ -1 +1,13 @@
 FLYABLE_VERSION = "v0.1a1"
+
+
+def optimize(level: str):
+    """
+    Decorator overriding the optimization level of a function compiled by Flyable. Ex: @flyable.optimize("O0")
+    It does nothing once the program runs
+    """
+
+    def decorator(func):
+        return func
+
+    return decorator
@@ -80,13 +80,12 @@ def call_obj(visitor: ParserVisitor, func_name: str, obj: int, obj_type: lang_ty
         elif num.is_number_inquiry_func_valid(func_name, nb_args):
             result = _handle_inquiry_number_protocol(*handlers_args)
         elif _iter.is_iter_func_name(func_name) and len(args) == 0:  # Iter protocol
-            return lang_type.get_python_obj_type(hint.TypeHintRefIncr()), _iter.call_iter_protocol(visitor, func_name,
-                                                                                                   obj)
+            return lang_type.get_python_obj_type(), _iter.call_iter_protocol(visitor, func_name, obj)
         elif rich_compare.is_func_name_rich_compare(func_name) and len(args) == 1:  # Rich Compare protocol
             instance_type = fly_obj.get_py_obj_type(builder, obj)
             result = rich_compare.call_rich_compare_protocol(visitor, func_name, obj_type, obj, instance_type,
                                                              args_type, args)
-            return lang_type.get_python_obj_type(hint.TypeHintRefIncr()), result
+            return lang_type.get_python_obj_type(), result
         else:  # Python call
             result = _handle_default(*handlers_args)
 
@@ -107,7 +106,7 @@ def call_obj(visitor: ParserVisitor, func_name: str, obj: int, obj_type: lang_ty
 def _handle_binary_number_protocol(visitor: ParserVisitor, func_name: str, obj: int, obj_type: lang_type.LangType,
                                    args: list[int], args_type: list[lang_type.LangType], kwargs: dict[int, int]):
     instance_type = fly_obj.get_py_obj_type(visitor.get_builder(), obj)
-    return lang_type.get_python_obj_type(hint.TypeHintRefIncr()), num.call_number_protocol(
+    return lang_type.get_python_obj_type(), num.call_number_protocol(
         visitor, func_name, obj_type, obj, instance_type, args_type, args
     )
 
@@ -123,7 +122,7 @@ def _handle_inquiry_number_protocol(visitor: ParserVisitor, func_name: str, obj:
 def _handle_ternary_number_protocol(visitor: ParserVisitor, func_name: str, obj: int, obj_type: lang_type.LangType,
                                     args: list[int], args_type: list[lang_type.LangType], kwargs: dict[int, int]):
     instance_type = fly_obj.get_py_obj_type(visitor.get_builder(), obj)
-    return lang_type.get_python_obj_type(hint.TypeHintRefIncr()), num.call_number_protocol(
+    return lang_type.get_python_obj_type(), num.call_number_protocol(
         visitor, func_name, obj_type, obj, instance_type, args_type, args
     )
 
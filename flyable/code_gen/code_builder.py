@@ -131,6 +131,24 @@ class CodeBuilder:
         """
         return self.__make_op(14, v1, v2)
 
+    def add_overflow(self, v1: int, v2: int):
+        """
+        Signed int addition. Returns the result and a bool value set if the addition overflowed
+        """
+        return self.__make_overflow_op(18, v1, v2)
+
+    def sub_overflow(self, v1: int, v2: int):
+        """
+        Signed int substraction. Returns the result and a bool value set if the substraction overflowed
+        """
+        return self.__make_overflow_op(19, v1, v2)
+
+    def mul_overflow(self, v1: int, v2: int):
+        """
+        Signed int multiplication. Returns the result and a bool value set if the multiplication overflowed
+        """
+        return self.__make_overflow_op(20, v1, v2)
+
     def _not(self, value: int):
         """
         Not operator
@@ -183,6 +201,29 @@ class CodeBuilder:
         self.__current_block.add_br_block(block_false)
         self.writer.lock()
 
+    def cond_br_weighted(self, value: int, block_true: CodeBlock, block_false: CodeBlock, weight_true: int,
+                         weight_false: int):
+        """Same as cond_br, with the relative frequencies of the branches so the optimizer lays out the hot path first
+
+        :param value: the value checked to decide the branch to take
+        :param block_true: the block to go to if the check value was true
+        :param block_false: the block to go to if the check value was false
+        :param weight_true: how often the true branch is taken
+        :param weight_false: how often the false branch is taken
+        """
+        if self.__current_block is None:
+            raise ValueError(f"There is no current block to branch from")
+
+        self.__write_opcode(154)
+        self.writer.add_int32(value)
+        self.writer.add_int32(block_true.get_id())
+        self.writer.add_int32(block_false.get_id())
+        self.writer.add_int32(weight_true)
+        self.writer.add_int32(weight_false)
+        self.__current_block.add_br_block(block_true)
+        self.__current_block.add_br_block(block_false)
+        self.writer.lock()
+
     def gep(self, value: int, first_index: int, second_index: int):
         """llvm instruction to (G)et an (E)lement (P)ointer (GEP) from two indices
 
@@ -329,17 +370,20 @@ class CodeBuilder:
         return self.__gen_value()
 
     def ret(self, value: int):
+        self.__exit_profiler()
         self.__write_opcode(2000)
         self.writer.add_int32(value)
         self.__current_block.set_has_return(True)
         self.writer.lock()
 
     def ret_void(self):
+        self.__exit_profiler()
         self.__write_opcode(2001)
         self.__current_block.set_has_return(True)
         self.writer.lock()
 
     def ret_null(self):
+        self.__exit_profiler()
         self.__write_opcode(2002)
         self.__current_block.set_has_return(True)
         self.writer.lock()
@@ -352,9 +396,33 @@ class CodeBuilder:
         self.writer.add_str(value)
         return self.__gen_value()
 
+    def global_bytes(self, value: bytes):
+        """
+        Store the raw bytes into a constant of the data section, returning the address of the constant
+        """
+        self.__write_opcode(3001)
+        self.writer.add_int32(len(value))
+        self.writer.add_bytes(value)
+        return self.__gen_value()
+
     def func_ptr(self, func: CodeFunc):
         return self.__make_op(3002, func.get_id())
 
+    def incref(self, value: int):
+        """
+        Increment the reference counter of the object. The native layer cancels the increments paired with a decrement
+        before expanding the others inline
+        """
+        self.__write_opcode(4000)
+        self.writer.add_int32(value)
+
+    def decref(self, value: int):
+        """
+        Decrement the reference counter of the object, deallocating it once the counter reaches zero
+        """
+        self.__write_opcode(4001)
+        self.writer.add_int32(value)
+
     def phi(self, type_, values, pred_block):
 
         if len(values) != len(pred_block):
@@ -404,6 +472,11 @@ class CodeBuilder:
     def get_writer(self):
         return self.writer
 
+    def __exit_profiler(self):
+        exit_func = self.__func.get_profile_exit()
+        if exit_func is not None and not self.writer.is_lock():
+            self.call(exit_func, [])
+
     def __gen_value(self):
         new_value = self.__func.increment_value()
         self.writer.add_int32(new_value)
@@ -430,6 +503,14 @@ class CodeBuilder:
             self.writer.add_int32(v)
         return self.__gen_value()
 
+    def __make_overflow_op(self, id: int, v1: int, v2: int) -> tuple[int, int]:
+        self.__write_opcode(id)
+        self.writer.add_int32(v1)
+        self.writer.add_int32(v2)
+        result = self.__gen_value()
+        overflow = self.__gen_value()
+        return result, overflow
+
     def __write_opcode(self, opcode: int):
         if FLAG_SHOW_OPCODE_ON_EXEC.is_enabled or FLAG_SHOW_OPCODE_ON_GEN:
             stack_str = ""
@@ -440,4 +521,6 @@ class CodeBuilder:
                 stack_str += file + " / " + func_name + " / " + str(line)
                 stack_str += "\n"
             self.writer.add_str(stack_str)
+        if not self.writer.is_lock():
+            self.__func.increment_instructions_count()
         self.writer.add_int32(opcode)
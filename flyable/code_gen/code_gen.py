@@ -1,14 +1,18 @@
 from __future__ import annotations
 import copy
 import enum
+import marshal
+import os
 import platform
 from collections import OrderedDict
 from typing import TYPE_CHECKING, Any, TypeAlias, Optional
 
 import flyable.code_gen.code_type as code_type
 import flyable.code_gen.code_writer as _writer
+import flyable.code_gen.compile_profile as compile_profile
 import flyable.code_gen.library_loader as loader
 import flyable.code_gen.module as gen_module
+import flyable.code_gen.opt_profile as opt_profile
 import flyable.code_gen.runtime as runtime
 from flyable.data.comp_data import CompData
 import flyable.data.lang_func_impl as lang_func_impl
@@ -25,6 +29,28 @@ if TYPE_CHECKING:
     from flyable.parse.parser import ParserVisitor
 
 
+ATTR_CACHE_SIZE = 4
+"""Amount of types an attribute access site remembers. Must match FLYABLE_ATTR_CACHE_SIZE of the runtime"""
+
+
+def get_partition_paths(output: str, count: int):
+    """
+    Returns the paths of the objects generated by the native layer when the module is split into partitions.
+    The first partition is written at the output path itself
+    """
+    return [output] + [f"{output}.part{i}.o" for i in range(1, count)]
+
+
+FORMAT_HEADER = "**Flyable format**"
+"""Header of the code without optimization data, the only layout the native layers built before it can read"""
+
+FORMAT_HEADER_OPT = "**Flyable format 2**"
+"""Header of the code carrying the optimization profile of the module and the level and flags of each function"""
+
+FUNC_FLAG_INLINE_HINT = 1
+"""Flag of a function the native layer should inline more eagerly. Must match FUNC_FLAG_INLINE_HINT of the gen layer"""
+
+
 class Linkage(enum.IntEnum):
     INTERNAL = 1,
     EXTERNAL = 2
@@ -206,6 +232,10 @@ class CodeFunc:
         self.__return_type = CodeType()
         self.__blocks: list[CodeBlock] = []
         self.__builder = CodeBuilder(self)
+        self.__opt_level: Optional[opt_profile.OptLevel] = None
+        self.__instructions_count = 0
+        self.__profile_exit: Optional[CodeFunc] = None
+        self.__inline_hint = False
 
     def set_linkage(self, link: Linkage):
         self.__linkage = link
@@ -213,6 +243,24 @@ class CodeFunc:
     def get_linkage(self):
         return self.__linkage
 
+    def set_opt_level(self, level: Optional[opt_profile.OptLevel]):
+        """
+        Override the optimization level of the module for this function. None uses the level of the module
+        """
+        self.__opt_level = level
+
+    def get_opt_level(self):
+        return self.__opt_level
+
+    def set_inline_hint(self, hint: bool):
+        """
+        Hint the native layer that the function is worth inlining into its callers
+        """
+        self.__inline_hint = hint
+
+    def has_inline_hint(self):
+        return self.__inline_hint
+
     def set_id(self, _id: int):
         self.__id = _id
 
@@ -225,6 +273,21 @@ class CodeFunc:
     def get_return_type(self):
         return self.__return_type
 
+    def set_profile_exit(self, func: Optional[CodeFunc]):
+        """
+        Set the function called before each return of the function to leave the runtime profiler
+        """
+        self.__profile_exit = func
+
+    def get_profile_exit(self):
+        return self.__profile_exit
+
+    def increment_instructions_count(self):
+        self.__instructions_count += 1
+
+    def get_instructions_count(self):
+        return self.__instructions_count
+
     def increment_value(self):
         result = self.__value_id
         self.__value_id += 1
@@ -269,6 +332,7 @@ class CodeFunc:
 
     def clear(self):
         self.__value_id = 0
+        self.__instructions_count = 0
         self.__return_type = CodeType()
         self.__blocks = []
         self.__builder = CodeBuilder(self)
@@ -281,9 +345,21 @@ class CodeFunc:
                 result.append(e)
         return result
 
-    def write_to_code(self, writer: CodeWriter):
+    def has_opt_data(self):
+        """
+        Returns if the function overrides the optimizations of the module
+        """
+        return self.__opt_level is not None or self.__inline_hint
+
+    def write_to_code(self, writer: CodeWriter, opt_data: bool = True):
+        """
+        Write the function. The level and the flags are only written with the optimization data
+        """
         writer.add_str(self.__name)
         writer.add_int32(int(self.__linkage))
+        if opt_data:
+            writer.add_int32(int(self.__opt_level) if self.__opt_level is not None else opt_profile.DEFAULT_LEVEL)
+            writer.add_int32(FUNC_FLAG_INLINE_HINT if self.__inline_hint else 0)
         self.__return_type.write_to_code(writer)
         writer.add_int32(len(self.__args))
         for arg in self.__args:
@@ -310,6 +386,13 @@ class CodeGen:
         self.__none_var: Optional[GlobalVar] = None
         self.__method_type = None
         self.__tuple_type = None
+        self.__long_type = None
+        self.__float_type = None
+        self.__bool_type = None
+        self.__list_type = None
+        self.__range_type = None
+        self.__dict_type = None
+        self.__str_type = None
         self.__methode_type = None
         self.__build_in_module = None
         self.__python_obj_struct = None
@@ -318,7 +401,10 @@ class CodeGen:
         self.__python_func_struct = None
         self.__python_type_struct: StructType | None = None
         self.__python_function_object_struct: StructType | None = None
+        self.__attr_cache_struct: StructType | None = None
         self.__strings: dict[str, GlobalVar] = {}
+        self.__unique_vars_count = 0
+        self.__compile_profile: Optional[compile_profile.CompileProfile] = None
 
     def setup(self):
         # Create the Python object struct
@@ -351,6 +437,18 @@ class CodeGen:
         self.__python_tuple_struct.add_type(code_type.get_py_obj_ptr(self))  # ob_item
         self.add_struct(self.__python_tuple_struct)
 
+        # Create the inline cache of an attribute access site, matching FlyableAttrCache of the runtime
+        self.__attr_cache_struct = StructType("__flyable_attr_cache")
+        for i in range(ATTR_CACHE_SIZE):
+            self.__attr_cache_struct.add_type(code_type.get_int8_ptr())  # PyTypeObject* type
+            self.__attr_cache_struct.add_type(code_type.get_int32())  # unsigned int version
+            self.__attr_cache_struct.add_type(code_type.get_int32())  # int kind
+            self.__attr_cache_struct.add_type(code_type.get_int64())  # Py_ssize_t index
+            self.__attr_cache_struct.add_type(code_type.get_py_obj_ptr(self))  # PyObject* value
+            self.__attr_cache_struct.add_type(code_type.get_int64())  # Py_ssize_t keys_entries
+        self.__attr_cache_struct.add_type(code_type.get_int32())  # int next
+        self.add_struct(self.__attr_cache_struct)
+
         # Create the Python function struct
         self.__python_func_struct = StructType("__flyable_py_obj_func")
         self.__python_func_struct.add_type(code_type.get_int64())  # Py_ssize_t ob_refcnt
@@ -397,7 +495,8 @@ class CodeGen:
         # PyFunctionObject struct
         # PyObject ob_base
         self.__python_function_object_struct.add_type(code_type.get_int64())  # Py_ssize_t ob_refcnt
-        self.__python_type_struct.add_type(self.get_python_type().to_code_type().get_ptr_to())  # PyTypeObject * ob_type
+        self.__python_function_object_struct.add_type(
+            self.get_python_type().to_code_type().get_ptr_to())  # PyTypeObject * ob_type
 
         self.__python_function_object_struct.add_type(code_type.get_py_obj_ptr(self))  # PyObject * func_globals
         self.__python_function_object_struct.add_type(code_type.get_py_obj_ptr(self))  # PyObject * func_builtins
@@ -412,7 +511,6 @@ class CodeGen:
         self.__python_function_object_struct.add_type(code_type.get_py_obj_ptr(self))  # PyObject * func_weakreflist
         self.__python_function_object_struct.add_type(code_type.get_py_obj_ptr(self))  # PyObject * func_module
         self.__python_function_object_struct.add_type(code_type.get_py_obj_ptr(self))  # PyObject * func_annotattions
-        self.__python_function_object_struct.add_type(code_type.get_py_obj_ptr(self))  # PyObject * func
         self.__python_function_object_struct.add_type(code_type.get_int8_ptr())  # vectorcallfunc vectorcall
         self.__python_function_object_struct.add_type(code_type.get_int32())  # uint32_t func_version
 
@@ -436,6 +534,27 @@ class CodeGen:
         self.__method_type = self.add_global_var(
             GlobalVar("PyMethod_Type", code_type.get_py_obj(self), Linkage.EXTERNAL))
 
+        self.__long_type = self.add_global_var(
+            GlobalVar("PyLong_Type", code_type.get_py_obj(self), Linkage.EXTERNAL))
+
+        self.__float_type = self.add_global_var(
+            GlobalVar("PyFloat_Type", code_type.get_py_obj(self), Linkage.EXTERNAL))
+
+        self.__bool_type = self.add_global_var(
+            GlobalVar("PyBool_Type", code_type.get_py_obj(self), Linkage.EXTERNAL))
+
+        self.__list_type = self.add_global_var(
+            GlobalVar("PyList_Type", code_type.get_py_obj(self), Linkage.EXTERNAL))
+
+        self.__range_type = self.add_global_var(
+            GlobalVar("PyRange_Type", code_type.get_py_obj(self), Linkage.EXTERNAL))
+
+        self.__dict_type = self.add_global_var(
+            GlobalVar("PyDict_Type", code_type.get_py_obj(self), Linkage.EXTERNAL))
+
+        self.__str_type = self.add_global_var(
+            GlobalVar("PyUnicode_Type", code_type.get_py_obj(self), Linkage.EXTERNAL))
+
         self.__build_in_module = self.add_global_var(
             GlobalVar("__flyable@BuildIn@Module@", code_type.get_py_obj_ptr(self), Linkage.INTERNAL))
 
@@ -472,6 +591,18 @@ class CodeGen:
             raise Exception("Setup was not called on CodeGen")
         return self.__false_var
 
+    def has_immortal_constants(self):
+        """
+        Return if the constants are created all at once and never deallocated, instead of being created one by one
+        """
+        return self.__data.get_config("immortal_constants", False)
+
+    def has_ref_release(self):
+        """
+        Return if the reference counters are decremented, deallocating the objects no longer referenced
+        """
+        return self.__data.get_config("ref_release", False)
+
     def get_none(self) -> GlobalVar:
         """
         Return the global variable containing the None python object
@@ -493,6 +624,62 @@ class CodeGen:
             raise Exception("Setup was not called on CodeGen")
         return self.__tuple_type
 
+    def get_long_type(self):
+        """
+        Return the global variable containing the Python int type
+        """
+        if self.__long_type is None:
+            raise Exception("Setup was not called on CodeGen")
+        return self.__long_type
+
+    def get_float_type(self):
+        """
+        Return the global variable containing the Python float type
+        """
+        if self.__float_type is None:
+            raise Exception("Setup was not called on CodeGen")
+        return self.__float_type
+
+    def get_bool_type(self):
+        """
+        Return the global variable containing the Python bool type
+        """
+        if self.__bool_type is None:
+            raise Exception("Setup was not called on CodeGen")
+        return self.__bool_type
+
+    def get_list_type(self):
+        """
+        Return the global variable containing the Python list type
+        """
+        if self.__list_type is None:
+            raise Exception("Setup was not called on CodeGen")
+        return self.__list_type
+
+    def get_range_type(self):
+        """
+        Return the global variable containing the Python range type
+        """
+        if self.__range_type is None:
+            raise Exception("Setup was not called on CodeGen")
+        return self.__range_type
+
+    def get_dict_type(self):
+        """
+        Return the global variable containing the Python dict type
+        """
+        if self.__dict_type is None:
+            raise Exception("Setup was not called on CodeGen")
+        return self.__dict_type
+
+    def get_str_type(self):
+        """
+        Return the global variable containing the Python str type
+        """
+        if self.__str_type is None:
+            raise Exception("Setup was not called on CodeGen")
+        return self.__str_type
+
     def get_method_type(self):
         """
         return the global variable containing the Python method type
@@ -537,6 +724,14 @@ class CodeGen:
             raise Exception("Setup was not called on CodeGen")
         return self.__python_type_struct
 
+    def get_attr_cache_struct(self):
+        """
+        return the struct of the inline cache generated for each attribute access site
+        """
+        if self.__attr_cache_struct is None:
+            raise Exception("Setup was not called on CodeGen")
+        return self.__attr_cache_struct
+
     def get_python_function_object_struct(self):
         """
         returns the variable containing Python's PyFunctionObject struct type
@@ -607,6 +802,13 @@ class CodeGen:
         self.__global_vars[var.get_name()] = var
         return var
 
+    def add_unique_global_var(self, prefix: str, type: CodeType):
+        """
+        Create an internal global variable whose name is unique within the module, starting with the prefix
+        """
+        self.__unique_vars_count += 1
+        return self.add_global_var(GlobalVar(f"{prefix}@{self.__unique_vars_count}", type, Linkage.INTERNAL))
+
     def get_global_var(self, variable_name: str) -> GlobalVar:
         return self.__global_vars.get(variable_name, None)
 
@@ -677,10 +879,65 @@ class CodeGen:
                 else:
                     func.get_builder().ret(func.get_builder().const_null(func_return_type))
 
-    def write(self):
-        # Write all the data into a buffer to pass to the code generation native layer
-        writer = _writer.CodeWriter()
-        writer.add_str("**Flyable format**")
+    def write(self, output: str = None):
+        """
+        Send the generated code to the native layer to produce the object file.
+        The object is written at the output path if given, otherwise at the output path of the compiling data.
+        When the code streaming is enabled, the code is streamed into a file next to the output instead of being
+        gathered in memory.
+        Returns the paths of the objects written, since the native layer can split the module into many objects.
+        """
+        if output is None:
+            output = self.__data.get_config("output")
+
+        opt_profile.get_opt_profile(self.__data).check_llvm_version(loader.get_llvm_version())
+
+        profile = self.get_compile_profile()
+        if profile is not None:
+            for func in self.__funcs.values():
+                profile.add_code_func(func)
+            loader.set_profile_callback(profile.add_native_times)
+
+        try:
+            self.__write_output(output)
+        finally:
+            if profile is not None:
+                loader.set_profile_callback(None)
+
+        return get_partition_paths(output, opt_profile.get_opt_profile(self.__data).codegen_threads)
+
+    def get_compile_profile(self):
+        """
+        Returns the profile of the compilation, or None if the compilation isn't profiled
+        """
+        if self.__compile_profile is None and compile_profile.get_profile_output(self.__data) is not None:
+            self.__compile_profile = compile_profile.CompileProfile()
+        return self.__compile_profile
+
+    def __write_output(self, output: str):
+        if self.__data.get_config("stream_code", False):
+            code_path = output + ".fly"
+            try:
+                with open(code_path, "wb") as code_file:
+                    writer = _writer.CodeStreamWriter(code_file)
+                    self.__write_code(writer)
+                    writer.flush()
+                loader.call_code_generation_layer_file(code_path, output)
+            finally:
+                if os.path.isfile(code_path):
+                    os.remove(code_path)
+        else:
+            # Write all the data into a buffer to pass to the code generation native layer
+            writer = _writer.CodeWriter()
+            self.__write_code(writer)
+            loader.call_code_generation_layer(writer, output)
+
+    def __write_code(self, writer: CodeWriter | _writer.CodeStreamWriter):
+        # The code is written in the first layout when it doesn't need any optimization data, so it stays readable by
+        # the native layers built before the optimization profiles
+        opt_data = self.__data.get_config("opt_profile") is not None or \
+            any(func.has_opt_data() for func in self.__funcs.values())
+        writer.add_str(FORMAT_HEADER_OPT if opt_data else FORMAT_HEADER)
 
         # Write if it's a debug build or not
         if FLAG_SHOW_OPCODE_ON_EXEC.is_enabled:
@@ -690,6 +947,10 @@ class CodeGen:
         else:
             writer.add_int32(0)
 
+        # Write the optimizations to apply
+        if opt_data:
+            opt_profile.get_opt_profile(self.__data).write_to_code(writer)
+
         # Add structs
         writer.add_int32(len(self.__structs))
         for _struct in self.__structs:
@@ -706,15 +967,49 @@ class CodeGen:
         # Add funcs
         writer.add_int32(len(self.__funcs))
         for e in self.__funcs.values():
-            e.write_to_code(writer)
-
-        loader.call_code_generation_layer(writer, self.__data.get_config("output"))
+            e.write_to_code(writer, opt_data)
 
     def generate_main(self):
         """
         Generate Flyable program entry point.
         """
+        builder, visitor = self.__create_main()
+
+        self.__generate_module_init_content(builder, visitor, self.__data.files_iter())
+
+        self.__generate_main_end(builder)
+
+    def generate_linked_main(self, modules_init: list[str]):
+        """
+        Generate Flyable program entry point when every module lives in its own object file.
+        The entry point only calls the initialization function exported by each module object.
+        """
+        builder, visitor = self.__create_main()
+
+        for init_name in modules_init:
+            init_func = self.get_or_create_func(init_name, code_type.get_void(), [], Linkage.EXTERNAL)
+            builder.call(init_func, [])
+
+        self.__generate_main_end(builder)
+
+    def generate_module_init(self, init_name: str, files):
+        """
+        Generate the external function initializing the constants and setting the implementations of the files.
+        Python needs to be initialized before the function gets called.
+        """
+        init_func = self.get_or_create_func(init_name, code_type.get_void(), [], Linkage.EXTERNAL)
+
+        builder = CodeBuilder(init_func)
+        import flyable.parse.parser_visitor as pv
+        visitor = pv.DuckParserVisitor(self, builder)
+        entry_block = builder.create_block("Module Init Block")
+        builder.set_insert_block(entry_block)
+
+        self.__generate_module_init_content(builder, visitor, files)
 
+        builder.ret_void()
+
+    def __create_main(self):
         # Since we link we GCC even on Windows we can use main for all platforms
         main_name = "main"
         main_func = self.get_or_create_func(main_name, code_type.get_int32(),
@@ -729,13 +1024,26 @@ class CodeGen:
 
         init_func = self.get_or_create_func("Py_Initialize", code_type.get_void(), [], Linkage.EXTERNAL)
         builder.call(init_func, [])
+        return builder, visitor
 
+    def __generate_module_init_content(self, builder: CodeBuilder, visitor, files):
         # Initialize all global vars
         # Set the build-in module
         build_in_module = gen_module.import_py_module(self, builder, "builtins")
         builder.store(build_in_module, builder.global_var(self.get_build_in_module()))
 
         # Set flyable constants
+        if self.has_immortal_constants():
+            self.__generate_immortal_constants(builder, visitor)
+        else:
+            self.__generate_constants(builder, visitor)
+
+        # Create all the implementations on Python side
+        for _file in files:
+            for _func in _file.funcs_iter():
+                _func.generate_code_to_set_impl(self, builder)
+
+    def __generate_constants(self, builder: CodeBuilder, visitor):
         for key in self.__py_constants.keys():
             constant_var = builder.global_var(self.__py_constants[key])
             if isinstance(key, int):
@@ -776,13 +1084,25 @@ class CodeGen:
                 value_to_assign = runtime.py_runtime_get_string(self, builder, key)
             builder.store(value_to_assign, constant_var)
 
-        # Create all the implementations on Python side
-        for _file in self.__data.files_iter():
-            for _func in _file.funcs_iter():
-                _func.generate_code_to_set_impl(self, builder)
-
-        # Setup flyable
-        flyable_func = self.get_or_create_func("flyable_init", code_type.get_void(), [], Linkage.EXTERNAL)
+    def __generate_immortal_constants(self, builder: CodeBuilder, visitor):
+        """
+        Create all the constants with a single runtime call, unmarshalling them from a blob stored in the data section.
+        The runtime makes them immortal, so their uses don't update their reference counter
+        """
+        blob = marshal.dumps(tuple(self.__py_constants.keys()))
+        init_func = self.get_or_create_func("flyable_init_constants", code_type.get_py_obj_ptr(self),
+                                            [code_type.get_int8_ptr(), code_type.get_int64()], Linkage.EXTERNAL)
+        blob_value = builder.ptr_cast(builder.global_bytes(blob), code_type.get_int8_ptr())
+        constants = builder.call(init_func, [blob_value, builder.const_int64(len(blob))])
+        for i, constant_var in enumerate(self.__py_constants.values()):
+            item_ptr = gen_tuple.python_tuple_get_unsafe_item_ptr(visitor, lang_type.get_python_obj_type(), constants,
+                                                                  builder.const_int64(i))
+            builder.store(builder.load(item_ptr), builder.global_var(constant_var))
+
+    def __generate_main_end(self, builder: CodeBuilder):
+        # Setup flyable. Eager patching removes the frame evaluator once the executed modules got their implementations
+        init_name = "flyable_init_eager" if self.__data.get_config("eager_patching", False) else "flyable_init"
+        flyable_func = self.get_or_create_func(init_name, code_type.get_void(), [], Linkage.EXTERNAL)
         builder.call(flyable_func, [])
 
         # Start the CPython main
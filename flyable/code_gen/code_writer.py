@@ -1,4 +1,5 @@
 import struct
+from typing import BinaryIO
 
 class CodeWriter:
     """
@@ -32,8 +33,9 @@ class CodeWriter:
 
     def add_str(self, value: str):
         if not self.is_lock():
-            self.add_int32(len(value))
-            self.__data += str.encode(value)
+            encoded = str.encode(value)
+            self.add_int32(len(encoded))
+            self.__data += encoded
 
     def add_bytes(self, bytes: bytes):
         if not self.is_lock():
@@ -54,3 +56,71 @@ class CodeWriter:
 
     def __len__(self):
         return len(self.__data)
+
+
+class CodeStreamWriter:
+    """
+    Writer with the same interface as CodeWriter that streams the data into a binary file instead of keeping it.
+    The data is gathered into a small chunk and flushed to the file once the chunk is full, so the full data is never
+    held in memory. Large buffers, like the content of a block, are written straight to the file without being copied
+    into the chunk.
+    """
+
+    CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, file: BinaryIO):
+        self.__lock = False
+        self.__file = file
+        self.__chunk = bytearray()
+        self.__size = 0
+
+    def add_int32(self, value: int):
+        if not self.is_lock():
+            self.__add(value.to_bytes(4, byteorder='little', signed=True))
+
+    def add_int64(self, value: int):
+        if not self.is_lock():
+            self.__add(value.to_bytes(8, byteorder='little', signed=True))
+
+    def add_float32(self, value: float):
+        if not self.is_lock():
+            self.__add(struct.pack("f", value))
+
+    def add_float64(self, value: float):
+        if not self.is_lock():
+            self.__add(struct.pack("d", value))
+
+    def add_str(self, value: str):
+        if not self.is_lock():
+            encoded = str.encode(value)
+            self.add_int32(len(encoded))
+            self.__add(encoded)
+
+    def add_bytes(self, bytes: bytes):
+        if not self.is_lock():
+            self.__add(bytes)
+
+    def flush(self):
+        if len(self.__chunk) > 0:
+            self.__file.write(self.__chunk)
+            self.__chunk.clear()
+        self.__file.flush()
+
+    def lock(self):
+        self.__lock = True
+
+    def is_lock(self):
+        return self.__lock
+
+    def __add(self, data: bytes):
+        self.__size += len(data)
+        if len(data) >= CodeStreamWriter.CHUNK_SIZE:
+            self.flush()
+            self.__file.write(data)
+        else:
+            self.__chunk += data
+            if len(self.__chunk) >= CodeStreamWriter.CHUNK_SIZE:
+                self.flush()
+
+    def __len__(self):
+        return self.__size
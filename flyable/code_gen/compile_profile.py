@@ -0,0 +1,114 @@
+"""
+Module related to the profiling of the compilation.
+
+When a profile output is set, every implementation records the time spent visiting its AST and the size of the code
+it generates. The native layer reports back the time LLVM spends optimizing each function, so the report can point to
+the functions making the build slow. The objects are emitted for the whole module at once, so the emission time is only
+reported by the module record.
+"""
+from __future__ import annotations
+
+import csv
+import json
+import time
+from dataclasses import dataclass, asdict, fields
+from typing import TYPE_CHECKING, Iterable, Optional
+
+if TYPE_CHECKING:
+    from flyable.code_gen.code_gen import CodeFunc
+    from flyable.data.comp_data import CompData
+
+MODULE_RECORD_NAME = "@module@"
+"""Name of the record holding the costs the native layer can't attribute to a single function"""
+
+
+@dataclass
+class FuncRecord:
+    """
+    Compilation costs of a single generated function. Times are in seconds
+    """
+    name: str
+    visitor_time: float = 0.0
+    ir_bytes: int = 0
+    blocks: int = 0
+    instructions: int = 0
+    opt_time: float = 0.0
+    module_emit_time: float = 0.0
+    """Time LLVM spends emitting the objects of the module. Only set on the module record"""
+
+    def get_cost(self):
+        return self.visitor_time + self.opt_time + self.module_emit_time
+
+    def merge(self, other: FuncRecord):
+        self.visitor_time += other.visitor_time
+        self.ir_bytes += other.ir_bytes
+        self.blocks += other.blocks
+        self.instructions += other.instructions
+        self.opt_time += other.opt_time
+        self.module_emit_time += other.module_emit_time
+
+
+class CompileProfile:
+
+    def __init__(self):
+        self.__records: dict[str, FuncRecord] = {}
+        self.__visits: list[list] = []  # [name, start, time spent in nested visits]
+
+    def get_record(self, name: str):
+        record = self.__records.get(name)
+        if record is None:
+            record = self.__records[name] = FuncRecord(name)
+        return record
+
+    def add_records(self, records: Iterable[FuncRecord]):
+        for record in records:
+            self.get_record(record.name).merge(record)
+
+    def start_visit(self, name: str):
+        self.__visits.append([name, time.perf_counter(), 0.0])
+
+    def end_visit(self):
+        """
+        End the last visit started. An implementation can get parsed while visiting another one, the time of the
+        nested visit only counts for the nested implementation
+        """
+        name, start, nested_time = self.__visits.pop()
+        elapsed = time.perf_counter() - start
+        self.get_record(name).visitor_time += elapsed - nested_time
+        if len(self.__visits) > 0:
+            self.__visits[-1][2] += elapsed
+
+    def add_code_func(self, func: CodeFunc):
+        record = self.get_record(func.get_name())
+        record.ir_bytes += sum(len(block) for block in func.blocks_iter())
+        record.blocks += func.get_blocks_count()
+        record.instructions += func.get_instructions_count()
+
+    def add_native_times(self, name: str, opt_time: float, emit_time: float):
+        record = self.get_record(name if len(name) > 0 else MODULE_RECORD_NAME)
+        record.opt_time += opt_time
+        record.module_emit_time += emit_time
+
+    def get_records(self):
+        """
+        Returns the records from the most to the least costly
+        """
+        return sorted(self.__records.values(), key=lambda e: (e.get_cost(), e.ir_bytes), reverse=True)
+
+    def write(self, path: str):
+        """
+        Write the report. A path ending with .csv gets a CSV table, any other path gets a JSON list
+        """
+        records = self.get_records()
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            if path.lower().endswith(".csv"):
+                writer = csv.DictWriter(f, fieldnames=[e.name for e in fields(FuncRecord)])
+                writer.writeheader()
+                for record in records:
+                    writer.writerow(asdict(record))
+            else:
+                json.dump([asdict(record) for record in records], f, indent=4)
+
+
+def get_profile_output(data: CompData) -> Optional[str]:
+    return data.get_config("profile_output")
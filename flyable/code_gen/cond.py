@@ -19,11 +19,11 @@ def value_to_cond(visitor: ParserVisitor, value_type: lang_type.LangType, value:
 
     code_gen, builder = visitor.get_code_gen(), visitor.get_builder()
     if value_type.is_int():
-        return lang_type.get_bool_type(), builder.int_cast(value, code_type.get_int1())
+        return lang_type.get_bool_type(), builder.ne(value, builder.const_int64(0))
     elif value_type.is_bool():  # bool doesn't need conversion
         return value_type, value
     elif value_type.is_dec():
-        return lang_type.get_bool_type(), builder.int_cast(value, code_type.get_int1())
+        return lang_type.get_bool_type(), builder.ne(value, builder.const_float64(0.0))
     elif value_type.is_list():
         list_len = _list.python_list_len(visitor, value)
         return lang_type.get_bool_type(), builder.gt(list_len, builder.const_int64(0))
@@ -58,6 +58,38 @@ def raise_index_error(visitor: ParserVisitor):
     raise_exception(visitor, excp)
 
 
+def raise_runtime_error(visitor: ParserVisitor, message: str):
+    code_gen = visitor.get_code_gen()
+    builder = visitor.get_builder()
+    excp = code_gen.get_or_create_global_var("PyExc_RuntimeError", code_type.get_py_obj(code_gen),
+                                             gen.Linkage.EXTERNAL)
+    excp = builder.global_var(excp)
+    raise_exception(visitor, excp, runtime.py_runtime_get_string(code_gen, builder, message))
+
+
+def raise_zero_division_error(visitor: ParserVisitor, message: str):
+    code_gen = visitor.get_code_gen()
+    builder = visitor.get_builder()
+    excp = code_gen.get_or_create_global_var("PyExc_ZeroDivisionError", code_type.get_py_obj(code_gen),
+                                             gen.Linkage.EXTERNAL)
+    excp = builder.global_var(excp)
+    raise_exception(visitor, excp, runtime.py_runtime_get_string(code_gen, builder, message))
+
+
+def py_runtime_excp_matches_stop_iteration(visitor: ParserVisitor):
+    """
+    Generate the code returning if the raised exception is a StopIteration
+    """
+    code_gen = visitor.get_code_gen()
+    builder = visitor.get_builder()
+    stop_iteration = code_gen.get_or_create_global_var("PyExc_StopIteration", code_type.get_py_obj(code_gen),
+                                                       gen.Linkage.EXTERNAL)
+    stop_iteration = builder.ptr_cast(builder.global_var(stop_iteration), code_type.get_py_obj_ptr(code_gen))
+    matches_func = code_gen.get_or_create_func("PyErr_ExceptionMatches", code_type.get_int32(),
+                                               [code_type.get_py_obj_ptr(code_gen)], gen.Linkage.EXTERNAL)
+    return builder.call(matches_func, [stop_iteration])
+
+
 def raise_assert_error(visitor: ParserVisitor, obj):
     builder = visitor.get_builder()
     excp = visitor.get_code_gen().get_or_create_global_var("PyExc_AssertionError",
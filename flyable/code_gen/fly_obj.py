@@ -7,6 +7,7 @@ import flyable.code_gen.code_gen as gen
 import flyable.code_gen.debug as debug
 import flyable.data.lang_type as lang_type
 import flyable.code_gen.exception as excp
+import flyable.code_gen.inline_cache as inline_cache
 from flyable.code_gen.code_builder import CodeBuilder
 
 if TYPE_CHECKING:
@@ -19,62 +20,10 @@ module to handle flyable object info
 
 def py_obj_get_attr(visitor: ParserVisitor, obj: int, name: str, obj_type: int = None):
     """
-    Obtain the attribute of an object by calling get_attr or get_attro.
+    Obtain the attribute of an object through the inline cache of the site.
     If a type is supplied it will avoid loading the type again
     """
-
-    code_gen = visitor.get_code_gen()
-    builder = visitor.get_builder()
-
-    # get attr : replicate https://github.com/python/cpython/blob/main/Objects/object.c#L903
-    # First need to call get_attro, then the get_attr if get_attro is null
-
-    attr_found_var = visitor.generate_entry_block_var(code_type.get_py_obj_ptr(code_gen))
-    get_attro_block = builder.create_block("Get Attro")
-    get_attr_block = builder.create_block("Get Attr")
-    continue_block = builder.create_block("After Get")
-
-    # Get the function first
-    if obj_type is None:
-        obj_type = get_py_obj_type(visitor.get_builder(), obj)
-        obj_type = builder.ptr_cast(obj_type, code_gen.get_python_type().to_code_type().get_ptr_to())
-
-    get_attro = get_py_obj_type_getattro_ptr(visitor, obj_type)
-    get_attro = builder.load(get_attro)
-
-    null_get_attr = builder.const_null(code_type.get_int8_ptr())
-    is_attr_null = builder.eq(null_get_attr, get_attro)
-
-    builder.cond_br(is_attr_null, get_attr_block, get_attro_block)
-
-    builder.set_insert_block(get_attro_block)
-    get_attro_type = code_type.get_func(code_type.get_py_obj_ptr(code_gen),
-                                        [code_type.get_py_obj_ptr(code_gen)] * 2).get_ptr_to()
-    get_attro_func = builder.ptr_cast(get_attro, get_attro_type)
-    attribute_py_str = builder.global_var(code_gen.get_or_insert_str(name))
-    attribute_py_str = builder.load(attribute_py_str)
-    found_attro = builder.call_ptr(get_attro_func, [obj, attribute_py_str])
-    builder.store(found_attro, attr_found_var)
-    builder.br(continue_block)
-
-    builder.set_insert_block(get_attr_block)
-    get_attr = get_py_obj_type_getattr_ptr(visitor, obj_type)
-    get_attr = builder.load(get_attr)
-    get_attr_type = code_type.get_func(code_type.get_py_obj_ptr(code_gen),
-                                       [code_type.get_py_obj_ptr(code_gen), code_type.get_int8_ptr()]).get_ptr_to()
-    get_attr_func = builder.ptr_cast(get_attr, get_attr_type)
-    str_attr = builder.ptr_cast(builder.global_str(name), code_type.get_int8_ptr())
-    found_attr = builder.call_ptr(get_attr_func, [obj, str_attr])
-    builder.store(found_attr, attr_found_var)
-    builder.br(continue_block)
-
-    builder.set_insert_block(continue_block)
-
-    attr_found_var = builder.load(attr_found_var)
-
-    #excp.check_excp(visitor, attr_found_var)
-
-    return attr_found_var
+    return inline_cache.load_attr(visitor, obj, name, obj_type)
 
 
 def py_obj_set_attr(visitor: ParserVisitor, obj: int, name: str, obj_set: int, obj_type: int = None):
@@ -0,0 +1,346 @@
+"""
+Module related to the code generation of the iterations of the for loops and the comprehensions.
+
+Iterating a builtin container doesn't need the iterator protocol. Lists and tuples are walked by index over their
+items, strings by index over their characters and dicts with PyDict_Next, the items of dict.items() being unpacked
+straight into the targets. When the type of the iterable isn't known while compiling, the iteration is selected by
+guarding the exact type of the iterable once before the loop, other objects falling back on the iterator protocol.
+Every kind of iteration stores its item in its own block before jumping to the loop body, so the body is only
+generated once and the native layer can unswitch the loop on the kind.
+"""
+from __future__ import annotations
+
+import ast
+from typing import TYPE_CHECKING, Callable, Optional
+
+import flyable.code_gen.caller as caller
+import flyable.code_gen.code_gen as _gen
+import flyable.code_gen.code_type as code_type
+import flyable.code_gen.dict as gen_dict
+import flyable.code_gen.exception as excp
+import flyable.code_gen.iterator as iterator
+import flyable.code_gen.list as gen_list
+import flyable.code_gen.ref_counter as ref_counter
+import flyable.code_gen.runtime as runtime
+import flyable.code_gen.tuple as gen_tuple
+import flyable.code_gen.type as gen_type
+import flyable.data.lang_type as lang_type
+import flyable.data.type_hint as hint
+
+if TYPE_CHECKING:
+    from flyable.code_gen.code_gen import CodeBlock
+    from flyable.data.lang_type import LangType
+    from flyable.parse.parser_visitor import ParserVisitor
+
+ITER_GENERIC = 0
+ITER_LIST = 1
+ITER_TUPLE = 2
+ITER_STR = 3
+ITER_DICT = 4
+
+DICT_VIEWS = ("keys", "values", "items")
+"""Dict methods whose view is iterated directly on the dict"""
+
+
+def get_dict_view(node: ast.expr) -> Optional[tuple[ast.expr, str]]:
+    """
+    Returns the receiver and the name of the view when the node is a call to d.keys(), d.values() or d.items()
+    """
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr in DICT_VIEWS and \
+            len(node.args) == 0 and len(node.keywords) == 0:
+        return node.func.value, node.func.attr
+    return None
+
+
+def get_pair_targets(target: ast.expr) -> Optional[list[ast.expr]]:
+    """
+    Returns the two targets receiving the key and the value when the target unpacks a dict item
+    """
+    if isinstance(target, (ast.Tuple, ast.List)) and len(target.elts) == 2 and \
+            not any(isinstance(e, ast.Starred) for e in target.elts):
+        return target.elts
+    return None
+
+
+def get_iter_kinds(iterable_type: LangType, view: Optional[str]):
+    """
+    Returns the kinds of iteration the iterable can take, the generic iteration last when the type isn't known
+    """
+    if view is not None:
+        if iterable_type.is_dict():
+            return [ITER_DICT]
+        elif iterable_type.is_python_obj() and not iterable_type.is_collection() and not iterable_type.is_str():
+            return [ITER_DICT, ITER_GENERIC]
+        return [ITER_GENERIC]
+
+    if iterable_type.is_list():
+        return [ITER_LIST]
+    elif iterable_type.is_tuple():
+        return [ITER_TUPLE]
+    elif iterable_type.is_str():
+        return [ITER_STR]
+    elif iterable_type.is_dict():
+        return [ITER_DICT]
+    elif iterable_type.is_python_obj() and not iterable_type.is_collection():
+        return [ITER_LIST, ITER_TUPLE, ITER_DICT, ITER_STR, ITER_GENERIC]
+    return [ITER_GENERIC]
+
+
+class FusedIter:
+    """
+    Iteration of a for loop or of a comprehension generator, specialized on the type of the iterable.
+    Creating it visits the iterable and generates the selection of the iteration at the current insert point.
+    Each item is a reference owned by the iteration until the next item is fetched or the iteration finishes, the
+    targets taking their own reference to it
+    """
+
+    def __init__(self, visitor: ParserVisitor, iter_node: ast.expr):
+        self.__visitor = visitor
+        self.__view: Optional[str] = None
+        self.__kinds: list[int] = []
+        self.__iterable_type: Optional[LangType] = None
+        self.__iterable: Optional[int] = None
+        self.__setup(iter_node)
+
+    def get_iterable(self):
+        """
+        Returns the type and the value of the object iterated, the dict for an iteration over one of its views
+        """
+        return self.__iterable_type, self.__iterable
+
+    def __setup(self, iter_node: ast.expr):
+        visitor = self.__visitor
+        code_gen, builder = visitor.get_code_gen(), visitor.get_builder()
+        py_obj_ptr = code_type.get_py_obj_ptr(code_gen)
+
+        view = get_dict_view(iter_node)
+        if view is not None:
+            iter_node, self.__view = view
+
+        visitor.reset_last()
+        iterable_type, iterable = visitor.visit_node(iter_node)
+        iterable_type, iterable = runtime.value_to_pyobj(visitor, iterable, iterable_type)
+        if not hint.is_incremented_type(iterable_type):
+            ref_counter.ref_incr(builder, iterable_type, iterable)
+        self.__iterable_type, self.__iterable = iterable_type, iterable
+        self.__kinds = get_iter_kinds(iterable_type, self.__view)
+
+        self.__kind_var = visitor.generate_entry_block_var(code_type.get_int32())
+        self.__index_var = visitor.generate_entry_block_var(code_type.get_int64())
+        self.__size_var = visitor.generate_entry_block_var(code_type.get_int64())
+        self.__iterable_var = visitor.generate_entry_block_var(py_obj_ptr)
+        self.__iterator_var = visitor.generate_entry_block_var(py_obj_ptr)
+        self.__item_var = visitor.generate_entry_block_var(py_obj_ptr)
+        self.__second_item_var = visitor.generate_entry_block_var(py_obj_ptr)
+        self.__key_var = visitor.generate_entry_block_var(py_obj_ptr)
+        self.__value_var = visitor.generate_entry_block_var(py_obj_ptr)
+
+        builder.store(iterable, self.__iterable_var)
+        for var in (self.__iterator_var, self.__item_var, self.__second_item_var):
+            builder.store(builder.const_null(py_obj_ptr), var)
+
+        block_ready = builder.create_block("Iteration Ready")
+        for kind in self.__kinds[:-1]:
+            block_kind = builder.create_block("Iteration Setup")
+            block_other = builder.create_block("Iteration Other Kind")
+            is_kind = gen_type.py_object_has_exact_type(visitor, iterable, self.__get_kind_type(kind))
+            builder.cond_br(is_kind, block_kind, block_other)
+            builder.set_insert_block(block_kind)
+            self.__setup_kind(kind)
+            builder.br(block_ready)
+            builder.set_insert_block(block_other)
+        self.__setup_kind(self.__kinds[-1])
+        builder.br(block_ready)
+        builder.set_insert_block(block_ready)
+
+    def __get_kind_type(self, kind: int):
+        code_gen = self.__visitor.get_code_gen()
+        return {
+            ITER_LIST: code_gen.get_list_type(),
+            ITER_TUPLE: code_gen.get_tuple_type(),
+            ITER_STR: code_gen.get_str_type(),
+            ITER_DICT: code_gen.get_dict_type()
+        }[kind]
+
+    def __setup_kind(self, kind: int):
+        visitor = self.__visitor
+        code_gen, builder = visitor.get_code_gen(), visitor.get_builder()
+        iterable = builder.load(self.__iterable_var)
+        builder.store(builder.const_int32(kind), self.__kind_var)
+        builder.store(builder.const_int64(0), self.__index_var)
+
+        if kind == ITER_STR:
+            length_func = code_gen.get_or_create_func("PyUnicode_GetLength", code_type.get_int64(),
+                                                      [code_type.get_py_obj_ptr(code_gen)], _gen.Linkage.EXTERNAL)
+            builder.store(builder.call(length_func, [iterable]), self.__size_var)
+        elif kind == ITER_DICT:
+            # A dict changing size while iterated raises a RuntimeError, like its iterators do
+            builder.store(gen_dict.python_dict_len(visitor, iterable), self.__size_var)
+        elif kind == ITER_GENERIC:
+            iterable_obj = iterable
+            if self.__view is not None:
+                # Not a dict, the view is whatever the method returns
+                iterable_obj = caller.call_obj(visitor, self.__view, iterable, self.__iterable_type, [], [], {})[1]
+                excp.check_excp(visitor, iterable_obj)
+            iter_obj = iterator.call_iter_iter(visitor, iterable_obj)
+            excp.check_excp(visitor, iter_obj)
+            builder.store(iter_obj, self.__iterator_var)
+            if self.__view is not None:
+                ref_counter.ref_decr(visitor, lang_type.get_python_obj_type(), iterable_obj)
+
+    def emit_next(self, store_item: Callable[[LangType, int], None],
+                  store_pair: Optional[Callable[[int, int], None]], block_body: CodeBlock, block_end: CodeBlock):
+        """
+        Generate the code fetching the next item, storing it with store_item and jumping to the body.
+        The items of dict.items() are given to store_pair as a key and a value when it's set, instead of a tuple.
+        Once exhausted, the iteration is finished and jumps to the end block
+        """
+        builder = self.__visitor.get_builder()
+        self.release_item()
+
+        block_exhausted = builder.create_block("Iteration Exhausted")
+        for kind in self.__kinds[:-1]:
+            block_kind = builder.create_block("Iteration Next")
+            block_other = builder.create_block("Iteration Next Other Kind")
+            builder.cond_br(builder.eq(builder.load(self.__kind_var), builder.const_int32(kind)), block_kind,
+                            block_other)
+            builder.set_insert_block(block_kind)
+            self.__next_kind(kind, store_item, store_pair, block_body, block_exhausted)
+            builder.set_insert_block(block_other)
+        self.__next_kind(self.__kinds[-1], store_item, store_pair, block_body, block_exhausted)
+
+        builder.set_insert_block(block_exhausted)
+        self.finish()
+        builder.br(block_end)
+
+    def __next_kind(self, kind: int, store_item: Callable[[LangType, int], None],
+                    store_pair: Optional[Callable[[int, int], None]], block_body: CodeBlock,
+                    block_exhausted: CodeBlock):
+        visitor = self.__visitor
+        code_gen, builder = visitor.get_code_gen(), visitor.get_builder()
+        py_obj_type = lang_type.get_python_obj_type()
+        iterable = builder.load(self.__iterable_var)
+        block_item = builder.create_block("Iteration Item")
+
+        if kind == ITER_LIST or kind == ITER_TUPLE or kind == ITER_STR:
+            # The size of a list is read again on each item since the body can change it
+            index = builder.load(self.__index_var)
+            if kind == ITER_LIST:
+                size = gen_list.python_list_len(visitor, iterable)
+            elif kind == ITER_TUPLE:
+                size = gen_tuple.python_tuple_len(visitor, iterable)
+            else:
+                size = builder.load(self.__size_var)
+            builder.cond_br(builder.lt(index, size), block_item, block_exhausted)
+
+            builder.set_insert_block(block_item)
+            builder.store(builder.add(index, builder.const_int64(1)), self.__index_var)
+            if kind == ITER_LIST:
+                item = builder.load(gen_list.python_list_item_ptr(visitor, iterable, index))
+                ref_counter.ref_incr(builder, py_obj_type, item)
+            elif kind == ITER_TUPLE:
+                item = builder.load(gen_tuple.python_tuple_get_unsafe_item_ptr(visitor, py_obj_type, iterable, index))
+                ref_counter.ref_incr(builder, py_obj_type, item)
+            else:
+                substring_func = code_gen.get_or_create_func("PyUnicode_Substring",
+                                                             code_type.get_py_obj_ptr(code_gen),
+                                                             [code_type.get_py_obj_ptr(code_gen),
+                                                              code_type.get_int64(), code_type.get_int64()],
+                                                             _gen.Linkage.EXTERNAL)
+                item = builder.call(substring_func, [iterable, index, builder.add(index, builder.const_int64(1))])
+                excp.check_excp(visitor, item)
+            builder.store(item, self.__item_var)
+            store_item(py_obj_type, item)
+        elif kind == ITER_DICT:
+            block_same_size = builder.create_block("Dict Iteration Same Size")
+            block_changed = builder.create_block("Dict Iteration Changed Size")
+            next_args_types = [code_type.get_py_obj_ptr(code_gen), code_type.get_int64().get_ptr_to(),
+                               code_type.get_py_obj_ptr(code_gen).get_ptr_to(),
+                               code_type.get_py_obj_ptr(code_gen).get_ptr_to()]
+            next_func = code_gen.get_or_create_func("PyDict_Next", code_type.get_int32(), next_args_types,
+                                                    _gen.Linkage.EXTERNAL)
+            found = builder.call(next_func, [iterable, self.__index_var, self.__key_var, self.__value_var])
+            builder.cond_br(builder.ne(found, builder.const_int32(0)), block_same_size, block_exhausted)
+
+            builder.set_insert_block(block_same_size)
+            same_size = builder.eq(gen_dict.python_dict_len(visitor, iterable), builder.load(self.__size_var))
+            builder.cond_br(same_size, block_item, block_changed)
+            builder.set_insert_block(block_changed)
+            excp.raise_runtime_error(visitor, "dictionary changed size during iteration")
+            excp.handle_raised_excp(visitor)
+
+            builder.set_insert_block(block_item)
+            key, value = builder.load(self.__key_var), builder.load(self.__value_var)
+            if self.__view != "values":
+                ref_counter.ref_incr(builder, py_obj_type, key)
+            if self.__view != "keys" and self.__view is not None:
+                ref_counter.ref_incr(builder, py_obj_type, value)
+
+            if self.__view == "values":
+                builder.store(value, self.__item_var)
+                store_item(py_obj_type, value)
+            elif self.__view == "items" and store_pair is not None:
+                builder.store(key, self.__item_var)
+                builder.store(value, self.__second_item_var)
+                store_pair(key, value)
+            elif self.__view == "items":
+                item = gen_tuple.python_tuple_new(code_gen, builder, builder.const_int64(2))
+                excp.check_excp(visitor, item)
+                gen_tuple.python_tuple_set_unsafe(visitor, item, builder.const_int64(0), key)
+                gen_tuple.python_tuple_set_unsafe(visitor, item, builder.const_int64(1), value)
+                builder.store(item, self.__item_var)
+                store_item(py_obj_type, item)
+            else:
+                builder.store(key, self.__item_var)
+                store_item(py_obj_type, key)
+        else:
+            block_null = builder.create_block("Iteration Null Item")
+            block_error = builder.create_block("Iteration Error")
+            block_check_stop = builder.create_block("Iteration Check Stop")
+            item = iterator.call_iter_next(visitor, builder.load(self.__iterator_var))
+            null_ptr = builder.const_null(code_type.get_py_obj_ptr(code_gen))
+            builder.cond_br(builder.eq(item, null_ptr), block_null, block_item)
+
+            # A null item ends the iteration, unless an exception other than StopIteration got raised
+            builder.set_insert_block(block_null)
+            has_excp = builder.ne(excp.py_runtime_get_excp(code_gen, builder), null_ptr)
+            builder.cond_br(has_excp, block_check_stop, block_exhausted)
+            builder.set_insert_block(block_check_stop)
+            is_stop = builder.ne(excp.py_runtime_excp_matches_stop_iteration(visitor), builder.const_int32(0))
+            block_stop = builder.create_block("Iteration Stopped")
+            builder.cond_br(is_stop, block_stop, block_error)
+            builder.set_insert_block(block_stop)
+            excp.py_runtime_clear_error(code_gen, builder)
+            builder.br(block_exhausted)
+            builder.set_insert_block(block_error)
+            excp.handle_raised_excp(visitor)
+
+            builder.set_insert_block(block_item)
+            builder.store(item, self.__item_var)
+            store_item(py_obj_type, item)
+
+        builder.br(block_body)
+
+    def release_item(self):
+        """
+        Generate the code releasing the current item, the targets can't use it anymore
+        """
+        visitor = self.__visitor
+        builder = visitor.get_builder()
+        null_ptr = builder.const_null(code_type.get_py_obj_ptr(visitor.get_code_gen()))
+        for var in (self.__item_var, self.__second_item_var):
+            ref_counter.ref_decr_nullable(visitor, lang_type.get_python_obj_type(), builder.load(var))
+            builder.store(null_ptr, var)
+
+    def finish(self):
+        """
+        Generate the code releasing the references held by the iteration. Finishing it again does nothing, so a loop
+        can also finish it where a break jumps
+        """
+        visitor = self.__visitor
+        builder = visitor.get_builder()
+        null_ptr = builder.const_null(code_type.get_py_obj_ptr(visitor.get_code_gen()))
+        self.release_item()
+        for var in (self.__iterator_var, self.__iterable_var):
+            ref_counter.ref_decr_nullable(visitor, lang_type.get_python_obj_type(), builder.load(var))
+            builder.store(null_ptr, var)
@@ -0,0 +1,230 @@
+"""
+Module related to the inline caches of the generated code.
+
+Every site loading a global name gets its own cache, made of internal global variables holding the object found and
+the versions of the globals and builtins dictionaries at the time of the lookup. Any change to a dictionary gives it
+a new version, so as long as both versions match, the cached object still is the one the lookup would return.
+A hit costs two compares and a load instead of up to two hash lookups.
+
+Every site accessing an attribute gets a cache remembering how the attribute got resolved for the last types seen,
+keyed on the version tag of the type. The first entry is checked inline for the resolutions that don't need the
+runtime: an object stored at an offset of the instance for an attribute load, an unbound method of a type without
+instance dict for a method call. Any other case goes through the runtime, which looks into all the entries and fills
+the cache on a miss (see runtime/src/inline_cache.c).
+"""
+from __future__ import annotations
+
+import enum
+from typing import TYPE_CHECKING
+
+import flyable.code_gen.code_gen as _gen
+import flyable.code_gen.code_type as code_type
+import flyable.code_gen.fly_obj as fly_obj
+import flyable.code_gen.function as function
+import flyable.code_gen.ref_counter as ref_counter
+import flyable.code_gen.type as _type
+import flyable.data.lang_type as lang_type
+
+if TYPE_CHECKING:
+    from flyable.parse.parser_visitor import ParserVisitor
+
+PY_DICT_VERSION_TAG_INDEX = 3
+"""Index of ma_version_tag in a PyDictObject seen as an array of 64 bits fields"""
+
+
+class AttrCacheKind(enum.IntEnum):
+    """
+    How an entry of an attribute cache resolves the attribute. Must match FlyableAttrCacheKind of the runtime
+    """
+    EMPTY = 0,
+    SLOT = 1,
+    INSTANCE_VALUE = 2,
+    DATA_DESCRIPTOR = 3,
+    TYPE_VALUE = 4,
+    TYPE_VALUE_NO_DICT = 5,
+    METHOD = 6,
+    METHOD_NO_DICT = 7
+
+
+class AttrCacheField(enum.IntEnum):
+    """
+    Index of the fields of the first entry in the attribute cache struct
+    """
+    TYPE = 0,
+    VERSION = 1,
+    KIND = 2,
+    INDEX = 3,
+    VALUE = 4
+
+
+def py_dict_get_version(visitor: ParserVisitor, d: int):
+    builder = visitor.get_builder()
+    fields = builder.ptr_cast(d, code_type.get_int64().get_ptr_to())
+    return builder.load(builder.gep2(fields, code_type.get_int64(), [builder.const_int64(PY_DICT_VERSION_TAG_INDEX)]))
+
+
+def load_global(visitor: ParserVisitor, func_obj: int, name: str):
+    """
+    Load a global name, looking into the globals of the function then into its builtins.
+    Returns a borrowed reference, or null if the name isn't defined
+    """
+    code_gen, builder = visitor.get_code_gen(), visitor.get_builder()
+    cache_prefix = "@flyable@cache@global@" + name
+    cached_value = code_gen.add_unique_global_var(cache_prefix + "@value", code_type.get_py_obj_ptr(code_gen))
+    cached_globals_version = code_gen.add_unique_global_var(cache_prefix + "@globals", code_type.get_int64())
+    cached_builtins_version = code_gen.add_unique_global_var(cache_prefix + "@builtins", code_type.get_int64())
+
+    result = visitor.generate_entry_block_var(code_type.get_py_obj_ptr(code_gen))
+    hit_block = builder.create_block("Global Cache Hit")
+    miss_block = builder.create_block("Global Cache Miss")
+    continue_block = builder.create_block("After Global Load")
+
+    globals_dict = function.py_function_get_globals(visitor, func_obj)
+    builtins_dict = function.py_function_get_builtins(visitor, func_obj)
+    globals_version = py_dict_get_version(visitor, globals_dict)
+    builtins_version = py_dict_get_version(visitor, builtins_dict)
+
+    # The versions start at 0 in the cache while a dictionary never has a null version, so the first load misses
+    is_hit = builder._and(builder.eq(globals_version, builder.load(builder.global_var(cached_globals_version))),
+                          builder.eq(builtins_version, builder.load(builder.global_var(cached_builtins_version))))
+    builder.cond_br(is_hit, hit_block, miss_block)
+
+    builder.set_insert_block(hit_block)
+    builder.store(builder.load(builder.global_var(cached_value)), result)
+    builder.br(continue_block)
+
+    builder.set_insert_block(miss_block)
+    __lookup_global(visitor, globals_dict, builtins_dict, name, result)
+    # The globals keep a reference to the object, and removing it changes the version, so it can be kept borrowed
+    builder.store(builder.load(result), builder.global_var(cached_value))
+    builder.store(globals_version, builder.global_var(cached_globals_version))
+    builder.store(builtins_version, builder.global_var(cached_builtins_version))
+    builder.br(continue_block)
+
+    builder.set_insert_block(continue_block)
+    return builder.load(result)
+
+
+def __lookup_global(visitor: ParserVisitor, globals_dict: int, builtins_dict: int, name: str, result: int):
+    code_gen, builder = visitor.get_code_gen(), visitor.get_builder()
+    name_value = builder.load(builder.global_var(code_gen.get_or_insert_str(name)))
+
+    builder.store(function.py_dict_get_item(visitor, globals_dict, name_value), result)
+    builtins_block = builder.create_block("Global Lookup Builtins")
+    found_block = builder.create_block("Global Lookup Found")
+    not_in_globals = builder.eq(builder.load(result), builder.const_null(code_type.get_py_obj_ptr(code_gen)))
+    builder.cond_br(not_in_globals, builtins_block, found_block)
+
+    builder.set_insert_block(builtins_block)
+    builder.store(function.py_dict_get_item(visitor, builtins_dict, name_value), result)
+    builder.br(found_block)
+
+    builder.set_insert_block(found_block)
+
+
+def load_attr(visitor: ParserVisitor, obj: int, name: str, obj_type: int = None):
+    """
+    Load the attribute of the object through the inline cache of the site. Returns a new reference, or null if the
+    attribute can't be loaded. If a type is supplied it will avoid loading the type again
+    """
+    code_gen, builder = visitor.get_code_gen(), visitor.get_builder()
+    cache = builder.global_var(code_gen.add_unique_global_var("@flyable@cache@attr@" + name,
+                                                              code_gen.get_attr_cache_struct().to_code_type()))
+    result = visitor.generate_entry_block_var(code_type.get_py_obj_ptr(code_gen))
+    slot_block = builder.create_block("Attr Cache Slot")
+    miss_block = builder.create_block("Attr Cache Miss")
+    continue_block = builder.create_block("After Attr Load")
+
+    obj_type = __get_obj_type(visitor, obj, obj_type)
+    builder.cond_br(__is_first_entry_hit(visitor, cache, obj_type, AttrCacheKind.SLOT), slot_block, miss_block)
+
+    builder.set_insert_block(slot_block)
+    offset = builder.load(__get_first_entry_field_ptr(visitor, cache, AttrCacheField.INDEX))
+    slot = builder.gep2(builder.ptr_cast(obj, code_type.get_int8_ptr()), code_type.get_int8(), [offset])
+    slot_value = builder.load(builder.ptr_cast(slot, code_type.get_py_obj_ptr(code_gen).get_ptr_to()))
+    builder.store(slot_value, result)
+    slot_found_block = builder.create_block("Attr Cache Slot Found")
+    # An empty slot raises an AttributeError, the runtime takes care of it
+    builder.cond_br(builder.eq(slot_value, builder.const_null(code_type.get_py_obj_ptr(code_gen))), miss_block,
+                    slot_found_block)
+    builder.set_insert_block(slot_found_block)
+    ref_counter.ref_incr(builder, lang_type.get_python_obj_type(), slot_value)
+    builder.br(continue_block)
+
+    builder.set_insert_block(miss_block)
+    load_func = code_gen.get_or_create_func("flyable_attr_cache_load", code_type.get_py_obj_ptr(code_gen),
+                                            [code_type.get_int8_ptr()] + [code_type.get_py_obj_ptr(code_gen)] * 2,
+                                            _gen.Linkage.EXTERNAL)
+    name_value = builder.load(builder.global_var(code_gen.get_or_insert_str(name)))
+    builder.store(builder.call(load_func, [builder.ptr_cast(cache, code_type.get_int8_ptr()), obj, name_value]),
+                  result)
+    builder.br(continue_block)
+
+    builder.set_insert_block(continue_block)
+    return builder.load(result)
+
+
+def load_method(visitor: ParserVisitor, obj: int, name: str, found_attr: int):
+    """
+    Load a method to call on the object through the inline cache of the site, following _PyObject_GetMethod.
+    The attribute found is stored into found_attr. Returns an int32 different from 0 when the attribute is an unbound
+    method that needs the object as first argument
+    """
+    code_gen, builder = visitor.get_code_gen(), visitor.get_builder()
+    cache = builder.global_var(code_gen.add_unique_global_var("@flyable@cache@method@" + name,
+                                                              code_gen.get_attr_cache_struct().to_code_type()))
+    is_method = visitor.generate_entry_block_var(code_type.get_int32())
+    hit_block = builder.create_block("Method Cache Hit")
+    miss_block = builder.create_block("Method Cache Miss")
+    continue_block = builder.create_block("After Method Load")
+
+    obj_type = __get_obj_type(visitor, obj)
+    is_hit = __is_first_entry_hit(visitor, cache, obj_type, AttrCacheKind.METHOD_NO_DICT)
+    builder.cond_br(is_hit, hit_block, miss_block)
+
+    builder.set_insert_block(hit_block)
+    method = builder.load(__get_first_entry_field_ptr(visitor, cache, AttrCacheField.VALUE))
+    ref_counter.ref_incr(builder, lang_type.get_python_obj_type(), method)
+    builder.store(method, found_attr)
+    builder.store(builder.const_int32(1), is_method)
+    builder.br(continue_block)
+
+    builder.set_insert_block(miss_block)
+    load_func = code_gen.get_or_create_func("flyable_attr_cache_load_method", code_type.get_int32(),
+                                            [code_type.get_int8_ptr()] + [code_type.get_py_obj_ptr(code_gen)] * 2 +
+                                            [code_type.get_py_obj_ptr(code_gen).get_ptr_to()], _gen.Linkage.EXTERNAL)
+    name_value = builder.load(builder.global_var(code_gen.get_or_insert_str(name)))
+    builder.store(builder.call(load_func, [builder.ptr_cast(cache, code_type.get_int8_ptr()), obj, name_value,
+                                           found_attr]), is_method)
+    builder.br(continue_block)
+
+    builder.set_insert_block(continue_block)
+    return builder.load(is_method)
+
+
+def __get_obj_type(visitor: ParserVisitor, obj: int, obj_type: int = None):
+    code_gen, builder = visitor.get_code_gen(), visitor.get_builder()
+    if obj_type is None:
+        obj_type = fly_obj.get_py_obj_type(builder, obj)
+    return builder.ptr_cast(obj_type, code_gen.get_python_type().to_code_type().get_ptr_to())
+
+
+def __get_first_entry_field_ptr(visitor: ParserVisitor, cache: int, field: AttrCacheField):
+    code_gen, builder = visitor.get_code_gen(), visitor.get_builder()
+    indices = [builder.const_int32(0), builder.const_int32(int(field))]
+    return builder.gep2(cache, code_gen.get_attr_cache_struct().to_code_type(), indices)
+
+
+def __is_first_entry_hit(visitor: ParserVisitor, cache: int, obj_type: int, kind: AttrCacheKind):
+    """
+    The first entry hits when it resolved the attribute with the expected kind for the same version of the type
+    """
+    builder = visitor.get_builder()
+    cached_type = builder.load(__get_first_entry_field_ptr(visitor, cache, AttrCacheField.TYPE))
+    cached_version = builder.load(__get_first_entry_field_ptr(visitor, cache, AttrCacheField.VERSION))
+    cached_kind = builder.load(__get_first_entry_field_ptr(visitor, cache, AttrCacheField.KIND))
+    version = builder.load(_type.py_object_type_get_version_tag_ptr(visitor, obj_type))
+
+    same_type = builder.eq(builder.ptr_cast(obj_type, code_type.get_int8_ptr()), cached_type)
+    same_version = builder.eq(version, cached_version)
+    return builder._and(builder._and(same_type, same_version), builder.eq(cached_kind, builder.const_int32(int(kind))))
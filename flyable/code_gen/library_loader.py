@@ -1,5 +1,7 @@
+import json
 import os
 import platform
+from typing import Callable
 
 from flyable.code_gen.code_writer import CodeWriter
 
@@ -9,8 +11,31 @@ Module related to the dynamic loading of the native code generation layer
 
 import ctypes as ctypes
 
+MANIFEST_NAME = "load_order.json"
+"""Name of the file, next to the libraries, that keeps the order in which the dependencies need to be loaded"""
+
+_lib: ctypes.CDLL | None = None
+"""Native layer handle shared by the whole process"""
+
+_dependencies: list[ctypes.CDLL] = []
+"""Handles of the loaded dependencies. They are kept so the libraries are never unloaded"""
+
 
 def __load_lib():
+    global _lib
+    if _lib is None:
+        _lib = __load_lib_uncached()
+    return _lib
+
+
+def load_lib():
+    """
+    Load the native layer if it's not loaded yet and returns its handle
+    """
+    return __load_lib()
+
+
+def __load_lib_uncached():
     path = os.path.dirname(os.path.realpath(__file__))
     lib_path = ""
     if platform.uname()[0] == "Windows":
@@ -22,16 +47,54 @@ def __load_lib():
         lib_name = "libFlyableCodeGen.so"
         path += "/../dyn_lib/linux64/"
         lib_path = path
-        return load_lib_and_dependecies(lib_path, lib_name)
+        return load_lib_with_manifest(lib_path, lib_name)
     elif platform.system() == "Darwin" and platform.machine() == "arm64":
         lib_name = "libFlyableCodeGen.dylib"
         path += "/../dyn_lib/macos-arm64/"
         lib_path = path
-        return load_lib_and_dependecies(lib_path, lib_name)
+        return load_lib_with_manifest(lib_path, lib_name)
     else:
         raise OSError("OS not supported")
 
 
+PROFILE_CALLBACK_TYPE = ctypes.CFUNCTYPE(None, ctypes.c_char_p, ctypes.c_double, ctypes.c_double)
+"""Receives the name of a function, its optimization time and the emission time of the module, in seconds"""
+
+_profile_callback = None
+"""Native wrapper of the profile callback, kept alive while the native layer can call it"""
+
+
+def set_profile_callback(callback: Callable[[str, float, float], None] | None):
+    """
+    Set the function the native layer calls to report the time spent on each function. An empty name reports the time
+    that can't be attributed to a single function, the emission time is only reported with it. Passing None removes
+    the callback
+    """
+    global _profile_callback
+    lib = __load_lib()
+    if not hasattr(lib, "flyable_codegen_set_profile_callback"):
+        return  # Native layer built without profiling support
+
+    if callback is None:
+        _profile_callback = None
+        lib.flyable_codegen_set_profile_callback(PROFILE_CALLBACK_TYPE())
+    else:
+        _profile_callback = PROFILE_CALLBACK_TYPE(lambda name, opt_time, emit_time:
+                                                  callback(name.decode("utf-8"), opt_time, emit_time))
+        lib.flyable_codegen_set_profile_callback(_profile_callback)
+
+
+def get_llvm_version():
+    """
+    Returns the major version of LLVM the native layer is built with, or None if the native layer doesn't report it.
+    The native layers that don't report it are built with a version older than 16
+    """
+    lib = __load_lib()
+    if not hasattr(lib, "flyable_codegen_llvm_version"):
+        return None
+    return lib.flyable_codegen_llvm_version()
+
+
 def call_code_generation_layer(writer: CodeWriter, output: str):
     lib = __load_lib()
     gen_func = lib.flyable_codegen_run
@@ -41,21 +104,91 @@ def call_code_generation_layer(writer: CodeWriter, output: str):
     gen_func(native_buffer, ctypes.c_int32(buffer_size), output_c_str)
 
 
-def load_lib_and_dependecies(path: str, lib: str):
+def call_code_generation_layer_file(input_path: str, output: str):
+    """
+    Run the native layer on the code stored inside a file. The file gets memory mapped by the native layer
+    """
+    lib = __load_lib()
+    gen_func = lib.flyable_codegen_run_file
+    input_c_str = ctypes.c_char_p(input_path.encode("utf-8"))
+    output_c_str = ctypes.c_char_p(output.encode("utf-8"))
+    gen_func(input_c_str, output_c_str)
+
+
+def load_lib_with_manifest(path: str, lib: str):
+    """
+    Load the library and its dependencies in the order saved inside the manifest.
+    If there is no manifest, or if it's outdated, the order gets resolved again and saved for the next loads.
+    """
+    manifest_path = os.path.join(path, MANIFEST_NAME)
+    load_order = __read_manifest(manifest_path)
+    if load_order is not None:
+        try:
+            for dependency in load_order:
+                _dependencies.append(ctypes.CDLL(path + dependency))
+            return ctypes.CDLL(path + lib)
+        except OSError:
+            pass  # The libraries changed since the manifest was written
+
+    load_order = []
+    result = load_lib_and_dependecies(path, lib, load_order)
+    __write_manifest(manifest_path, load_order)
+    return result
+
+
+def __read_manifest(manifest_path: str) -> list[str] | None:
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            load_order = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(load_order, list) or not all(isinstance(e, str) for e in load_order):
+        return None
+    return load_order
+
+
+def __write_manifest(manifest_path: str, load_order: list[str]):
     try:
-        return ctypes.CDLL(path + lib)
-    except OSError as excp:
-        # Get the name of the library not found
-        error_msg: str = excp.args[0]
-        # Should crash for any errors that are not missing object file
-        # errors, since we can't handle them
-        if not "cannot open shared" in error_msg:
-            # https://stackoverflow.com/questions/24752395/python-raise-from-usage
-            # Helps to avoid a massive error message due to recursive calls
-            raise excp from None
-        lib_load = error_msg.split(" ")[0]
-        lib_load = lib_load[0:-1]
-        # Now load it
-        load_lib_and_dependecies(path, lib_load)
-    # Make sure to still return a value if we handled an exception
-    return load_lib_and_dependecies(path, lib)
+        with open(manifest_path, "w", encoding="utf-8") as f:
+            json.dump(load_order, f, indent=4)
+    except OSError:
+        pass  # The libraries folder can be read-only, the order will be resolved again on the next run
+
+
+def load_lib_and_dependecies(path: str, lib: str, load_order: list[str] = None):
+    """
+    Load the library by resolving the missing dependencies one at a time.
+    The dependencies loaded are appended to the load order, in the order they got loaded.
+    """
+    if load_order is None:
+        load_order = []
+
+    # Libraries waiting on a missing dependency, the last one is the next to load
+    pending = [lib]
+    visited = {lib}
+    while True:
+        current = pending[-1]
+        try:
+            handle = ctypes.CDLL(path + current)
+        except OSError as excp:
+            # Get the name of the library not found
+            error_msg: str = excp.args[0]
+            # Should crash for any errors that are not missing object file
+            # errors, since we can't handle them
+            if not "cannot open shared" in error_msg:
+                # https://stackoverflow.com/questions/24752395/python-raise-from-usage
+                raise excp from None
+            lib_load = error_msg.split(" ")[0]
+            lib_load = lib_load[0:-1]
+            # A library already resolved that is still missing can't be found next to the native layer
+            if lib_load in visited:
+                raise excp from None
+            visited.add(lib_load)
+            pending.append(lib_load)
+            continue
+
+        pending.pop()
+        if len(pending) == 0:
+            return handle
+        _dependencies.append(handle)
+        load_order.append(current)
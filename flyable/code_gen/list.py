@@ -14,6 +14,8 @@ import flyable.code_gen.code_gen as gen
 import flyable.code_gen.code_type as code_type
 import flyable.code_gen.runtime as runtime
 import flyable.code_gen.ref_counter as ref_counter
+import flyable.code_gen.sequence as sequence
+import flyable.code_gen.tuple as gen_tuple
 import flyable.data.type_hint as hint
 import flyable.data.lang_type as lang_type
 
@@ -42,57 +44,109 @@ def python_list_set(visitor: ParserVisitor, list: int, index: int, item):
 
 
 def python_list_append(visitor: ParserVisitor, list: int, item_type: lang_type.LangType, item: int):
+    """
+    Generate the code appending an element at the end of a Python List. The list takes a new reference to the item,
+    like PyList_Append.
+    The item is stored inline while the list has spare capacity, the runtime only gets called to grow the list
+    """
     builder, code_gen = visitor.get_builder(), visitor.get_code_gen()
-    item_type, item = runtime.value_to_pyobj(visitor, item, item_type)
-    args_types = [code_type.get_py_obj_ptr(code_gen), code_type.get_py_obj_ptr(code_gen)]
-    func = code_gen.get_or_create_func("PyList_Append", code_type.get_py_obj_ptr(code_gen),
-                                                args_types, gen.Linkage.EXTERNAL)
-    builder.call(func, [list, item])
+    py_item_type, item = runtime.value_to_pyobj(visitor, item, item_type)
+    ref_counter.ref_incr(builder, py_item_type, item)
+
+    grow_block = builder.create_block("List Grow")
+    grow_error_block = builder.create_block("List Grow Error")
+    store_block = builder.create_block("List Append Store")
+
+    size_ptr = python_list_len_ptr(visitor, list)
+    size = builder.load(size_ptr)
+    new_size = builder.add(size, builder.const_int64(1))
+    capacity = builder.load(python_list_capacity_ptr(visitor, list))
+    builder.cond_br(builder.lt(size, capacity), store_block, grow_block)
+
+    builder.set_insert_block(grow_block)
+    resize_result = python_list_resize(visitor, list, new_size)
+    builder.cond_br(builder.eq(resize_result, builder.const_int32(0)), store_block, grow_error_block)
+
+    builder.set_insert_block(grow_error_block)
+    ref_counter.ref_decr(visitor, py_item_type, item)
+    excp.handle_raised_excp(visitor)
+
+    # The items buffer moves when the list grows, so it's loaded once the capacity is known
+    builder.set_insert_block(store_block)
+    builder.store(item, python_list_item_ptr(visitor, list, size))
+    builder.store(new_size, size_ptr)
+
+    # The list took its own reference, a boxed primitive was only needed for the append
+    if item_type.is_primitive():
+        ref_counter.ref_decr_incr(visitor, py_item_type, item)
 
-"""
-The following commented function calls python_list_resize which is not an external cpython symbole
-"""
 
-# def python_list_append(visitor: ParserVisitor, list: int, item_type: lang_type.LangType, item: int):
-#     """
-#     Generate the code to set an element in a Python List
-#     """
-#
-#     builder, code_gen = visitor.get_builder(), visitor.get_code_gen()
-#
-#     item_type, item = runtime.value_to_pyobj(code_gen, builder, item, item_type)
-#
-#     if not hint.is_incremented_type(item_type):
-#         ref_counter.ref_incr(visitor.get_builder(), item_type, item)
-#
-#     new_alloca_block = builder.create_block("List New Allocation")
-#     continue_block = builder.create_block("After List")
-#
-#     list = builder.ptr_cast(list, code_type.get_list_obj_ptr(visitor.get_code_gen()))
-#     capacity = python_list_capacity_ptr(visitor, list)
-#     capacity = builder.load(capacity)
-#
-#     size_ptr = python_list_len_ptr(visitor, list)
-#     size = builder.load(size_ptr)
-#     new_size = builder.add(size, builder.const_int64(1))
-#
-#     need_new_alloca = builder.eq(capacity, size)
-#     builder.cond_br(need_new_alloca, new_alloca_block, continue_block)
-#
-#     builder.set_insert_block(new_alloca_block)
-#     resize_args_types = [code_type.get_list_obj_ptr(code_gen), code_type.get_int64()]
-#     resize_func = code_gen.get_or_create_func("python_list_resize", code_type.get_int32(), resize_args_types,
-#                                               gen.Linkage.EXTERNAL)
-#
-#     builder.call(resize_func, [list, new_size])
-#     builder.br(continue_block)
-#
-#     builder.set_insert_block(continue_block)
-#     content = builder.load(python_list_get_content_ptr(visitor, list))
-#     content = builder.ptr_cast(content, code_type.get_py_obj_ptr(code_gen).get_ptr_to())
-#     item_ptr = builder.gep2(content, code_type.get_py_obj_ptr(code_gen), [size])
-#     builder.store(item, item_ptr)  # Set the item in the buffer
-#     builder.store(new_size, size_ptr)  # Set the new size in case it didn't enter the resize
+def python_list_resize(visitor: ParserVisitor, list: int, new_size: int):
+    """
+    Generate the code resizing the list with the growth pattern of CPython. Returns 0 on success and -1 with a
+    MemoryError set on failure. See runtime/src/list.h
+    """
+    builder, code_gen = visitor.get_builder(), visitor.get_code_gen()
+    resize_args_types = [code_type.get_list_obj_ptr(code_gen), code_type.get_int64()]
+    resize_func = code_gen.get_or_create_func("flyable_list_resize", code_type.get_int32(), resize_args_types,
+                                              gen.Linkage.EXTERNAL)
+    list = builder.ptr_cast(list, code_type.get_list_obj_ptr(code_gen))
+    return builder.call(resize_func, [list, new_size])
+
+
+def python_list_reserve(visitor: ParserVisitor, list: int, capacity: int):
+    """
+    Generate the code growing the memory of the list to the capacity without changing its size.
+    See runtime/src/list.h
+    """
+    builder, code_gen = visitor.get_builder(), visitor.get_code_gen()
+    reserve_args_types = [code_type.get_list_obj_ptr(code_gen), code_type.get_int64()]
+    reserve_func = code_gen.get_or_create_func("flyable_list_reserve", code_type.get_void(), reserve_args_types,
+                                               gen.Linkage.EXTERNAL)
+    list = builder.ptr_cast(list, code_type.get_list_obj_ptr(code_gen))
+    builder.call(reserve_func, [list, capacity])
+
+
+def python_list_reserve_for(visitor: ParserVisitor, list: int, iterable_type: lang_type.LangType, iterable: int):
+    """
+    Generate the code reserving the memory for the items produced by iterating the iterable, so the appends don't
+    need to grow the list. Lists and tuples give their size, other objects their length hint (__len__ or
+    __length_hint__). An iterable without a length hint leaves the list to grow as items are appended
+    """
+    builder, code_gen = visitor.get_builder(), visitor.get_code_gen()
+    if iterable_type.is_list():
+        length = python_list_len(visitor, iterable)
+    elif iterable_type.is_tuple():
+        length = gen_tuple.python_tuple_len(visitor, iterable)
+    else:
+        iterable_type, iterable = runtime.value_to_pyobj(visitor, iterable, iterable_type)
+        length_hint_func = code_gen.get_or_create_func("PyObject_LengthHint", code_type.get_int64(),
+                                                       [code_type.get_py_obj_ptr(code_gen), code_type.get_int64()],
+                                                       gen.Linkage.EXTERNAL)
+        length = builder.call(length_hint_func, [iterable, builder.const_int64(0)])
+
+    reserve_block = builder.create_block("List Reserve")
+    no_hint_block = builder.create_block("List No Length Hint")
+    continue_block = builder.create_block("After List Reserve")
+    builder.cond_br(builder.gt(length, builder.const_int64(0)), reserve_block, no_hint_block)
+
+    builder.set_insert_block(reserve_block)
+    python_list_reserve(visitor, list, length)
+    builder.br(continue_block)
+
+    builder.set_insert_block(no_hint_block)
+    if iterable_type.is_list() or iterable_type.is_tuple():
+        builder.br(continue_block)
+    else:
+        # A failing length hint is only an optimization lost, the iteration reports the real errors
+        hint_error_block = builder.create_block("List Length Hint Error")
+        builder.cond_br(builder.eq(length, builder.const_int64(-1)), hint_error_block, continue_block)
+
+        builder.set_insert_block(hint_error_block)
+        excp.py_runtime_clear_error(code_gen, builder)
+        builder.br(continue_block)
+
+    builder.set_insert_block(continue_block)
 
 
 def python_list_capacity_ptr(visitor: ParserVisitor, list: int):
@@ -107,26 +161,38 @@ def python_list_get_content_ptr(visitor: ParserVisitor, list: int):
 
 
 def python_list_array_get_item(visitor: ParserVisitor, list_type: lang_type.LangType, list: int, index: int):
-    builder, code_gen = visitor.get_builder(), visitor.get_code_gen()
-    valid_index_block = builder.create_block("List Valid Index")
-    wrong_index_block = builder.create_block("List Wrong Index")
+    """
+    Generate the code returning a borrowed reference to the item at the index, raising an IndexError when the index is
+    outside the list. A negative index counts from the end
+    """
     size = python_list_len(visitor, list)
-    real_index = visitor.get_builder().mod(index, size)
-    valid_bounds = visitor.get_builder().lt(real_index, size)
-    builder.cond_br(valid_bounds, valid_index_block, wrong_index_block)
-    builder.set_insert_block(valid_index_block)
-    content = python_list_get_content_ptr(visitor, list)
-    content = builder.load(content)
-    content = builder.ptr_cast(content, list_type.get_content().to_code_type(visitor.get_code_gen()).get_ptr_to())
-    content = builder.gep2(content, list_type.get_content().to_code_type(visitor.get_code_gen()), [index])
-    result = builder.load(content)
+    index = sequence.normalize_index(visitor, index, size)
+    sequence.check_index(visitor, index, size)
+    return visitor.get_builder().load(python_list_item_ptr(visitor, list, index))
 
-    builder.set_insert_block(wrong_index_block)
-    excp.raise_index_error(visitor)
-    excp.handle_raised_excp(visitor)
 
-    builder.set_insert_block(valid_index_block)
-    return result
+def python_list_set_item(visitor: ParserVisitor, list: int, index: int, item: int):
+    """
+    Generate the code replacing the item at the index, raising an IndexError when the index is outside the list.
+    The list takes a new reference to the item, like PyObject_SetItem, and releases the replaced item
+    """
+    builder = visitor.get_builder()
+    size = python_list_len(visitor, list)
+    index = sequence.normalize_index(visitor, index, size)
+    sequence.check_index(visitor, index, size)
+    item_ptr = python_list_item_ptr(visitor, list, index)
+    old_item = builder.load(item_ptr)
+    ref_counter.ref_incr(builder, lang_type.get_python_obj_type(), item)
+    builder.store(item, item_ptr)
+    ref_counter.ref_decr(visitor, lang_type.get_python_obj_type(), old_item)
+
+
+def python_list_item_ptr(visitor: ParserVisitor, list: int, index: int):
+    """
+    Generate the code returning the address of the item at the index without checking it. The items of a Python list
+    are always python objects
+    """
+    return python_list_array_get_item_ptr_unsafe(visitor, lang_type.get_python_obj_type(), list, index)
 
 
 def python_list_array_get_item_unsafe(visitor: ParserVisitor, list_type: lang_type.LangType, list: int, index: int):
@@ -0,0 +1,236 @@
+"""
+Module related to the code generation of the for loops iterating over range(...).
+
+The loop iterates with a native i64 counter instead of a range iterator, as long as the range global still is the
+builtin at runtime and every argument is an int fitting an i64. The counter lives in an entry block variable that the
+native layer promotes into a phi. When the guard fails, the loop falls back on the iter / next protocol.
+Both iterations share the same loop body.
+"""
+from __future__ import annotations
+
+import ast
+from typing import TYPE_CHECKING
+
+import flyable.code_gen.code_type as code_type
+import flyable.code_gen.code_gen as _gen
+import flyable.code_gen.exception as excp
+import flyable.code_gen.function as function
+import flyable.code_gen.inline_cache as inline_cache
+import flyable.code_gen.iterator as iterator
+import flyable.code_gen.op_call as op_call
+import flyable.code_gen.ref_counter as ref_counter
+import flyable.code_gen.runtime as runtime
+import flyable.data.lang_type as lang_type
+import flyable.data.type_hint as hint
+import flyable.parse.adapter as adapter
+
+if TYPE_CHECKING:
+    from flyable.data.lang_type import LangType
+    from flyable.parse.parser_visitor import ParserVisitor
+    from flyable.parse.variable import Variable
+
+
+def generate_range_for(visitor: ParserVisitor, node: ast.For):
+    """
+    Generate a for loop over range(...). The loop must pass local_types.is_range_loop
+    """
+    code_gen, builder = visitor.get_code_gen(), visitor.get_builder()
+    py_obj_type = lang_type.get_python_obj_type()
+
+    block_range_setup = builder.create_block("Range Loop Setup")
+    block_range_cond = builder.create_block("Range Loop Condition")
+    block_range_next = builder.create_block("Range Loop Next")
+    block_range_step = builder.create_block("Range Loop Step")
+    block_generic_setup = builder.create_block("Generic Loop Setup")
+    block_generic_next = builder.create_block("Generic Loop Next")
+    block_generic_store = builder.create_block("Generic Loop Store")
+    block_generic_end = builder.create_block("Generic Loop End")
+    block_body = builder.create_block("For Body")
+    block_step = builder.create_block("For Step")
+    block_else = builder.create_block("For Else") if len(node.orelse) > 0 else None
+    block_continue = builder.create_block("After For")
+    block_end = block_else if block_else is not None else block_continue
+
+    target = visitor.get_or_gen_var(node.target.id)
+
+    # The bounds are read by the step block, which is also reachable from the generic iteration, so they can't be
+    # plain values of the setup block
+    is_range = visitor.generate_entry_block_var(code_type.get_int1())
+    counter = visitor.generate_entry_block_var(code_type.get_int64())
+    stop = visitor.generate_entry_block_var(code_type.get_int64())
+    step = visitor.generate_entry_block_var(code_type.get_int64())
+    iterable = visitor.generate_entry_block_var(code_type.get_py_obj_ptr(code_gen))
+    iter_obj = visitor.generate_entry_block_var(code_type.get_py_obj_ptr(code_gen))
+    builder.store(builder.const_null(code_type.get_py_obj_ptr(code_gen)), iterable)
+    builder.store(builder.const_null(code_type.get_py_obj_ptr(code_gen)), iter_obj)
+
+    args = [__visit_range_arg(visitor, e) for e in node.iter.args]
+
+    # Guard: range must resolve to the builtin type, looking at the globals first since they shadow the builtins
+    range_obj = inline_cache.load_global(visitor, 0, "range")
+    range_type = builder.ptr_cast(builder.global_var(code_gen.get_range_type()), code_type.get_int8_ptr())
+    is_builtin = builder.eq(builder.ptr_cast(range_obj, code_type.get_int8_ptr()), range_type)
+    builder.cond_br(is_builtin, block_range_setup, block_generic_setup)
+
+    # Native iteration
+    builder.set_insert_block(block_range_setup)
+    bounds = [arg_value if arg_type.is_int() else
+              adapter.unbox_value(visitor, lang_type.get_int_type(), arg_value, block_generic_setup)
+              for arg_type, arg_value in args]
+    start_value = bounds[0] if len(bounds) > 1 else builder.const_int64(0)
+    stop_value = bounds[1] if len(bounds) > 1 else bounds[0]
+    step_value = bounds[2] if len(bounds) > 2 else builder.const_int64(1)
+    step_sign = __get_const_sign(node.iter.args[2]) if len(node.iter.args) > 2 else 1
+    if step_sign == 0:
+        # A null step raises a ValueError, the generic iteration lets range raise it
+        step_is_valid = builder.ne(step_value, builder.const_int64(0))
+        block_step_valid = builder.create_block("Range Step Valid")
+        builder.cond_br(step_is_valid, block_step_valid, block_generic_setup)
+        builder.set_insert_block(block_step_valid)
+
+    builder.store(start_value, counter)
+    builder.store(stop_value, stop)
+    builder.store(step_value, step)
+    builder.store(builder.const_int1(True), is_range)
+    builder.br(block_range_cond)
+
+    builder.set_insert_block(block_range_cond)
+    current = builder.load(counter)
+    if step_sign > 0:
+        in_range = builder.lt(current, builder.load(stop))
+    elif step_sign < 0:
+        in_range = builder.gt(current, builder.load(stop))
+    else:
+        going_up = builder.gt(builder.load(step), builder.const_int64(0))
+        going_down = builder.lt(builder.load(step), builder.const_int64(0))
+        in_range = builder._or(builder._and(going_up, builder.lt(current, builder.load(stop))),
+                               builder._and(going_down, builder.gt(current, builder.load(stop))))
+    builder.cond_br(in_range, block_range_next, block_end)
+
+    builder.set_insert_block(block_range_next)
+    store_target(visitor, target, lang_type.get_int_type(), builder.load(counter))
+    builder.br(block_body)
+
+    builder.set_insert_block(block_range_step)
+    # A step going past the i64 limits also goes past the stop, which always fits in an i64
+    next_value, overflow = builder.add_overflow(builder.load(counter), builder.load(step))
+    builder.store(next_value, counter)
+    builder.cond_br(overflow, block_end, block_range_cond)
+
+    # Generic iteration, calling whatever range is bound to
+    builder.set_insert_block(block_generic_setup)
+    boxed_args = []
+    for arg_type, arg_value in args:
+        boxed_args.append(runtime.value_to_pyobj(visitor, arg_value, arg_type)[1] if arg_type.is_primitive()
+                          else arg_value)
+    iterable_value = function.call_py_func_tp_call(visitor, range_obj, range_obj, boxed_args, {})
+    excp.check_excp(visitor, iterable_value)
+    builder.store(iterable_value, iterable)
+    iter_value = iterator.call_iter_iter(visitor, iterable_value)
+    excp.check_excp(visitor, iter_value)
+    builder.store(iter_value, iter_obj)
+    builder.store(builder.const_int1(False), is_range)
+    builder.br(block_generic_next)
+
+    builder.set_insert_block(block_generic_next)
+    next_obj = iterator.call_iter_next(visitor, builder.load(iter_obj))
+    is_over = builder.eq(next_obj, builder.const_null(code_type.get_py_obj_ptr(code_gen)))
+    builder.cond_br(is_over, block_generic_end, block_generic_store)
+
+    builder.set_insert_block(block_generic_end)
+    # A null item either ends the iteration or reports an exception
+    has_excp = builder.ne(excp.py_runtime_get_excp(code_gen, builder),
+                          builder.const_null(code_type.get_py_obj_ptr(code_gen)))
+    block_generic_excp = builder.create_block("Generic Loop Exception")
+    builder.cond_br(has_excp, block_generic_excp, block_end)
+    builder.set_insert_block(block_generic_excp)
+    excp.handle_raised_excp(visitor)
+
+    builder.set_insert_block(block_generic_store)
+    store_target(visitor, target, py_obj_type, next_obj)
+    builder.br(block_body)
+
+    # Shared body
+    builder.set_insert_block(block_body)
+    visitor.add_out_block(block_continue)  # In case of a break we want to jump after the for loop
+    visitor.visit(node.body)
+    visitor.pop_out_block()
+    builder.br(block_step)
+
+    builder.set_insert_block(block_step)
+    builder.cond_br(builder.load(is_range), block_range_step, block_generic_next)
+
+    if block_else is not None:
+        builder.set_insert_block(block_else)
+        visitor.visit(node.orelse)
+        builder.br(block_continue)
+
+    builder.set_insert_block(block_continue)
+    ref_counter.ref_decr_nullable(visitor, py_obj_type, builder.load(iter_obj))
+    ref_counter.ref_decr_nullable(visitor, py_obj_type, builder.load(iterable))
+
+
+def __visit_range_arg(visitor: ParserVisitor, node: ast.expr) -> tuple[LangType, int]:
+    """
+    Visit an argument of range. Int literals are emitted as primitives, other primitives are boxed since range only
+    accepts them once converted
+    """
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub) and isinstance(node.operand, ast.Constant):
+        const = op_call.get_primitive_const(visitor, ast.Constant(value=-node.operand.value)) \
+            if isinstance(node.operand.value, int) and not isinstance(node.operand.value, bool) else None
+    else:
+        const = op_call.get_primitive_const(visitor, node)
+    if const is not None and const[0].is_int():
+        return const
+
+    visitor.reset_last()
+    arg_type, arg_value = visitor.visit_node(node)
+    if arg_type.is_primitive() and not arg_type.is_int():
+        arg_type, arg_value = runtime.value_to_pyobj(visitor, arg_value, arg_type)
+    return arg_type, arg_value
+
+
+def __get_const_sign(node: ast.expr):
+    """
+    Returns the sign of a literal step, or 0 if the step is only known at runtime
+    """
+    value = None
+    if isinstance(node, ast.Constant):
+        value = node.value
+    elif isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub) and isinstance(node.operand, ast.Constant):
+        value = -node.operand.value if isinstance(node.operand.value, int) else None
+    if not isinstance(value, int) or isinstance(value, bool) or not -(1 << 63) <= value < (1 << 63):
+        return 0
+    return (value > 0) - (value < 0)
+
+
+def store_target(visitor: ParserVisitor, target: Variable, value_type: LangType, value: int):
+    """
+    Store the item of an iteration into the loop variable, converting it to the type of the variable.
+    The variable takes the reference to the item and releases the one to its previous item
+    """
+    code_gen, builder = visitor.get_code_gen(), visitor.get_builder()
+    if target.get_type().is_int() and not value_type.is_int():
+        as_long_func = code_gen.get_or_create_func("PyLong_AsLongLong", code_type.get_int64(),
+                                                   [code_type.get_py_obj_ptr(code_gen)], _gen.Linkage.EXTERNAL)
+        result = builder.call(as_long_func, [value])
+        # -1 is also a valid value, the error indicator tells if the conversion failed
+        has_excp = builder.ne(excp.py_runtime_get_excp(code_gen, builder),
+                              builder.const_null(code_type.get_py_obj_ptr(code_gen)))
+        block_excp = builder.create_block("Loop Target Conversion Failed")
+        block_converted = builder.create_block("Loop Target Converted")
+        builder.cond_br(builder._and(builder.eq(result, builder.const_int64(-1)), has_excp), block_excp,
+                        block_converted)
+        builder.set_insert_block(block_excp)
+        excp.handle_raised_excp(visitor)
+        builder.set_insert_block(block_converted)
+        ref_counter.ref_decr(visitor, value_type, value)
+        value = result
+    elif value_type.is_primitive() and not target.get_type().is_primitive():
+        value_type, value = runtime.value_to_pyobj(visitor, value, value_type)
+        if not hint.is_incremented_type(value_type):
+            ref_counter.ref_incr(builder, value_type, value)
+
+    if not target.get_type().is_primitive() and not target.is_arg():
+        ref_counter.ref_decr_nullable(visitor, target.get_type(), builder.load(target.get_code_value()))
+    builder.store(value, target.get_code_value())
@@ -1,13 +1,14 @@
 from __future__ import annotations
 import ast
-import copy
 from typing import TYPE_CHECKING, Any, Callable, Optional
 import flyable.code_gen.caller as caller
 import flyable.code_gen.code_gen as gen
 import flyable.code_gen.code_type as code_type
+import flyable.code_gen.exception as excp
 import flyable.code_gen.ref_counter as ref_counter
 import flyable.code_gen.runtime as runtime
 import flyable.data.lang_type as lang_type
+import flyable.data.type_hint as hint
 import flyable.parse.op as parse_op
 import ast
 
@@ -15,6 +16,9 @@ if TYPE_CHECKING:
     from flyable.parse.parser import ParserVisitor
     from flyable.data.lang_type import LangType
 
+INT64_MIN = -(1 << 63)
+INT64_MAX = (1 << 63) - 1
+
 
 def get_binary_op_func_to_call(op):
     func_op = {ast.Add: "PyNumber_Add",
@@ -50,16 +54,138 @@ def get_binary_aug_op_func_to_call(op):
     return func_op[type(op)]
 
 
+def get_int_bounds(value_type: LangType):
+    """
+    Returns the lowest and the highest values a primitive int or bool can hold
+    """
+    const_hint = hint.get_lang_type_contained_hint_type(value_type, hint.TypeHintConstInt)
+    if const_hint is not None:
+        return const_hint.get_value(), const_hint.get_value()
+    elif value_type.is_bool():
+        return 0, 1
+
+    bounds_hint = hint.get_lang_type_contained_hint_type(value_type, hint.TypeHintIntBounds)
+    if bounds_hint is not None:
+        return bounds_hint.get_min(), bounds_hint.get_max()
+    return INT64_MIN, INT64_MAX
+
+
+def get_int_type_in_bounds(min_value: int, max_value: int):
+    result = lang_type.get_int_type()
+    if min_value > INT64_MIN or max_value < INT64_MAX:
+        result.add_hint(hint.TypeHintIntBounds(min_value, max_value))
+    return result
+
+
+def get_int_op_bounds(op: ast.operator, type_left: LangType, type_right: LangType):
+    """
+    Returns the bounds of the result of an int +, - or *, or None when the result can go past the i64 limits
+    """
+    left_min, left_max = get_int_bounds(type_left)
+    right_min, right_max = get_int_bounds(type_right)
+    if isinstance(op, ast.Add):
+        result = left_min + right_min, left_max + right_max
+    elif isinstance(op, ast.Sub):
+        result = left_min - right_max, left_max - right_min
+    else:
+        products = [left_min * right_min, left_min * right_max, left_max * right_min, left_max * right_max]
+        result = min(products), max(products)
+    return result if INT64_MIN <= result[0] and result[1] <= INT64_MAX else None
+
+
+def is_int_bin_op(op: ast.operator, type_left: LangType, type_right: LangType):
+    """
+    Returns if the operation is an int +, - or * between primitive ints or bools
+    """
+    return type_left.is_primitive() and type_right.is_primitive() and not type_left.is_dec() and \
+        not type_right.is_dec() and isinstance(op, (ast.Add, ast.Sub, ast.Mult))
+
+
+def is_primitive_bin_op_valid(op: ast.operator, type_left: LangType, type_right: LangType):
+    """
+    Returns if the binary operation can be done directly on the primitive values, giving the same result as Python.
+    Python ints never overflow, so an int operation is only done on an i64 when its result is proven to fit
+    """
+    if not type_left.is_primitive() or not type_right.is_primitive():
+        return False
+    if is_int_bin_op(op, type_left, type_right):
+        return get_int_op_bounds(op, type_left, type_right) is not None
+    if isinstance(op, (ast.Add, ast.Sub, ast.Mult)):
+        return True
+    # A true division between ints gives a float in Python, so at least one of the values must already be a float
+    return isinstance(op, ast.Div) and (type_left.is_dec() or type_right.is_dec())
+
+
+def get_primitive_const(visitor: ParserVisitor, node: ast.expr) -> Optional[tuple[LangType, int]]:
+    """
+    Returns the constant as a primitive value, or None if the node isn't a constant of a primitive type
+    """
+    builder = visitor.get_builder()
+    if not isinstance(node, ast.Constant):
+        return None
+
+    if isinstance(node.value, bool):
+        result_type = lang_type.get_bool_type()
+        result_type.add_hint(hint.TypeHintConstBool(node.value))
+        return result_type, builder.const_int1(node.value)
+    elif isinstance(node.value, int) and -(1 << 63) <= node.value < (1 << 63):
+        result_type = lang_type.get_int_type()
+        result_type.add_hint(hint.TypeHintConstInt(node.value))
+        return result_type, builder.const_int64(node.value)
+    elif isinstance(node.value, float):
+        result_type = lang_type.get_dec_type()
+        result_type.add_hint(hint.TypeHintConstDec(node.value))
+        return result_type, builder.const_float64(node.value)
+    return None
+
+
+def __to_dec(visitor: ParserVisitor, value_type: LangType, value: int):
+    """
+    Convert a primitive int or bool to a float. A bool is unsigned, True being 1.0
+    """
+    if value_type.is_bool():
+        value = visitor.get_builder().zext(value, code_type.get_int64())
+    return visitor.get_builder().float_cast(value, code_type.get_double())
+
+
+def __check_zero_divisor(visitor: ParserVisitor, op: ast.operator, type_left: LangType, type_right: LangType,
+                         value_right: int):
+    """
+    Raise a ZeroDivisionError if the primitive divisor is zero, like Python does for the division ops
+    """
+    builder = visitor.get_builder()
+    if type_right.is_dec():
+        is_zero = builder.eq(value_right, builder.const_float64(0.0))
+    else:
+        is_zero = builder.eq(value_right, builder.const_int64(0))
+
+    if type_left.is_dec() or type_right.is_dec():
+        message = {ast.Div: "float division by zero", ast.FloorDiv: "float floor division by zero",
+                   ast.Mod: "float modulo"}[type(op)]
+    elif isinstance(op, ast.Div):
+        message = "division by zero"
+    else:
+        message = "integer division or modulo by zero"
+
+    zero_block = builder.create_block("Zero Divisor")
+    continue_block = builder.create_block("Valid Divisor")
+    builder.cond_br_weighted(is_zero, zero_block, continue_block, 1, 1000)
+
+    builder.set_insert_block(zero_block)
+    excp.raise_zero_division_error(visitor, message)
+    excp.handle_raised_excp(visitor)
+
+    builder.set_insert_block(continue_block)
+
+
 def __convert_type_to_match(visitor: ParserVisitor, type_left: LangType, value_left, type_right,
                             value_right):
     # Check the primitive type conversion
     if type_left.is_dec():
         # If left type is decimal, the right type must also be to return a decimal
         if type_right.is_int() or type_right.is_bool():
+            value_right = __to_dec(visitor, type_right, value_right)
             type_right = lang_type.get_dec_type()
-            value_right = visitor.get_builder().float_cast(
-                value_right, type_right.to_code_type(visitor.get_code_gen())
-            )
     elif type_left.is_int():
         if type_right.is_dec():
             type_left = lang_type.get_dec_type()
@@ -75,10 +201,9 @@ def __convert_type_to_match(visitor: ParserVisitor, type_left: LangType, value_l
 
     elif type_left.is_bool():
         if type_right.is_dec():
+            value_left = __to_dec(visitor, type_left, value_left)
             type_left = lang_type.get_dec_type()
-            value_left = visitor.get_builder().float_cast(
-                value_left, type_left.to_code_type(visitor.get_code_gen())
-            )
+            return type_left, value_left, type_right, value_right
         elif type_right.is_int():
             type_left = lang_type.get_int_type()
             value_left = visitor.get_builder().int_cast(
@@ -104,8 +229,8 @@ def bin_op(visitor: ParserVisitor, op: ast.operator, type_left: LangType, value_
     builder = visitor.get_builder()
 
     # Check the primitive type conversion
-    type_left, value_left, type_right, value_right = __convert_type_to_match(visitor, op, type_left, value_left,
-                                                                             type_right, value_right)
+    type_left, value_left, type_right, value_right = __convert_type_to_match(visitor, type_left, value_left, type_right,
+                                                                             value_right)
 
     if (  # left
             type_left.is_obj() or type_left.is_python_obj() or type_left.is_collection()
@@ -153,6 +278,9 @@ def bin_op(visitor: ParserVisitor, op: ast.operator, type_left: LangType, value_
         else:
             raise TypeError("Unsupported type for pow operator")
 
+    if isinstance(op, (ast.Div, ast.FloorDiv, ast.Mod)):
+        __check_zero_divisor(visitor, op, type_left, type_right, value_right)
+
     if isinstance(op, ast.FloorDiv):
         value_left = builder.float_cast(value_left, code_type.get_double())
         value_right = builder.float_cast(value_right, code_type.get_double())
@@ -169,8 +297,16 @@ def bin_op(visitor: ParserVisitor, op: ast.operator, type_left: LangType, value_
 
         return result_type, floored_div
 
-    result_type = copy.copy(type_left)
-    result_type.clear_hints()  # Since an op is done we remove the constant value hint
+    if isinstance(op, (ast.Add, ast.Sub, ast.Mult)) and type_left.is_int() and type_right.is_int():
+        bounds = get_int_op_bounds(op, type_left, type_right)
+        if bounds is None:
+            raise ValueError("Int operation not proven to fit an i64, it must be done by boxed_int_bin_op")
+        apply_op = {ast.Add: builder.add, ast.Sub: builder.sub, ast.Mult: builder.mul}[type(op)]
+        return get_int_type_in_bounds(*bounds), apply_op(value_left, value_right)
+
+    # Since an op is done the constant value hint doesn't apply. The hints of a loaded variable are shared, so they
+    # can't be cleared
+    result_type = lang_type.get_dec_type() if type_left.is_dec() else lang_type.get_int_type()
     apply_op: Callable[[Any, Any], Any]  # the binary operator we want to apply
 
     if isinstance(op, ast.Add):
@@ -203,6 +339,50 @@ def bin_op(visitor: ParserVisitor, op: ast.operator, type_left: LangType, value_
     return result_type, apply_op(value_left, value_right)
 
 
+def boxed_int_bin_op(visitor: ParserVisitor, op: ast.operator, type_left: LangType, value_left: int,
+                     type_right: LangType, value_right: int):
+    """
+    Generate an int +, - or * whose result isn't proven to fit an i64. Returns a new reference to a Python int.
+    The operation is done on the i64 values and the result boxed, unless it overflows. It's then done again on Python
+    ints, which never overflow
+    """
+    code_gen, builder = visitor.get_code_gen(), visitor.get_builder()
+    type_left, value_left, type_right, value_right = __convert_type_to_match(visitor, type_left, value_left, type_right,
+                                                                             value_right)
+    if isinstance(op, ast.Add):
+        result, overflow = builder.add_overflow(value_left, value_right)
+    elif isinstance(op, ast.Sub):
+        result, overflow = builder.sub_overflow(value_left, value_right)
+    else:
+        result, overflow = builder.mul_overflow(value_left, value_right)
+
+    result_var = visitor.generate_entry_block_var(code_type.get_py_obj_ptr(code_gen))
+    overflow_block = builder.create_block("Int Overflow")
+    box_block = builder.create_block("Box Int Result")
+    continue_block = builder.create_block("After Int Op")
+    builder.cond_br(overflow, overflow_block, box_block)
+
+    builder.set_insert_block(box_block)
+    builder.store(runtime.value_to_pyobj(visitor, result, lang_type.get_int_type())[1], result_var)
+    builder.br(continue_block)
+
+    builder.set_insert_block(overflow_block)
+    py_left_type, py_left = runtime.value_to_pyobj(visitor, value_left, type_left)
+    py_right_type, py_right = runtime.value_to_pyobj(visitor, value_right, type_right)
+    py_op_func = code_gen.get_or_create_func(get_binary_op_func_to_call(op), code_type.get_py_obj_ptr(code_gen),
+                                             [code_type.get_py_obj_ptr(code_gen)] * 2, gen.Linkage.EXTERNAL)
+    builder.store(builder.call(py_op_func, [py_left, py_right]), result_var)
+    ref_counter.ref_decr_multiple_incr(visitor, [py_left_type, py_right_type], [py_left, py_right])
+    builder.br(continue_block)
+
+    builder.set_insert_block(continue_block)
+    result_value = builder.load(result_var)
+    excp.check_excp(visitor, result_value)
+    result_type = lang_type.get_python_obj_type()
+    result_type.add_hint(hint.TypeHintRefIncr())
+    return result_type, result_value
+
+
 def cond_op(
         visitor: ParserVisitor,
         op: ast.operator,
@@ -260,7 +440,7 @@ def cond_op(
     if not isinstance(op, (ast.And, ast.BitAnd, ast.Or, ast.BitOr, ast.Is, ast.IsNot)):
         # Need to do the primitive type conversion
         _, first_value, _, second_value = __convert_type_to_match(
-            visitor, op, type_left, first_value, type_right, second_value
+            visitor, type_left, first_value, type_right, second_value
         )
 
     # the binary conditionnal operator we want to apply
@@ -413,16 +593,10 @@ def unary_op_invert(visitor, type, value, node):
         args = [value]
         return caller.call_obj(visitor, "__not__", value, type, args, args_types, {})
     elif type.is_int():
+        # -(x + 1) wrapping around the i64 limits is still ~x
         one_value = visitor.get_builder().const_int64(1)
-        one_type = lang_type.get_int_type()
-        add_type, add_value = bin_op(
-            visitor, ast.Add(), type, value, one_type, one_value
-        )
-        result = visitor.get_builder().neg(add_value)
-        ref_counter.ref_decr_multiple_incr(
-            visitor, [one_type, add_type], [one_value, add_value]
-        )
-        return type, result
+        result = visitor.get_builder().neg(visitor.get_builder().add(value, one_value))
+        return lang_type.get_int_type(), result
     elif type.is_dec():
         visitor.get_parser().throw_error(
             "TypeError: bad operand type for unary ~: 'float'",
@@ -433,16 +607,8 @@ def unary_op_invert(visitor, type, value, node):
         int_value = visitor.get_builder().neg(
             visitor.get_builder().int_cast(value, code_type.get_int64())
         )
-        int_type = lang_type.get_int_type()
         one_value = visitor.get_builder().const_int64(1)
-        one_type = lang_type.get_int_type()
-        add_type, add_value = bin_op(
-            visitor, ast.Add(), int_type, int_value, one_type, one_value
-        )
-        result = visitor.get_builder().neg(add_value)
-        ref_counter.ref_decr_multiple_incr(
-            visitor, [one_type, int_type, add_type], [one_value, int_value, add_value]
-        )
+        result = visitor.get_builder().neg(visitor.get_builder().add(int_value, one_value))
         return lang_type.get_int_type(), result
 
 
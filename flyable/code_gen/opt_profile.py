@@ -0,0 +1,142 @@
+"""
+Module related to the optimizations the native layer applies on the generated code
+"""
+from __future__ import annotations
+
+import ast
+import enum
+import json
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    from flyable.code_gen.code_writer import CodeWriter
+    from flyable.data.comp_data import CompData
+    from flyable.data.lang_func import LangFunc
+
+
+class OptLevel(enum.IntEnum):
+    O0 = 0,
+    O1 = 1,
+    O2 = 2,
+    O3 = 3,
+    Os = 4
+
+
+DEFAULT_LEVEL = -1
+"""Value written in the format when the level of the module should be used"""
+
+LOWER_INLINE_THRESHOLD_LLVM_VERSION = 16
+"""First LLVM version whose pipelines take the inliner threshold. Older ones can only add a more aggressive inliner"""
+
+DEFAULT_INLINE_THRESHOLDS = {OptLevel.O1: 225, OptLevel.O2: 225, OptLevel.O3: 250, OptLevel.Os: 50}
+"""Thresholds of the inliner LLVM derives from the levels"""
+
+DECORATOR_NAME = "optimize"
+"""Name of the decorator overriding the level of a function. Ex: @flyable.optimize("O0")"""
+
+
+def to_opt_level(value: str | int | OptLevel):
+    if isinstance(value, str):
+        try:
+            return OptLevel[value]
+        except KeyError:
+            raise ValueError(f"Unknown optimization level {value}") from None
+    return OptLevel(value)
+
+
+@dataclass
+class OptProfile:
+    """
+    Optimizations applied by the native layer on the module, with the levels overridden for specific functions
+    """
+    level: OptLevel = OptLevel.O3
+    inline_threshold: Optional[int] = None
+    """Threshold of the inliner. None lets LLVM derive it from the level"""
+    vectorize: bool = True
+    unroll_loops: bool = True
+    codegen_threads: int = 1
+    """Amount of threads emitting the machine code. Each thread emits a part of the module into its own object"""
+    functions: dict[str, OptLevel] = field(default_factory=dict)
+    """Levels overridden by function, the key being the qualified name of the function"""
+
+    @staticmethod
+    def from_file(path: str):
+        """
+        Read a profile from a JSON config file
+        Ex:
+        {
+            "level": "O2",
+            "inline_threshold": 250,
+            "vectorize": true,
+            "unroll_loops": false,
+            "codegen_threads": 4,
+            "functions": {"my_hot_func": "O3", "my_init_func": "O0"}
+        }
+        """
+        with open(path, "r", encoding="utf-8") as f:
+            config = json.load(f)
+
+        profile = OptProfile()
+        profile.level = to_opt_level(config.get("level", profile.level))
+        profile.inline_threshold = config.get("inline_threshold", profile.inline_threshold)
+        profile.vectorize = bool(config.get("vectorize", profile.vectorize))
+        profile.unroll_loops = bool(config.get("unroll_loops", profile.unroll_loops))
+        profile.codegen_threads = max(1, int(config.get("codegen_threads", profile.codegen_threads)))
+        profile.functions = {name: to_opt_level(level) for name, level in config.get("functions", {}).items()}
+        return profile
+
+    def set_function_level(self, name: str, level: OptLevel):
+        self.functions[name] = level
+
+    def get_function_level(self, func: LangFunc) -> Optional[OptLevel]:
+        """
+        Returns the level overridden for the function, or None if the function uses the level of the module.
+        A decorator in the source takes precedence over the profile.
+        """
+        decorator_level = get_decorator_level(func.get_node())
+        if decorator_level is not None:
+            return decorator_level
+        return self.functions.get(func.get_qualified_name())
+
+    def check_llvm_version(self, version: Optional[int]):
+        """
+        Raise a ValueError if the native layer, built with the given LLVM version, can't apply the profile.
+        Before LLVM 16 the inliner of the pipeline can't be tuned, so a threshold under the one of the level would be
+        silently ignored. A None version is a native layer too old to report it
+        """
+        default_threshold = DEFAULT_INLINE_THRESHOLDS.get(self.level)
+        if self.inline_threshold is None or default_threshold is None or self.inline_threshold >= default_threshold:
+            return
+
+        if version is None or version < LOWER_INLINE_THRESHOLD_LLVM_VERSION:
+            raise ValueError(f"An inline threshold under {default_threshold} at {self.level.name} requires a native "
+                             f"layer built with LLVM {LOWER_INLINE_THRESHOLD_LLVM_VERSION} or newer")
+
+    def write_to_code(self, writer: CodeWriter):
+        writer.add_int32(int(self.level))
+        writer.add_int32(self.inline_threshold if self.inline_threshold is not None else DEFAULT_LEVEL)
+        writer.add_int32(int(self.vectorize))
+        writer.add_int32(int(self.unroll_loops))
+        writer.add_int32(self.codegen_threads)
+
+
+def get_opt_profile(data: CompData) -> OptProfile:
+    profile = data.get_config("opt_profile")
+    return profile if profile is not None else OptProfile()
+
+
+def get_decorator_level(node: ast.AST) -> Optional[OptLevel]:
+    """
+    Look for an optimize decorator on the function node and returns the level it sets
+    """
+    for decorator in getattr(node, "decorator_list", []):
+        if not isinstance(decorator, ast.Call) or len(decorator.args) != 1:
+            continue
+
+        func = decorator.func
+        name = func.attr if isinstance(func, ast.Attribute) else func.id if isinstance(func, ast.Name) else None
+        arg = decorator.args[0]
+        if name == DECORATOR_NAME and isinstance(arg, ast.Constant) and isinstance(arg.value, str):
+            return to_opt_level(arg.value)
+    return None
@@ -0,0 +1,112 @@
+"""
+Module related to the instrumentation of the generated functions for the runtime profiler.
+
+An instrumented function calls the profiler when it starts and right before each of its returns, so the runtime
+counts the calls and the cycles spent in each function for every chain of calls (see runtime/src/profiler.c).
+The branches and the calls to the functions of the module are also recorded, for the profile guided optimization
+(see flyable/parse/pgo.py).
+"""
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+import flyable.code_gen.code_gen as gen
+import flyable.code_gen.code_type as code_type
+from flyable.data.lang_func_impl import FuncImplType
+
+# Masks of the types seen for an argument of a call site. Must match FlyableProfileTypeMask of the runtime
+TYPE_INT = 1
+TYPE_FLOAT = 2
+TYPE_BOOL = 4
+
+if TYPE_CHECKING:
+    from flyable.data.comp_data import CompData
+    from flyable.data.lang_type import LangType
+    from flyable.data.lang_func_impl import LangFuncImpl
+    from flyable.parse.parser_visitor import ParserVisitor
+
+
+def is_runtime_profiling(data: CompData):
+    return data.get_config("runtime_profiling", False)
+
+
+def get_profile_name(func_impl: LangFuncImpl):
+    """
+    Returns the name the profile shows for the implementation, the module and the qualified name of the function
+    followed by the kind of impl
+    """
+    parent = func_impl.get_parent_func()
+    name = parent.get_qualified_name()
+    if parent.get_file() is not None:
+        name = f"{parent.get_file().get_module_name()}.{name}"
+    if func_impl.get_impl_type() == FuncImplType.TP_CALL:
+        return name + " [tp]"
+    elif func_impl.get_impl_type() == FuncImplType.VEC_CALL:
+        return name + " [vec]"
+    return f"{name} [spec {func_impl.get_id()}]"
+
+
+def instrument_func(visitor: ParserVisitor, name: str):
+    """
+    Emit the entry of the function being generated into the profiler, at the current insert point. The exit is emitted
+    by the builder before each return
+    """
+    code_gen, builder = visitor.get_code_gen(), visitor.get_builder()
+    enter_func = code_gen.get_or_create_func("flyable_profiler_enter", code_type.get_void(),
+                                             [code_type.get_int32().get_ptr_to(), code_type.get_int8_ptr()],
+                                             gen.Linkage.EXTERNAL)
+    exit_func = code_gen.get_or_create_func("flyable_profiler_exit", code_type.get_void(), [], gen.Linkage.EXTERNAL)
+
+    id_var = code_gen.add_unique_global_var("@flyable@profile@id@", code_type.get_int32())
+    name_value = builder.ptr_cast(builder.global_str(name), code_type.get_int8_ptr())
+    builder.call(enter_func, [builder.global_var(id_var), name_value])
+    visitor.get_func().get_code_func().set_profile_exit(exit_func)
+
+
+def __add_site_id(visitor: ParserVisitor):
+    code_gen = visitor.get_code_gen()
+    id_var = code_gen.add_unique_global_var("@flyable@profile@site@", code_type.get_int32())
+    return visitor.get_builder().global_var(id_var)
+
+
+def instrument_branch(visitor: ParserVisitor, key: str, cond_value: int):
+    """
+    Record if the branch identified by the key is taken, cond_value being the boolean deciding the branch
+    """
+    code_gen, builder = visitor.get_code_gen(), visitor.get_builder()
+    branch_func = code_gen.get_or_create_func("flyable_profiler_branch", code_type.get_void(),
+                                              [code_type.get_int32().get_ptr_to(), code_type.get_int8_ptr(),
+                                               code_type.get_int32()], gen.Linkage.EXTERNAL)
+    key_value = builder.ptr_cast(builder.global_str(key), code_type.get_int8_ptr())
+    builder.call(branch_func, [__add_site_id(visitor), key_value, builder.zext(cond_value, code_type.get_int32())])
+
+
+def instrument_call(visitor: ParserVisitor, key: str, args: list[tuple[LangType, int]]):
+    """
+    Record a call made by the call site identified by the key, with the types of its arguments. The type of an unboxed
+    argument is already known, only the python objects are inspected at runtime
+    """
+    code_gen, builder = visitor.get_code_gen(), visitor.get_builder()
+    id_ptr_type = code_type.get_int32().get_ptr_to()
+    call_func = code_gen.get_or_create_func("flyable_profiler_call", code_type.get_void(),
+                                            [id_ptr_type, code_type.get_int8_ptr(), code_type.get_int32()],
+                                            gen.Linkage.EXTERNAL)
+    arg_func = code_gen.get_or_create_func("flyable_profiler_call_arg", code_type.get_void(),
+                                           [id_ptr_type, code_type.get_int32(), code_type.get_py_obj_ptr(code_gen)],
+                                           gen.Linkage.EXTERNAL)
+    arg_mask_func = code_gen.get_or_create_func("flyable_profiler_call_arg_mask", code_type.get_void(),
+                                                [id_ptr_type, code_type.get_int32(), code_type.get_int32()],
+                                                gen.Linkage.EXTERNAL)
+
+    id_value = __add_site_id(visitor)
+    key_value = builder.ptr_cast(builder.global_str(key), code_type.get_int8_ptr())
+    builder.call(call_func, [id_value, key_value, builder.const_int32(len(args))])
+    for i, (arg_type, arg) in enumerate(args):
+        if arg_type.is_int():
+            builder.call(arg_mask_func, [id_value, builder.const_int32(i), builder.const_int32(TYPE_INT)])
+        elif arg_type.is_dec():
+            builder.call(arg_mask_func, [id_value, builder.const_int32(i), builder.const_int32(TYPE_FLOAT)])
+        elif arg_type.is_bool():
+            builder.call(arg_mask_func, [id_value, builder.const_int32(i), builder.const_int32(TYPE_BOOL)])
+        else:
+            builder.call(arg_func, [id_value, builder.const_int32(i), arg])
@@ -36,7 +36,8 @@ class RefCounter:
 
 
 def is_ref_counting_type(value_type: LangType):
-    return not value_type.is_primitive() and not value_type.is_none() and not value_type.is_unknown()
+    return not value_type.is_primitive() and not value_type.is_none() and not value_type.is_unknown() and \
+        not hint.is_immortal_type(value_type)
 
 
 def __only_accept_ref_counting_type(func: Callable[[..., LangType, ...], Any]):
@@ -80,74 +81,52 @@ def set_ref_count(builder: CodeBuilder, obj: int, value: int):
 @__only_accept_ref_counting_type
 def ref_incr(builder: CodeBuilder, value_type: LangType, value: int):
     """
-    Generate the code to increment the reference counter by one
+    Generate the code to increment the reference counter by one.
+    The native layer pairs the increments with the decrements of the same object, cancels the pairs that can't change
+    the outcome and expands the others inline (see gen_layer/src/RefCountPass.hpp)
     """
-    ref_ptr = get_ref_counter_ptr(builder, value_type, value)
-    if ref_ptr is not None:
-        ref_count = builder.load(ref_ptr)
-        ref_count = builder.add(ref_count, builder.const_int64(1))
-        builder.store(ref_count, ref_ptr)
+    builder.incref(value)
 
 
 @__only_accept_ref_counting_type
 def ref_decr(visitor: ParserVisitor, value_type: LangType, value: int):
     """
+    Generate the code to decrement the reference counter by one, deallocating the object once it reaches zero.
+    Nothing is generated unless the release of the references is enabled, the objects are then never deallocated
+    """
+    import flyable.code_gen.caller as caller
+    import flyable.code_gen.runtime as runtime
+
     code_gen = visitor.get_code_gen()
     builder = visitor.get_builder()
 
-    ref_ptr = get_ref_counter_ptr(builder, value_type, value)
-    if ref_ptr is None:
+    if not code_gen.has_ref_release():
+        return
+
+    if not value_type.is_obj():
+        builder.decref(value)  # Python objects are deallocated through their type
         return
 
+    ref_ptr = get_ref_counter_ptr(builder, value_type, value)
     ref_count = builder.load(ref_ptr)
 
     dealloc_block = builder.create_block("Value Deallocation")
     decrement_block = builder.create_block("Value Ref Decrement")
+    continue_block = builder.create_block("After Ref Decrement")
 
     need_to_dealloc = builder.eq(ref_count, builder.const_int64(1))
     builder.cond_br(need_to_dealloc, dealloc_block, decrement_block)
 
     builder.set_insert_block(dealloc_block)
-    if value_type.is_python_obj():  # Python objects sometime check to make sure that the ref count is zero
-        # So we put it to zero to avoid generate an error
-        builder.store(builder.const_int64(0), ref_ptr)
-
-    if value_type.is_obj():
-        caller.call_obj(visitor, "__del__", value, value_type, [], [], {}, True)
-        runtime.free_call(code_gen, builder, value)
-    elif value_type.is_list() or value_type.is_tuple():
-        # Might be a bit slow to rely on dealloc call when we know that it's a list...
-        obj_type = fly_obj.get_py_obj_type(visitor.get_builder(), value)
-        dealloc_ptr = gen_type.py_object_type_get_dealloc_ptr(visitor, obj_type)
-        dealloc_type = code_type.get_func(code_type.get_void(),
-                                          [code_type.get_py_obj_ptr(code_gen)]).get_ptr_to().get_ptr_to()
-        dealloc_ptr = builder.ptr_cast(dealloc_ptr, dealloc_type)
-        dealloc_ptr = builder.load(dealloc_ptr)
-        builder.call_ptr(dealloc_ptr, [value])
-
-    elif value_type.is_python_obj() or value_type.is_dict():
-        obj_type = fly_obj.get_py_obj_type(visitor.get_builder(), value)
-        dealloc_ptr = gen_type.py_object_type_get_dealloc_ptr(visitor, obj_type)
-        dealloc_type = code_type.get_func(code_type.get_void(),
-                                          [code_type.get_py_obj_ptr(code_gen)]).get_ptr_to().get_ptr_to()
-        dealloc_ptr = builder.ptr_cast(dealloc_ptr, dealloc_type)
-        dealloc_ptr = builder.load(dealloc_ptr)
-        builder.call_ptr(dealloc_ptr, [value])
-
-    else:
-        raise TypeError("Type " + str(value_type) + " unsupported to decrement the ref counter")
-
-    continue_block = builder.create_block("After Ref Decrement")
-
+    caller.call_obj(visitor, "__del__", value, value_type, [], [], {}, True)
+    runtime.free_call(code_gen, builder, value)
     builder.br(continue_block)
 
     builder.set_insert_block(decrement_block)
-    new_ref_count = builder.sub(ref_count, builder.const_int64(1))
-    builder.store(new_ref_count, ref_ptr)
+    builder.store(builder.sub(ref_count, builder.const_int64(1)), ref_ptr)
     builder.br(continue_block)
 
     builder.set_insert_block(continue_block)
-    """
 
 
 @__only_accept_ref_counting_type
@@ -93,6 +93,8 @@ def value_to_pyobj(visitor, value: int, value_type: LangType):
             result_type.add_hint(type_hint.TypeHintRefIncr())
             return result_type, builder.call(py_func, [value])
         else:
+            if code_gen.has_immortal_constants():
+                result_type.add_hint(type_hint.TypeHintImmortal())
             return result_type, builder.load(
                 builder.global_var(code_gen.get_or_insert_const(int_const_hint.get_value())))
     elif value_type.is_dec():
@@ -103,6 +105,8 @@ def value_to_pyobj(visitor, value: int, value_type: LangType):
                                                   [code_type.get_double()], _code_gen.Linkage.EXTERNAL)
             return result_type, builder.call(py_func, [value])
         else:
+            if code_gen.has_immortal_constants():
+                result_type.add_hint(type_hint.TypeHintImmortal())
             return result_type, builder.load(
                 builder.global_var(code_gen.get_or_insert_const(dec_const_hint.get_value())))
     elif value_type.is_bool():
@@ -1,4 +1,139 @@
-
 """
 Module related to the sequence protocol
-"""
\ No newline at end of file
+"""
+from __future__ import annotations
+from typing import TYPE_CHECKING
+
+import flyable.code_gen.code_gen as gen
+import flyable.code_gen.code_type as code_type
+import flyable.code_gen.exception as excp
+import flyable.code_gen.list as gen_list
+import flyable.code_gen.ref_counter as ref_counter
+import flyable.code_gen.runtime as runtime
+import flyable.code_gen.tuple as gen_tuple
+import flyable.code_gen.type as gen_type
+import flyable.data.lang_type as lang_type
+
+if TYPE_CHECKING:
+    from flyable.parse.parser_visitor import ParserVisitor
+
+
+def normalize_index(visitor: ParserVisitor, index: int, size: int):
+    """
+    Generate the code returning the index counted from the start of the sequence, a negative index counting from the end
+    """
+    builder = visitor.get_builder()
+    is_negative = builder.zext(builder.lt(index, builder.const_int64(0)), code_type.get_int64())
+    return builder.add(index, builder.mul(is_negative, size))
+
+
+def check_index(visitor: ParserVisitor, index: int, size: int):
+    """
+    Generate the code raising an IndexError when the normalized index is outside the sequence
+    """
+    builder = visitor.get_builder()
+    valid_index_block = builder.create_block("Valid Index")
+    wrong_index_block = builder.create_block("Wrong Index")
+    in_bounds = builder._and(builder.gte(index, builder.const_int64(0)), builder.lt(index, size))
+    builder.cond_br(in_bounds, valid_index_block, wrong_index_block)
+
+    builder.set_insert_block(wrong_index_block)
+    excp.raise_index_error(visitor)
+    excp.handle_raised_excp(visitor)
+
+    builder.set_insert_block(valid_index_block)
+
+
+def py_object_get_item(visitor: ParserVisitor, obj: int, key: int):
+    """
+    Generate the code getting an item through the mapping protocol. Returns a new reference
+    """
+    code_gen = visitor.get_code_gen()
+    get_item = code_gen.get_or_create_func("PyObject_GetItem", code_type.get_py_obj_ptr(code_gen),
+                                           [code_type.get_py_obj_ptr(code_gen)] * 2, gen.Linkage.EXTERNAL)
+    return visitor.get_builder().call(get_item, [obj, key])
+
+
+def py_object_set_item(visitor: ParserVisitor, obj: int, key: int, item: int):
+    """
+    Generate the code setting an item through the mapping protocol. The item isn't stolen
+    """
+    code_gen = visitor.get_code_gen()
+    set_item = code_gen.get_or_create_func("PyObject_SetItem", code_type.get_int32(),
+                                           [code_type.get_py_obj_ptr(code_gen)] * 3, gen.Linkage.EXTERNAL)
+    return visitor.get_builder().call(set_item, [obj, key, item])
+
+
+def get_item_int(visitor: ParserVisitor, seq_type: lang_type.LangType, seq: int, index: int):
+    """
+    Generate the code returning a new reference to the item at an unboxed index.
+    Lists and tuples are read directly with a bounds check. When the type of the sequence isn't known, the read is
+    guarded by the type of the object and the other objects go through the mapping protocol
+    """
+    builder, code_gen = visitor.get_builder(), visitor.get_code_gen()
+    if seq_type.is_list():
+        result = gen_list.python_list_array_get_item(visitor, seq_type, seq, index)
+        ref_counter.ref_incr(builder, lang_type.get_python_obj_type(), result)
+        return result
+    elif seq_type.is_tuple():
+        result = gen_tuple.python_tuple_get_item(visitor, seq_type, seq, index)
+        ref_counter.ref_incr(builder, lang_type.get_python_obj_type(), result)
+        return result
+
+    result = visitor.generate_entry_block_var(code_type.get_py_obj_ptr(code_gen))
+    list_block = builder.create_block("Subscript List")
+    not_list_block = builder.create_block("Subscript Not List")
+    tuple_block = builder.create_block("Subscript Tuple")
+    generic_block = builder.create_block("Subscript Generic")
+    continue_block = builder.create_block("After Subscript")
+
+    builder.cond_br(gen_type.py_object_has_exact_type(visitor, seq, code_gen.get_list_type()), list_block,
+                    not_list_block)
+    builder.set_insert_block(list_block)
+    builder.store(get_item_int(visitor, lang_type.get_list_of_python_obj_type(), seq, index), result)
+    builder.br(continue_block)
+
+    builder.set_insert_block(not_list_block)
+    builder.cond_br(gen_type.py_object_has_exact_type(visitor, seq, code_gen.get_tuple_type()), tuple_block,
+                    generic_block)
+    builder.set_insert_block(tuple_block)
+    builder.store(get_item_int(visitor, lang_type.get_tuple_of_python_obj_type(), seq, index), result)
+    builder.br(continue_block)
+
+    builder.set_insert_block(generic_block)
+    key_type, key = runtime.value_to_pyobj(visitor, index, lang_type.get_int_type())
+    builder.store(py_object_get_item(visitor, seq, key), result)
+    ref_counter.ref_decr_incr(visitor, key_type, key)
+    builder.br(continue_block)
+
+    builder.set_insert_block(continue_block)
+    return builder.load(result)
+
+
+def set_item_int(visitor: ParserVisitor, seq_type: lang_type.LangType, seq: int, index: int, item: int):
+    """
+    Generate the code setting the item at an unboxed index. The item isn't stolen.
+    Lists are written directly with a bounds check, guarded by the type of the object when it isn't known
+    """
+    builder, code_gen = visitor.get_builder(), visitor.get_code_gen()
+    if seq_type.is_list():
+        gen_list.python_list_set_item(visitor, seq, index, item)
+        return
+
+    list_block = builder.create_block("Subscript Store List")
+    generic_block = builder.create_block("Subscript Store Generic")
+    continue_block = builder.create_block("After Subscript Store")
+
+    builder.cond_br(gen_type.py_object_has_exact_type(visitor, seq, code_gen.get_list_type()), list_block,
+                    generic_block)
+    builder.set_insert_block(list_block)
+    gen_list.python_list_set_item(visitor, seq, index, item)
+    builder.br(continue_block)
+
+    builder.set_insert_block(generic_block)
+    key_type, key = runtime.value_to_pyobj(visitor, index, lang_type.get_int_type())
+    py_object_set_item(visitor, seq, key, item)
+    ref_counter.ref_decr_incr(visitor, key_type, key)
+    builder.br(continue_block)
+
+    builder.set_insert_block(continue_block)
@@ -7,6 +7,7 @@ import flyable.code_gen.code_gen as gen
 import flyable.code_gen.code_type as code_type
 import flyable.code_gen.ref_counter as ref_counter
 import flyable.code_gen.fly_obj as fly_obj
+import flyable.code_gen.sequence as sequence
 from flyable.data import lang_type
 from flyable.parse.parser_visitor import ParserVisitor
 import flyable.code_gen.exception as excp
@@ -78,26 +79,15 @@ def python_tuple_get_content_ptr(visitor: ParserVisitor, tuple: int):
 
 
 def python_tuple_get_item(visitor: ParserVisitor, tuple_type: lang_type.LangType, tuple: int, index: int):
-    builder, code_gen = visitor.get_builder(), visitor.get_code_gen()
-    valid_index_block = builder.create_block("Tuple Valid Index")
-    wrong_index_block = builder.create_block("Tuple Wrong Index")
-    size = builder.load(python_tuple_get_size_ptr(visitor, tuple))
-    real_index = builder.mod(index, size)
-    valid_bounds = builder.lt(real_index, size)
-    builder.cond_br(valid_bounds, valid_index_block, wrong_index_block)
-    builder.set_insert_block(valid_index_block)
-    content = builder.ptr_cast(tuple, code_type.get_py_obj_ptr(code_gen).get_ptr_to())
-
-    # + 3 to skip the ref count, type and counts
-    content = builder.gep2(content, code_type.get_py_obj_ptr(code_gen), [index + 3])
-    result = builder.load(content)
-
-    builder.set_insert_block(wrong_index_block)
-    excp.raise_index_error(visitor)
-    excp.handle_raised_excp(visitor)
-
-    builder.set_insert_block(valid_index_block)
-    return result
+    """
+    Generate the code returning a borrowed reference to the item at the index, raising an IndexError when the index is
+    outside the tuple. A negative index counts from the end
+    """
+    size = python_tuple_len(visitor, tuple)
+    index = sequence.normalize_index(visitor, index, size)
+    sequence.check_index(visitor, index, size)
+    item_ptr = python_tuple_get_unsafe_item_ptr(visitor, lang_type.get_python_obj_type(), tuple, index)
+    return visitor.get_builder().load(item_ptr)
 
 
 def python_tuple_get_unsafe_item_ptr(visitor: ParserVisitor, tuple_type: lang_type.LangType, tuple: int, index: int):
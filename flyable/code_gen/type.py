@@ -2,6 +2,7 @@ from __future__ import annotations
 from typing import TYPE_CHECKING
 from flyable.code_gen.code_builder import CodeBuilder
 import flyable.code_gen.code_type as code_type
+import flyable.code_gen.fly_obj as fly_obj
 from flyable.data.lang_type import LangType
 
 if TYPE_CHECKING:
@@ -42,3 +43,24 @@ def py_object_type_get_iter(visitor: ParserVisitor, type: int):
 def py_object_type_get_vectorcall_offset_ptr(visitor: ParserVisitor, type: int):
     builder = visitor.get_builder()
     return visitor.get_builder().gep(type, builder.const_int32(0), builder.const_int32(7))
+
+
+def py_object_type_get_version_tag_ptr(visitor: ParserVisitor, type: int):
+    builder = visitor.get_builder()
+    return visitor.get_builder().gep(type, builder.const_int32(0), builder.const_int32(48))
+
+
+def py_object_type_get_vectorcall_ptr(visitor: ParserVisitor, type: int):
+    builder = visitor.get_builder()
+    return visitor.get_builder().gep(type, builder.const_int32(0), builder.const_int32(50))
+
+
+def py_object_has_exact_type(visitor: ParserVisitor, obj: int, type_var):
+    """
+    Generate the code checking that the type of the object is exactly the python type of the global variable.
+    Subclasses don't pass the check since they can override the protocols
+    """
+    builder = visitor.get_builder()
+    obj_type = builder.ptr_cast(fly_obj.get_py_obj_type(builder, obj), code_type.get_int8_ptr())
+    expected_type = builder.ptr_cast(builder.global_var(type_var), code_type.get_int8_ptr())
+    return builder.eq(obj_type, expected_type)
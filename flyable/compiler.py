@@ -1,15 +1,76 @@
 from __future__ import annotations
-from typing import TYPE_CHECKING, Optional
+
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Optional
 
 if TYPE_CHECKING:
     from flyable.data.comp_data import CompData
     from flyable.parse.parser import Parser
 
 import flyable.code_gen.code_gen as gen
+import flyable.code_gen.compile_profile as compile_profile
+import flyable.code_gen.opt_profile as opt_profile
 import flyable.parse.parser as par
+import flyable.parse.pgo as pgo
+import flyable.tool.build_cache as build_cache
 from flyable.code_gen.code_gen import CodeGen
+from flyable.code_gen.opt_profile import OptProfile
 from flyable.data import comp_data, lang_file
+from flyable.data.error import Error
 from flyable.data.error_thrower import ErrorThrower
+from flyable.debug.debug_flags_list import get_enabled_debug_flags, get_flag, get_flag_name
+
+
+@dataclass
+class ModuleJob:
+    """
+    Everything needed to compile a module into the cache, without sharing any state with the compiler.
+    A job can be sent to another process.
+    """
+    path: str
+    text: str
+    key: str
+    cache_dir: str
+    configs: list[tuple[str, Any]] = field(default_factory=list)
+    debug_flags: list[tuple[str, Any]] = field(default_factory=list)
+
+
+def compile_module(job: ModuleJob) -> tuple[list[Error], list[compile_profile.FuncRecord]]:
+    """
+    Parse and generate a single module into the cache. Returns the errors found while parsing, and the profile records
+    of the module when the compilation is profiled
+    """
+    for name, value in job.debug_flags:
+        get_flag(name).enable(value)
+
+    data = comp_data.CompData()
+    for name, value in job.configs:
+        data.set_config(name, value)
+    file = lang_file.LangFile(job.path, job.text)
+    data.add_file(file)
+
+    code_gen = gen.CodeGen(data)
+    code_gen.setup()
+    parser = par.Parser(data, code_gen)
+    parser.parse_file(file)
+
+    if parser.has_error():
+        return parser.get_errors(), []
+
+    cache = build_cache.BuildCache(job.cache_dir)
+    parts = opt_profile.get_opt_profile(data).codegen_threads
+    code_gen.generate_module_init(build_cache.get_module_init_name(job.key), [file])
+    try:
+        code_gen.write(cache.get_temp_object_path(job.key))
+        cache.commit_object(job.key, parts)
+    finally:
+        cache.discard_object(job.key, parts)
+
+    profile = code_gen.get_compile_profile()
+    return [], profile.get_records() if profile is not None else []
 
 
 class Compiler(ErrorThrower):
@@ -20,27 +81,149 @@ class Compiler(ErrorThrower):
         self._code_gen: CodeGen = gen.CodeGen(self._data)
         self._code_gen.setup()
         self._parser: Parser = par.Parser(self._data, self._code_gen)
+        self.__cache: Optional[build_cache.BuildCache] = None
+        self.__output_objects: list[str] = []
+        self.__jobs: int = 1
+        self.__profile_records: list[compile_profile.FuncRecord] = []
 
     def add_file(self, path: str):
         new_file: lang_file.LangFile = lang_file.LangFile()
         new_file.read_from_path(path)
         self._data.add_file(new_file)
 
+    def keep_files(self, paths: list[str]):
+        """
+        Forget all the files that are not part of the paths
+        """
+        paths = {os.path.abspath(path) for path in paths}
+        for file in list(self._data.files_iter()):
+            if file.get_path() not in paths:
+                self._data.remove_file(file.get_path())
+
     def set_output_path(self, path):
         self._data.set_config("output", path)
 
-    def compile(self):
+    def get_output_path(self):
+        return self._data.get_config("output")
+
+    def set_cache_dir(self, path: str | None):
+        """
+        Enable the incremental compilation. Each file gets compiled into its own object file stored in the cache
+        directory, and files that didn't change since the last compilation are only linked.
+        Passing None disables the incremental compilation.
+        """
+        self.__cache = build_cache.BuildCache(path) if path is not None else None
+
+    def set_opt_profile(self, profile: OptProfile):
+        """
+        Set the optimizations the native layer applies on the generated code
+        """
+        self._data.set_config("opt_profile", profile)
+
+    def set_stream_code(self, stream: bool):
+        """
+        Stream the generated code to the native layer through a memory mapped file instead of a memory buffer.
+        It keeps the memory usage low when compiling large modules.
+        """
+        self._data.set_config("stream_code", stream)
+
+    def set_eager_patching(self, eager: bool):
+        """
+        Patch the compiled functions of a module as soon as it's executed. Once no module is executing anymore, CPython
+        goes back to its default frame evaluation, so the interpreted code doesn't pay for the lookup of an
+        implementation on each call. The modules executed later install the frame evaluation back while they run.
+        """
+        self._data.set_config("eager_patching", eager)
 
-        self.__parse()
+    def set_immortal_constants(self, enabled: bool):
+        """
+        Create all the constants of the compiled code with a single runtime call, from a marshalled blob stored in the
+        data section, and make them immortal. Their uses then skip the reference counting.
+        """
+        self._data.set_config("immortal_constants", enabled)
 
-        self.throw_errors(self._parser.get_errors())
+    def set_ref_release(self, enabled: bool):
+        """
+        Decrement the reference counters when a reference is released, deallocating the objects no longer referenced.
+        Disabled by default, the compiled code then leaks the objects it releases.
+        """
+        self._data.set_config("ref_release", enabled)
+
+    def set_runtime_profiling(self, enabled: bool):
+        """
+        Instrument the compiled functions so the program counts their calls and the cycles spent in them, for every
+        chain of calls. The counters are stored in the file named by the FLYABLE_PROFILE environment variable when the
+        program runs, and can be read with flyable.tool.profile_dump.
+        """
+        self._data.set_config("runtime_profiling", enabled)
+
+    def set_profile_data(self, path: str | None):
+        """
+        Optimize the compiled code with the profile recorded by a program compiled with the runtime profiling. The
+        branches get weighted, the functions get specialized for the argument types observed at their call sites and
+        the functions called by hot call sites are hinted for inlining. Passing None disables it.
+        """
+        if path is not None:
+            pgo.read_profile_data(path)  # Fails now rather than in the middle of the compilation
+        self._data.set_config("profile_data", path)
+
+    def set_profile_output(self, path: str | None):
+        """
+        Profile the compilation of each function and write the report at the path, as CSV if the path ends with .csv
+        and as JSON otherwise. The functions are sorted from the most to the least costly to compile.
+        Passing None disables the profiling.
+        """
+        self._data.set_config("profile_output", path)
+
+    def set_jobs(self, jobs: int | None):
+        """
+        Set the number of processes compiling the modules at the same time when the incremental compilation is
+        enabled. Passing None uses one process per core.
+        """
+        self.__jobs = jobs if jobs is not None else os.cpu_count() or 1
+        if self.__jobs < 1:
+            raise ValueError("The compiler needs at least one job")
+
+    def get_output_objects(self):
+        """
+        Returns the paths of all the object files produced by the last compilation that need to be linked
+        """
+        return self.__output_objects.copy()
+
+    def compile(self):
+        self.__output_objects.clear()
+        self.__profile_records.clear()
+        modules_init = []
+
+        if self.__cache is None:
+            self.__parse()
+            self.throw_errors(self._parser.get_errors())
+        else:
+            modules_init = self.__compile_modules()
 
         for e in self.errors_iter():
             print(f"{e.message} [{e.line}, {e.row}]")
 
-        if not self.has_error():
+        if self.has_error():
+            self.__output_objects.clear()
+        elif self.__cache is None:
             self._code_gen.generate_main()
-            self._code_gen.write()
+            self.__output_objects[0:0] = self._code_gen.write()
+            self.__write_profile(self._code_gen)
+        else:
+            # The modules live in their own objects, so the entry point is generated alone
+            main_code_gen = gen.CodeGen(self._data)
+            main_code_gen.setup()
+            main_code_gen.generate_linked_main(modules_init)
+            self.__output_objects[0:0] = main_code_gen.write()
+            self.__write_profile(main_code_gen)
+
+    def __write_profile(self, code_gen: CodeGen):
+        output = compile_profile.get_profile_output(self._data)
+        profile = code_gen.get_compile_profile()
+        if output is not None and profile is not None:
+            profile.add_records(self.__profile_records)
+            profile.write(output)
 
     def __parse(self):
         code_gen = self._code_gen
@@ -48,3 +231,50 @@ class Compiler(ErrorThrower):
         for i in range(self._data.get_files_count()):
             file = self._data.get_file(i)
             self._parser.parse_file(file)
+
+    def __compile_modules(self):
+        """
+        Compile each file into its own object file, skipping the files already present in the cache.
+        Returns the names of the initialization functions of the modules
+        """
+        modules_init = []
+        jobs: list[ModuleJob] = []
+        configs = [(name, value) for name, value in self._data.configs_iter() if name != "output"]
+        debug_flags = [(get_flag_name(flag), flag.value) for flag in get_enabled_debug_flags()]
+        fingerprint = self.__get_configs_fingerprint()
+        parts = opt_profile.get_opt_profile(self._data).codegen_threads
+
+        for file in self._data.files_iter():
+            key = self.__cache.get_key(file.get_text(), [fingerprint])
+            if not self.__cache.has_object(key, parts):
+                jobs.append(ModuleJob(file.get_path(), file.get_text(), key, self.__cache.get_directory(), configs,
+                                      debug_flags))
+            modules_init.append(build_cache.get_module_init_name(key))
+            self.__output_objects += self.__cache.get_object_paths(key, parts)
+
+        if self.__jobs > 1 and len(jobs) > 1:
+            # Modules share no state, each worker writes its own object. Results are kept in the files order so the
+            # errors stay deterministic whatever worker finishes first
+            with ProcessPoolExecutor(max_workers=min(self.__jobs, len(jobs))) as executor:
+                results = list(executor.map(compile_module, jobs))
+        else:
+            results = [compile_module(job) for job in jobs]
+
+        # Replaces the errors of a previous compilation, even when every module was already cached
+        self.throw_errors([error for errors, records in results for error in errors])
+        for errors, records in results:
+            self.__profile_records += records
+        return modules_init
+
+    def __get_configs_fingerprint(self):
+        """
+        Returns a stable representation of the configs changing the generated code
+        """
+        configs = [f"{name}={value!r}" for name, value in self._data.configs_iter() if name != "output"]
+
+        # A new profile changes the generated code even when recorded at the same path
+        profile_path = self._data.get_config("profile_data")
+        if profile_path is not None:
+            with open(profile_path, "rb") as f:
+                configs.append(f"profile_data_hash={hashlib.sha256(f.read()).hexdigest()}")
+        return ";".join(sorted(configs))
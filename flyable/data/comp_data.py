@@ -18,6 +18,9 @@ class CompData:
     def add_file(self, file: LangFile):
         self.__files[file.get_path()] = file
 
+    def remove_file(self, path: str):
+        self.__files.pop(path, None)
+
     def get_file(self, index):
         if isinstance(index, str):  # get item by path
             return self.__files.get(index)
@@ -57,5 +60,8 @@ class CompData:
     def set_config(self, name: str, data: Any):
         self.__configs[name] = data
 
-    def get_config(self, name: str):
-        return self.__configs[name]
+    def get_config(self, name: str, default: Any = None):
+        return self.__configs.get(name, default)
+
+    def configs_iter(self):
+        return iter(self.__configs.items())
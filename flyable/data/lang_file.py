@@ -14,6 +14,7 @@ class LangFile:
         self.__path: str = path
         self.__text: str = txt
         self.__funcs = []
+        self.__module_funcs: dict[str, lang_func.LangFunc | None] = {}
 
     def read_from_path(self, path: str):
         with open(path, 'r', encoding='utf-8') as f:
@@ -70,6 +71,17 @@ class LangFile:
         func.set_file(self)
         self.__funcs.append(func)
 
+    def add_module_func(self, func: lang_func.LangFunc):
+        """
+        Register a function defined at the top level of the module. A name defined more than once can't be resolved
+        statically, so it isn't associated to any function
+        """
+        name = func.get_node().name
+        self.__module_funcs[name] = None if name in self.__module_funcs else func
+
+    def get_module_func(self, name: str) -> lang_func.LangFunc | None:
+        return self.__module_funcs.get(name)
+
     def get_func(self, index: int):
         return self.__funcs[index]
 
@@ -85,5 +97,11 @@ class LangFile:
     def get_path(self):
         return self.__path
 
+    def get_module_name(self):
+        """
+        Returns the name of the module, the name of the file without its extension
+        """
+        return os.path.splitext(os.path.basename(self.__path))[0]
+
     def get_text(self):
         return self.__text
@@ -80,6 +80,9 @@ class LangFunc:
                 return impl
         return None
 
+    def specialization_impls_iter(self):
+        return iter([impl for impl in self.__impls if impl.get_impl_type() is FuncImplType.SPECIALIZATION])
+
     def __setup_python_impl(self):
         # setup the tp call
         python_impl = LangFuncImpl()
@@ -126,6 +126,9 @@ class LangFuncImpl:
         elif self.__impl_type == FuncImplType.VEC_CALL:
             return [code_type.get_py_obj_ptr(gen), code_type.get_py_obj_ptr(gen).get_ptr_to(), code_type.get_int64(),
                     code_type.get_py_obj_ptr(gen)]
+        elif self.__impl_type == FuncImplType.SPECIALIZATION:
+            # The callable comes first, like the other impls, followed by the args with their specialized types
+            return [code_type.get_py_obj_ptr(gen)] + [arg.to_code_type(gen) for arg in self.__args]
         else:
             raise ValueError("Valid type expected to get signature")
 
@@ -136,7 +139,7 @@ class LangFuncImpl:
         elif self.get_impl_type() == FuncImplType.VEC_CALL:
             extension = "@vec@"
         elif self.get_impl_type() == FuncImplType.SPECIALIZATION:
-            extension = "@spec@"
+            extension = "@spec@" + str(self.get_id()) + "@"
         else:
             raise ValueError("Valid impl type expected")
         return self.__parent_func.get_name() + extension
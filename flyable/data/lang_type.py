@@ -77,11 +77,17 @@ def get_bool_type():
     return LangType(LangType.Type.BOOLEAN)
 
 
-def get_python_obj_type(type_hint=None):
+def get_python_obj_type():
     result = LangType(LangType.Type.PYTHON)
     return result
 
 
+def _get_python_obj_type_of(type_name: str):
+    result = get_python_obj_type()
+    result.add_hint(hint.TypeHintPythonType(type_name))
+    return result
+
+
 def get_obj_type(id: int):
     return LangType(LangType.Type.OBJECT, id)
 
@@ -95,23 +101,23 @@ def get_none_type():
 
 
 def get_str_type():
-    return get_python_obj_type(hint.TypeHintPythonType("builtins.str"))
+    return _get_python_obj_type_of("builtins.str")
 
 
 def get_list_of_python_obj_type():
-    return get_python_obj_type(hint.TypeHintPythonType("builtins.list"))
+    return _get_python_obj_type_of("builtins.list")
 
 
 def get_tuple_of_python_obj_type():
-    return get_python_obj_type(hint.TypeHintPythonType("builtins.tuple"))
+    return _get_python_obj_type_of("builtins.tuple")
 
 
 def get_set_of_python_obj_type():
-    return get_python_obj_type(hint.TypeHintPythonType("builtins.set"))
+    return _get_python_obj_type_of("builtins.set")
 
 
 def get_dict_of_python_obj_type():
-    return get_python_obj_type(hint.TypeHintPythonType("builtins.dict"))
+    return _get_python_obj_type_of("builtins.dict")
 
 
 def get_unknown_type():
@@ -72,6 +72,22 @@ class TypeHintConstStr(TypeHintConstValue):
         super().__init__(value)
 
 
+class TypeHintIntBounds(TypeHint):
+    """
+    Hint that indicates the lowest and the highest values an unboxed int can hold, both included
+    """
+
+    def __init__(self, min_value: int, max_value: int):
+        self.__min_value = min_value
+        self.__max_value = max_value
+
+    def get_min(self):
+        return self.__min_value
+
+    def get_max(self):
+        return self.__max_value
+
+
 class TypeHintCanBeNone(TypeHint):
     pass
 
@@ -173,6 +189,20 @@ class TypeHintRefIncr(TypeHint):
     pass
 
 
+def is_immortal_type(lang_type: LangType):
+    """
+    Return if the type contains the TypeHintImmortal hint
+    """
+    return get_lang_type_contained_hint_type(lang_type, TypeHintImmortal) is not None
+
+
+class TypeHintImmortal(TypeHint):
+    """
+    Hint that indicates that the value is never deallocated, so its reference counter doesn't need to be updated
+    """
+    pass
+
+
 class TypeHintRefCount(TypeHint):
     """
     Hint that indicates how many counts there is on the item when the counts is known
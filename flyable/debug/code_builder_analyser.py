@@ -29,6 +29,7 @@ CODE_BUILDER_IDS = [
     "load",
     "br",
     "cond_br",
+    "cond_br_weighted",
     "gep",
     "gep2",
     "call",
@@ -54,6 +55,8 @@ CODE_BUILDER_IDS = [
     "global_var",
     "global_str",
     "func_ptr",
+    "incref",
+    "decref",
     "size_of_type",
     "size_of_type_ptr_element",
     "print_value_type",
@@ -0,0 +1,314 @@
+"""
+Module handling the specialization of functions.
+
+A specialization is an implementation of a function where some arguments have a known type. The arguments of a
+primitive type (int, float, bool) are received unboxed, so the function body can operate directly on i64/f64 values
+instead of calling the Python number protocol.
+The signatures come from the annotations of the function, from the types a profiled run observed at its call sites
+and from the calls with literal arguments found in the module. The generic vectorcall implementation gets a guarded
+entry that checks the type of the arguments at runtime and forwards the call to the matching specialization.
+
+A call to a function of the same module also calls a specialization directly, without building any argument array,
+as long as the global name is still bound to a function patched with the compiled implementation.
+"""
+from __future__ import annotations
+
+import ast
+from typing import TYPE_CHECKING, Iterable
+
+import flyable.code_gen.code_gen as _gen
+import flyable.code_gen.code_type as code_type
+import flyable.code_gen.fly_obj as fly_obj
+import flyable.code_gen.function as function
+import flyable.code_gen.runtime as runtime
+import flyable.code_gen.type as _type
+import flyable.data.lang_type as lang_type
+import flyable.data.type_hint as hint
+import flyable.parse.local_types as local_types
+import flyable.parse.pgo as pgo
+from flyable.data.lang_func_impl import LangFuncImpl, FuncImplType
+
+if TYPE_CHECKING:
+    from flyable.data.lang_func import LangFunc
+    from flyable.data.lang_type import LangType
+    from flyable.parse.parser import Parser
+    from flyable.parse.parser_visitor import ParserVisitor
+
+MAX_SPECIALIZATIONS = 4
+"""Maximum amount of specializations generated for a single function"""
+
+PY_VECTORCALL_NARGS_MASK = (1 << 63) - 1
+"""Removes the PY_VECTORCALL_ARGUMENTS_OFFSET flag from the nargsf argument of a vectorcall"""
+
+
+def get_list_type(content: LangType):
+    result = lang_type.get_python_obj_type()
+    result.add_hint(hint.TypeHintPythonType("builtins.list"))
+    result.add_hint(hint.TypeHintCollectionContentHint(content))
+    return result
+
+
+def get_annotation_type(annotation: ast.expr | None) -> LangType:
+    """
+    Returns the type described by an argument annotation. Annotations that can't be specialized give a python object
+    """
+    if isinstance(annotation, ast.Name):
+        if annotation.id == "int":
+            return lang_type.get_int_type()
+        elif annotation.id == "float":
+            return lang_type.get_dec_type()
+        elif annotation.id == "bool":
+            return lang_type.get_bool_type()
+    elif isinstance(annotation, ast.Subscript) and isinstance(annotation.value, ast.Name):
+        if annotation.value.id == "list" and isinstance(annotation.slice, ast.Name) and annotation.slice.id == "int":
+            return get_list_type(lang_type.get_int_type())
+    return lang_type.get_python_obj_type()
+
+
+def get_literal_type(node: ast.expr) -> LangType:
+    """
+    Returns the type of a literal argument found at a call site. Non literal arguments give a python object
+    """
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)) and \
+            isinstance(node.operand, ast.Constant) and not isinstance(node.operand.value, bool):
+        node = node.operand
+
+    const_type = local_types.get_const_type(node)
+    if const_type is not None:
+        return const_type
+    elif isinstance(node, ast.List) and len(node.elts) > 0 and all(get_literal_type(e).is_int() for e in node.elts):
+        return get_list_type(lang_type.get_int_type())
+    return lang_type.get_python_obj_type()
+
+
+def get_signature_type(arg_type: LangType) -> LangType:
+    """
+    Returns the type an argument of a specialization is received as. Only the kind of the type is kept, an argument
+    found as a literal at a call site can hold any value inside the function
+    """
+    if arg_type.is_list():
+        return get_list_type(lang_type.get_int_type())
+    elif arg_type.is_int():
+        return lang_type.get_int_type()
+    elif arg_type.is_dec():
+        return lang_type.get_dec_type()
+    elif arg_type.is_bool():
+        return lang_type.get_bool_type()
+    return lang_type.get_python_obj_type()
+
+
+def get_signature_key(args_types: Iterable[LangType]):
+    """
+    Returns a hashable key so two signatures specializing the same way get the same key
+    """
+    return tuple((arg_type.get_type(), arg_type.is_list()) for arg_type in args_types)
+
+
+def is_specialized_signature(args_types: list[LangType]):
+    """
+    A signature is only worth an implementation if at least one argument can be received unboxed
+    """
+    return any(arg_type.is_primitive() for arg_type in args_types)
+
+
+def can_specialize(func: LangFunc):
+    node = func.get_node()
+    if not isinstance(node, ast.FunctionDef):
+        return False
+    args = node.args
+    if args.vararg is not None or args.kwarg is not None or len(args.kwonlyargs) > 0 or len(args.posonlyargs) > 0:
+        return False
+    return not local_types.has_nested_scope(node)
+
+
+def get_specialization_signatures(func: LangFunc, module: ast.Module,
+                                  profile: pgo.ProfileData = None) -> list[list[LangType]]:
+    """
+    Find the signatures the function should be specialized for, first from its annotations, then from the types
+    observed at the call sites of the profile starting with the most called site, then from the calls with literal
+    arguments inside the module
+    """
+    if not can_specialize(func):
+        return []
+
+    node: ast.FunctionDef = func.get_node()
+    args = node.args.args
+    unboxable = [local_types.is_name_unboxable(node, arg.arg) for arg in args]
+
+    calls = [call for call in ast.walk(module)
+             if isinstance(call, ast.Call) and isinstance(call.func, ast.Name) and call.func.id == node.name and
+             len(call.keywords) == 0 and len(call.args) == len(args) and
+             not any(isinstance(e, ast.Starred) for e in call.args)]
+
+    candidates = [[get_annotation_type(arg.annotation) for arg in args]]
+    if profile is not None:
+        keys = [pgo.get_site_key(func.get_file(), call) for call in calls]
+        for key in sorted(keys, key=profile.get_call_count, reverse=True):
+            observed = profile.get_observed_types(key, len(args))
+            if observed is not None:
+                candidates.append(observed)
+    candidates.extend([get_literal_type(e) for e in call.args] for call in calls)
+
+    result = []
+    found_keys = set()
+    for candidate in candidates:
+        # Arguments that can't stay unboxed inside the body are received as python objects
+        signature = [get_signature_type(arg_type) if arg_type.is_list() or not arg_type.is_primitive() or unboxable[i]
+                     else lang_type.get_python_obj_type() for i, arg_type in enumerate(candidate)]
+        key = get_signature_key(signature)
+        if is_specialized_signature(signature) and key not in found_keys:
+            found_keys.add(key)
+            result.append(signature)
+        if len(result) >= MAX_SPECIALIZATIONS:
+            break
+    return result
+
+
+def adapt_func(func: LangFunc, args_types: list[LangType], parser: Parser):
+    """
+    Returns the specialization of the function for the arguments types, generating it if it doesn't exist yet
+    """
+    if len(args_types) != len(func.get_node().args.args):
+        return None
+
+    key = get_signature_key(args_types)
+    for impl in func.specialization_impls_iter():
+        if get_signature_key(impl.args_iter()) == key:
+            return impl
+
+    new_impl = LangFuncImpl()
+    new_impl.set_impl_type(FuncImplType.SPECIALIZATION)
+    for arg_type in args_types:
+        new_impl.add_arg(arg_type)
+    func.add_impl(new_impl)
+    parser.parse_impl(new_impl)
+    return new_impl
+
+
+def get_direct_call_impl(func: LangFunc, args_types: list[LangType], parser: Parser):
+    """
+    Returns the specialization a direct call with arguments of the given types should target, or None if the function
+    can't be called directly. Once the function has all its specializations, the call targets the one receiving
+    python objects only
+    """
+    if not can_specialize(func) or len(args_types) != len(func.get_node().args.args):
+        return None
+
+    node: ast.FunctionDef = func.get_node()
+    # The arguments are converted to the types the callee declares, the values of the call site don't bound them
+    signature = [get_signature_type(arg_type) if arg_type.is_primitive() and
+                 local_types.is_name_unboxable(node, arg.arg) else lang_type.get_python_obj_type()
+                 for arg, arg_type in zip(node.args.args, args_types)]
+    key = get_signature_key(signature)
+    specs = list(func.specialization_impls_iter())
+    if all(get_signature_key(impl.args_iter()) != key for impl in specs) and len(specs) >= MAX_SPECIALIZATIONS:
+        signature = [lang_type.get_python_obj_type()] * len(args_types)
+    return adapt_func(func, signature, parser)
+
+
+def generate_direct_call(visitor: ParserVisitor, spec: LangFuncImpl, callable_value: int,
+                         args: list[tuple[LangType, int]], fail_block: int):
+    """
+    Call the specialization directly, with the arguments converted to its types. The callable must be the function
+    object patched with the compiled implementation of the function, otherwise the execution jumps to the fail block.
+    The call is only guarded, the caller is responsible of the generic call in the fail block
+    """
+    code_gen, builder = visitor.get_code_gen(), visitor.get_builder()
+    vec_impl = spec.get_parent_func().get_vec_call_impl()
+    vec_func = vec_impl.get_code_func()
+    if vec_func is None:
+        # The function is parsed later in the module, its implementation gets generated under the same name
+        vec_func = code_gen.get_or_create_func(vec_impl.get_full_name(), code_type.get_py_obj_ptr(code_gen),
+                                               vec_impl.get_code_func_args_signature(code_gen), _gen.Linkage.INTERNAL)
+    expected_vec = builder.ptr_cast(builder.func_ptr(vec_func), code_type.get_int8_ptr())
+
+    # Only the types of the patched functions have the compiled implementation as vectorcall, so the callable is known
+    # to be a function object before reading its own vectorcall
+    __guard(visitor, builder.ne(callable_value, builder.const_null(code_type.get_py_obj_ptr(code_gen))), fail_block)
+    callable_type = fly_obj.get_py_obj_type(builder, callable_value)
+    type_vec = builder.load(_type.py_object_type_get_vectorcall_ptr(visitor, callable_type))
+    __guard(visitor, builder.eq(type_vec, expected_vec), fail_block)
+    func_vec = builder.load(function.py_function_get_vectorcall_ptr(visitor, callable_value))
+    __guard(visitor, builder.eq(builder.ptr_cast(func_vec, code_type.get_int8_ptr()), expected_vec), fail_block)
+
+    spec_args = [callable_value]
+    for expected_type, (arg_type, arg_value) in zip(spec.args_iter(), args):
+        if not expected_type.is_primitive() and arg_type.is_primitive():
+            arg_type, arg_value = runtime.value_to_pyobj(visitor, arg_value, arg_type)
+        spec_args.append(arg_value)
+
+    spec_func = spec.get_code_func()
+    if spec_func is None:
+        spec_func = code_gen.get_or_create_func(spec.get_full_name(), code_type.get_py_obj_ptr(code_gen),
+                                                spec.get_code_func_args_signature(code_gen), _gen.Linkage.INTERNAL)
+    return builder.call(spec_func, spec_args)
+
+
+def generate_specialization_entry(visitor: ParserVisitor, spec: LangFuncImpl, callable_value: int, args_value: int,
+                                  nargs_value: int, kwnames_value: int):
+    """
+    Generate the guarded entry of a specialization inside the vectorcall implementation.
+    When the call only has positional arguments matching the types of the specialization, the arguments are unboxed
+    and the specialization is called. Otherwise, the execution continues to the next entry.
+    """
+    code_gen, builder = visitor.get_code_gen(), visitor.get_builder()
+    next_entry_block = builder.create_block("Next Specialization Entry")
+
+    # Only positional calls with the exact amount of args can be specialized
+    nargs = builder._and(nargs_value, builder.const_int64(PY_VECTORCALL_NARGS_MASK))
+    valid_nargs = builder.eq(nargs, builder.const_int64(spec.get_args_count()))
+    no_kwnames = builder.eq(kwnames_value, builder.const_null(code_type.get_py_obj_ptr(code_gen)))
+    __guard(visitor, builder._and(valid_nargs, no_kwnames), next_entry_block)
+
+    spec_args = [callable_value]
+    for i, arg_type in enumerate(spec.args_iter()):
+        item = builder.load(builder.gep2(args_value, code_type.get_py_obj_ptr(code_gen), [builder.const_int64(i)]))
+        spec_args.append(unbox_value(visitor, arg_type, item, next_entry_block))
+
+    builder.ret(builder.call(spec.get_code_func(), spec_args))
+    builder.set_insert_block(next_entry_block)
+
+
+def __guard(visitor: ParserVisitor, cond_value: int, fail_block: int):
+    builder = visitor.get_builder()
+    success_block = builder.create_block("Specialization Guard Passed")
+    builder.cond_br(cond_value, success_block, fail_block)
+    builder.set_insert_block(success_block)
+
+
+def __guard_type(visitor: ParserVisitor, item: int, type_var: _gen.GlobalVar, fail_block: int):
+    builder = visitor.get_builder()
+    item_type = builder.ptr_cast(fly_obj.get_py_obj_type(builder, item), code_type.get_int8_ptr())
+    expected_type = builder.ptr_cast(builder.global_var(type_var), code_type.get_int8_ptr())
+    __guard(visitor, builder.eq(item_type, expected_type), fail_block)
+
+
+def unbox_value(visitor: ParserVisitor, value_type: LangType, item: int, fail_block: int):
+    """
+    Check that the python object has the expected type and returns its unboxed value.
+    The execution jumps to the fail block when the object can't be unboxed
+    """
+    code_gen, builder = visitor.get_code_gen(), visitor.get_builder()
+    if value_type.is_int():
+        __guard_type(visitor, item, code_gen.get_long_type(), fail_block)
+        # Ints too large for an i64 go through the generic implementation
+        overflow = visitor.generate_entry_block_var(code_type.get_int32())
+        as_long_args = [code_type.get_py_obj_ptr(code_gen), code_type.get_int32().get_ptr_to()]
+        as_long_func = code_gen.get_or_create_func("PyLong_AsLongLongAndOverflow", code_type.get_int64(), as_long_args,
+                                                   _gen.Linkage.EXTERNAL)
+        result = builder.call(as_long_func, [item, overflow])
+        __guard(visitor, builder.eq(builder.load(overflow), builder.const_int32(0)), fail_block)
+        return result
+    elif value_type.is_dec():
+        __guard_type(visitor, item, code_gen.get_float_type(), fail_block)
+        as_double_func = code_gen.get_or_create_func("PyFloat_AsDouble", code_type.get_double(),
+                                                     [code_type.get_py_obj_ptr(code_gen)], _gen.Linkage.EXTERNAL)
+        return builder.call(as_double_func, [item])
+    elif value_type.is_bool():
+        __guard_type(visitor, item, code_gen.get_bool_type(), fail_block)
+        true_value = builder.ptr_cast(builder.global_var(code_gen.get_true()), code_type.get_int8_ptr())
+        return builder.eq(builder.ptr_cast(item, code_type.get_int8_ptr()), true_value)
+    elif value_type.is_list():
+        # The content isn't checked, the list stays boxed
+        __guard_type(visitor, item, code_gen.get_list_type(), fail_block)
+    return item
@@ -8,7 +8,7 @@ from itertools import pairwise, accumulate
 from typing import TYPE_CHECKING
 import flyable.data.type_hint as hint
 
-from flyable.code_gen import op_call, debug, caller, code_type
+from flyable.code_gen import op_call, debug, caller, code_type, runtime
 from flyable.code_gen.tuple import python_tuple_new_alloca, python_tuple_set
 from flyable.data import lang_type
 from flyable.parse import build_in
@@ -23,21 +23,24 @@ import flyable.code_gen.ref_counter as ref_counter
 
 def parse_compare(visitor: ParserVisitor, node: Compare):
     def compare(current: tuple[LangType, int], comparison: tuple[LangType, int]) -> tuple[LangType, int]:
-        left_type, left_val = current
-        right_type, right_val = comparison
+        left_type, left_val, right_type, right_val = _box_mixed_primitive(visitor, *current, *comparison)
         result = op_call.cond_op(visitor, ast.BitAnd(), left_type, left_val, right_type, right_val)
         ref_counter.ref_decr_incr(visitor, right_type, right_val)
         return result
 
     def do_cond_op(prev: tuple[LangType, int] | None, current_args):
         left, op, right = current_args
-        left_type, left_val = left
-        right_type, right_val = right
+        left_type, left_val, right_type, right_val = _box_mixed_primitive(visitor, *left, *right)
 
         result_type, result_val = op_call.cond_op(visitor, op, left_type, left_val, right_type, right_val)
         return compare(prev, (result_type, result_val)) if prev is not None else (result_type, result_val)
 
-    comparators = [visitor.visit_node(comparator) for comparator in (node.left, *node.comparators)]
+    nodes = (node.left, *node.comparators)
+    comparators = [visitor.visit_node(comparator) for comparator in nodes]
+
+    # Constants compared with primitives don't need to be boxed
+    if any(comparator_type.is_primitive() for comparator_type, _ in comparators):
+        comparators = [op_call.get_primitive_const(visitor, e) or comparators[i] for i, e in enumerate(nodes)]
 
     if len(node.ops) == 1:
         return do_cond_op(None, (comparators[0], node.ops[0], comparators[1]))
@@ -49,3 +52,14 @@ def parse_compare(visitor: ParserVisitor, node: Compare):
     ref_counter.ref_decr_incr(visitor, last_comparator_type, last_comparator_val)
 
     return compare_result
+
+
+def _box_mixed_primitive(visitor: ParserVisitor, left_type: LangType, left_val: int, right_type: LangType,
+                         right_val: int):
+    """
+    A primitive compared with a python object needs to be boxed to go through the rich compare protocol
+    """
+    if left_type.is_primitive() != right_type.is_primitive():
+        left_type, left_val = runtime.value_to_pyobj(visitor, left_val, left_type)
+        right_type, right_val = runtime.value_to_pyobj(visitor, right_val, right_type)
+    return left_type, left_val, right_type, right_val
@@ -0,0 +1,332 @@
+"""
+Module inferring which values of a function can stay unboxed.
+
+A local variable is kept as a primitive (i64 or double) when every value stored in it is statically known to be of
+the same primitive type, and every use of the variable accepts a primitive. The value only gets boxed into a Python
+object where it escapes: when passed to a call, returned, stored in a python object variable...
+"""
+from __future__ import annotations
+
+import ast
+import functools
+from typing import TYPE_CHECKING, Optional
+
+import flyable.code_gen.op_call as op_call
+import flyable.data.lang_type as lang_type
+import flyable.data.type_hint as hint
+from flyable.data.lang_func_impl import FuncImplType
+
+if TYPE_CHECKING:
+    from flyable.data.lang_func_impl import LangFuncImpl
+    from flyable.data.lang_type import LangType
+
+__INT64_MIN = -(1 << 63)
+__INT64_MAX = (1 << 63) - 1
+
+__UNBOXED_PARENTS = (ast.Return, ast.Expr, ast.UnaryOp, ast.AugAssign)
+"""Nodes that accept a primitive value wherever it shows up in them"""
+
+__BOOL_PARENTS = (ast.If, ast.While, ast.IfExp, ast.Return, ast.Expr, ast.UnaryOp, ast.BoolOp, ast.Call)
+"""Nodes that accept the boolean result of a primitive comparison"""
+
+__PRIMITIVE_COMPARE_OPS = (ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE)
+
+__MAX_BOUNDS_GROWTHS = 2
+"""Times the bounds of an int local can grow before they are widened to the i64 limits"""
+
+
+def has_nested_scope(node: ast.AST):
+    """
+    Nested scopes can capture the variables of the function, so they need to stay python objects
+    """
+    return any(e is not node and isinstance(e, (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda, ast.ClassDef))
+               for e in ast.walk(node))
+
+
+def get_const_type(node: ast.expr) -> Optional[LangType]:
+    """
+    Returns the primitive type a constant gets when it operates with a primitive value
+    """
+    if isinstance(node, ast.Constant):
+        if isinstance(node.value, bool):
+            return lang_type.get_bool_type()
+        elif isinstance(node.value, int) and __INT64_MIN <= node.value <= __INT64_MAX:
+            result = lang_type.get_int_type()
+            result.add_hint(hint.TypeHintConstInt(node.value))
+            return result
+        elif isinstance(node.value, float):
+            return lang_type.get_dec_type()
+    return None
+
+
+def is_range_call(node: ast.expr):
+    return isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id == "range" and \
+        1 <= len(node.args) <= 3 and len(node.keywords) == 0 and \
+        not any(isinstance(e, ast.Starred) for e in node.args)
+
+
+def is_range_loop(node: ast.For, func_node: ast.AST):
+    """
+    Returns if the for loop iterates over the range builtin with a simple target.
+    A range rebound inside the function is a local, so it can't be the builtin
+    """
+    return isinstance(node.target, ast.Name) and is_range_call(node.iter) and not is_local_name(func_node, "range")
+
+
+def is_local_name(func_node: ast.AST, name: str):
+    if not isinstance(func_node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+        return False  # Outside a function, the name is a global and gets checked at runtime
+
+    args = func_node.args
+    all_args = args.posonlyargs + args.args + args.kwonlyargs + [e for e in (args.vararg, args.kwarg) if e is not None]
+    if any(arg.arg == name for arg in all_args):
+        return True
+    return any(isinstance(e, ast.Name) and e.id == name and not isinstance(e.ctx, ast.Load)
+               for e in ast.walk(func_node))
+
+
+def infer_expr_type(node: ast.expr, env: dict[str, LangType]) -> Optional[LangType]:
+    """
+    Returns the primitive type the visitor generates for the expression, or None if it generates a python object.
+    The inference must follow what the visitor does, a constant alone being a python object for example.
+    """
+    if isinstance(node, ast.Name):
+        return env.get(node.id)
+    elif isinstance(node, ast.BinOp):
+        left_type = infer_expr_type(node.left, env)
+        right_type = infer_expr_type(node.right, env)
+        if left_type is not None and right_type is None:
+            right_type = get_const_type(node.right)
+        elif right_type is not None and left_type is None:
+            left_type = get_const_type(node.left)
+
+        if left_type is None or right_type is None or not op_call.is_primitive_bin_op_valid(node.op, left_type,
+                                                                                              right_type):
+            return None
+        elif left_type.is_dec() or right_type.is_dec():
+            return lang_type.get_dec_type()
+        # Bools are converted into ints by the operation
+        return op_call.get_int_type_in_bounds(*op_call.get_int_op_bounds(node.op, left_type, right_type))
+    return None
+
+
+def infer_local_types(func_impl: LangFuncImpl) -> dict[str, LangType]:
+    """
+    Returns the locals of the implementation that can be kept unboxed, with their type
+    """
+    node = func_impl.get_parent_func().get_node()
+    if not isinstance(node, ast.FunctionDef) or has_nested_scope(node):
+        return {}
+
+    env: dict[str, LangType] = {}
+    file = func_impl.get_parent_func().get_file()
+    range_rebound = file is None or "range" in __get_module_bound_names(file.get_text())
+    args = [arg.arg for arg in node.args.args]
+    if func_impl.get_impl_type() == FuncImplType.SPECIALIZATION:
+        for arg, arg_type in zip(args, func_impl.args_iter()):
+            if arg_type.is_primitive():
+                env[arg] = arg_type
+
+    declared = {name for e in ast.walk(node) if isinstance(e, (ast.Global, ast.Nonlocal)) for name in e.names}
+    stores = __get_stores(node)
+    candidates = {name: values for name, values in stores.items()
+                  if name not in args and name not in declared and values is not None and
+                  is_name_unboxable(node, name, allow_stores=True)}
+
+    # Optimistic pass: every candidate takes the type of the first store that can be inferred
+    locals_types: dict[str, LangType] = {}
+    changed = True
+    while changed:
+        changed = False
+        for name, values in candidates.items():
+            if name not in locals_types:
+                for value in values:
+                    value_type = __infer_store_type(name, value, {**env, **locals_types}, range_rebound)
+                    if value_type is not None and (value_type.is_int() or value_type.is_dec()):
+                        locals_types[name] = __get_local_type([value_type])
+                        changed = True
+                        break
+
+    # Then remove the candidates with a store giving another type, until all the remaining ones agree. The bounds of
+    # an int local hold every value stored in it, the operations using it being unboxed only when they can't overflow
+    bounds_growths: dict[str, int] = {}
+    changed = True
+    while changed:
+        changed = False
+        for name in list(locals_types.keys()):
+            current_env = {**env, **locals_types}
+            values_types = [__infer_store_type(name, value, current_env, range_rebound) for value in candidates[name]]
+            if any(e is None or e.get_type() != locals_types[name].get_type() for e in values_types):
+                del locals_types[name]
+                changed = True
+                continue
+
+            local_type = __get_local_type(values_types)
+            if local_type.is_int() and op_call.get_int_bounds(local_type) != op_call.get_int_bounds(locals_types[name]):
+                # Bounds growing on each pass come from a value depending on itself, only the i64 limits bound it
+                bounds_growths[name] = bounds_growths.get(name, 0) + 1
+                if bounds_growths[name] > __MAX_BOUNDS_GROWTHS:
+                    local_type = lang_type.get_int_type()
+                if op_call.get_int_bounds(local_type) != op_call.get_int_bounds(locals_types[name]):
+                    locals_types[name] = local_type
+                    changed = True
+    return locals_types
+
+
+def __get_local_type(values_types: list[LangType]) -> LangType:
+    """
+    Returns the type of a local holding values of the types, an int local being bounded by all of its values
+    """
+    if not values_types[0].is_int():
+        return lang_type.get_dec_type()
+    bounds = [op_call.get_int_bounds(e) for e in values_types]
+    return op_call.get_int_type_in_bounds(min(e[0] for e in bounds), max(e[1] for e in bounds))
+
+
+def __get_stores(node: ast.FunctionDef) -> dict[str, Optional[list[ast.AST]]]:
+    """
+    Returns the nodes storing a value into each name of the function.
+    A name stored by a node that isn't a simple assignment gets None
+    """
+    result: dict[str, Optional[list[ast.AST]]] = {}
+    simple_stores = set()
+    for e in ast.walk(node):
+        if isinstance(e, ast.Assign) and all(isinstance(target, ast.Name) for target in e.targets):
+            for target in e.targets:
+                simple_stores.add(target)
+                __add_store(result, target.id, e.value)
+        elif isinstance(e, ast.AnnAssign) and isinstance(e.target, ast.Name):
+            # An annotation without value only declares the name
+            simple_stores.add(e.target)
+            if e.value is not None:
+                __add_store(result, e.target.id, e.value)
+            else:
+                result.setdefault(e.target.id, [])
+        elif isinstance(e, ast.AugAssign) and isinstance(e.target, ast.Name):
+            simple_stores.add(e.target)
+            __add_store(result, e.target.id, e)
+        elif isinstance(e, ast.For) and is_range_loop(e, node):
+            simple_stores.add(e.target)
+            __add_store(result, e.target.id, e)
+
+    for e in ast.walk(node):
+        if isinstance(e, ast.Name) and not isinstance(e.ctx, ast.Load) and e not in simple_stores:
+            result[e.id] = None
+    return result
+
+
+def __add_store(stores: dict[str, Optional[list[ast.AST]]], name: str, value: ast.AST):
+    values = stores.setdefault(name, [])
+    if values is not None:
+        values.append(value)
+
+
+@functools.lru_cache(maxsize=64)
+def __get_module_bound_names(text: str) -> frozenset[str]:
+    """
+    Returns the names the module source can bind, anywhere in it. A star import can bind any name
+    """
+    result = set()
+    for e in ast.walk(ast.parse(text)):
+        if isinstance(e, ast.Name) and not isinstance(e.ctx, ast.Load):
+            result.add(e.id)
+        elif isinstance(e, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            result.add(e.name)
+        elif isinstance(e, ast.ExceptHandler) and e.name is not None:
+            result.add(e.name)
+        elif isinstance(e, ast.alias):
+            result.add(e.asname if e.asname is not None else e.name.split(".")[0])
+            if e.name == "*":
+                result.add("range")
+    return frozenset(result)
+
+
+def __infer_range_target_type(node: ast.For, env: dict[str, LangType]) -> Optional[LangType]:
+    """
+    Returns the type of the target of a range loop, an int only when the bounds are ints already known to fit an i64.
+    The range loop then always iterates natively, unless the builtin range itself gets replaced
+    """
+    bounds = []
+    for arg in node.iter.args:
+        if isinstance(arg, ast.UnaryOp) and isinstance(arg.op, ast.USub) and isinstance(arg.operand, ast.Constant) \
+                and isinstance(arg.operand.value, int):
+            arg_type = get_const_type(ast.Constant(value=-arg.operand.value))
+        else:
+            arg_type = get_const_type(arg) if isinstance(arg, ast.Constant) else infer_expr_type(arg, env)
+        if arg_type is None or not arg_type.is_int():
+            return None
+        bounds.append(op_call.get_int_bounds(arg_type))
+
+    # The target is always between the start and the stop, whatever the step
+    start, stop = ((0, 0), bounds[0]) if len(bounds) == 1 else (bounds[0], bounds[1])
+    return op_call.get_int_type_in_bounds(min(start[0], stop[0]), max(start[1], stop[1]))
+
+
+def __infer_store_type(name: str, value: ast.AST, env: dict[str, LangType], range_rebound: bool) -> Optional[LangType]:
+    if isinstance(value, ast.For):
+        return None if range_rebound else __infer_range_target_type(value, env)
+    elif isinstance(value, ast.AugAssign):
+        binary = ast.BinOp(left=ast.Name(id=name, ctx=ast.Load()), op=value.op, right=value.value)
+        return infer_expr_type(binary, env)
+    # A constant stored in an unboxed local is emitted as a primitive
+    const_type = get_const_type(value)
+    return const_type if const_type is not None else infer_expr_type(value, env)
+
+
+def is_name_unboxable(node: ast.FunctionDef, name: str, allow_stores: bool = False):
+    """
+    Returns if the name can hold an unboxed value. Every use of the value must accept a primitive, directly or once
+    combined with other values by a binary operation. Without allow_stores, the name must also never be rebound.
+    """
+    parents = {}
+    for parent in ast.walk(node):
+        for child in ast.iter_child_nodes(parent):
+            parents[child] = parent
+
+    for e in ast.walk(node):
+        if not isinstance(e, ast.Name) or e.id != name:
+            continue
+        if not isinstance(e.ctx, ast.Load):
+            if not allow_stores or not __is_simple_store(parents.get(e), e):
+                return False
+            continue
+
+        # The result of an operation between primitives is also a primitive
+        current = e
+        while isinstance(parents.get(current), ast.BinOp):
+            current = parents[current]
+
+        parent = parents.get(current)
+        if isinstance(parent, ast.Compare):
+            if not all(isinstance(op, __PRIMITIVE_COMPARE_OPS) for op in parent.ops) or \
+                    not __accepts_primitive(parents.get(parent), parent, __BOOL_PARENTS):
+                return False
+        elif not __accepts_primitive(parent, current, __UNBOXED_PARENTS):
+            return False
+    return True
+
+
+def __is_simple_store(parent: ast.AST | None, target: ast.Name):
+    if isinstance(parent, ast.Assign):
+        return all(isinstance(e, ast.Name) for e in parent.targets)
+    elif isinstance(parent, (ast.AnnAssign, ast.AugAssign)):
+        return parent.target is target
+    elif isinstance(parent, ast.For):
+        return parent.target is target and is_range_call(parent.iter)
+    return False
+
+
+def __accepts_primitive(parent: ast.AST | None, child: ast.AST, accepting_parents: tuple):
+    if isinstance(parent, ast.Call):
+        return child in parent.args
+    elif isinstance(parent, (ast.If, ast.While)):
+        return child is parent.test
+    elif isinstance(parent, ast.Assign):
+        return child is parent.value and all(isinstance(target, ast.Name) for target in parent.targets)
+    elif isinstance(parent, ast.AnnAssign):
+        return child is parent.value and isinstance(parent.target, ast.Name)
+    elif isinstance(parent, ast.AugAssign):
+        return child is parent.value
+    elif isinstance(parent, ast.IfExp):
+        return child is parent.test
+    return isinstance(parent, accepting_parents)
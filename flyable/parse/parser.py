@@ -11,6 +11,8 @@ if TYPE_CHECKING:
     from flyable.parse.parser_visitor import ParserVisitor
 
 import flyable.data.lang_func_impl as impl
+import flyable.parse.adapter as adapter
+import flyable.parse.pgo as pgo
 from flyable.data.error_thrower import ErrorThrower
 import flyable.data.lang_func as lang_func
 
@@ -28,26 +30,45 @@ class Parser(ErrorThrower):
             """
             def __init__(self, parser):
                 self.__parser = parser
-                
+                self.funcs: list[lang_func.LangFunc] = []
+
             def visit_FunctionDef(self, node: FunctionDef) -> Any:
                 node.qualname = f"{file.get_path().replace('/', '.')[1:]}.{node.name}"
                 new_func = lang_func.LangFunc(node)
                 new_func.set_file(file)
                 file.add_func(new_func)
-                self.__parser.parse_impl(new_func.get_tp_call_impl())
-                self.__parser.parse_impl(new_func.get_vec_call_impl())
+                if node in nodes.body:
+                    file.add_module_func(new_func)
+                self.funcs.append(new_func)
 
         nodes = ast.parse(file.get_text())
         visitor = FuncSearcher(self)
         visitor.visit(nodes)
 
+        # All the functions are known before parsing, so a call can target a function defined later in the module
+        profile = pgo.get_profile_data(self.__data)
+        for func in visitor.funcs:
+            # Specializations are parsed first since the vec call impl dispatches to them
+            for signature in adapter.get_specialization_signatures(func, nodes, profile):
+                adapter.adapt_func(func, signature, self)
+            self.parse_impl(func.get_tp_call_impl())
+            self.parse_impl(func.get_vec_call_impl())
+
     def parse_impl(self, func_impl: LangFuncImpl):
         if func_impl.get_parse_status() == impl.LangFuncImpl.ParseStatus.NOT_STARTED:
             func_impl.set_parse_status(impl.LangFuncImpl.ParseStatus.STARTED)
             #import flyable.parse.parser_visitor as parser_vis
             import flyable.parse.parser_visitor_ast as visitor_ast
             vis = visitor_ast.ParserVisitorAst(self, self.__code_gen, func_impl)
-            vis.run()
+            profile = self.__code_gen.get_compile_profile()
+            if profile is not None:
+                profile.start_visit(func_impl.get_full_name())
+                try:
+                    vis.run()
+                finally:
+                    profile.end_visit()
+            else:
+                vis.run()
 
     def get_code_gen(self):
         return self.__code_gen
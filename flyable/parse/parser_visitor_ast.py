@@ -13,11 +13,17 @@ import flyable.parse.exception.unsupported as unsupported
 import flyable.code_gen.dict as gen_dict
 import flyable.code_gen.exception as excp
 import flyable.code_gen.fly_obj as fly_obj
+import flyable.code_gen.fused_iter as fused_iter
+import flyable.code_gen.inline_cache as inline_cache
 import flyable.code_gen.list as gen_list
+import flyable.code_gen.loop as loop
 import flyable.code_gen.module as gen_module
 import flyable.code_gen.op_call as op_call
+import flyable.code_gen.opt_profile as opt_profile
+import flyable.code_gen.profiler as profiler
 import flyable.code_gen.ref_counter as ref_counter
 import flyable.code_gen.runtime as runtime
+import flyable.code_gen.sequence as gen_sequence
 import flyable.code_gen.set as gen_set
 import flyable.code_gen.slice as gen_slice
 import flyable.code_gen.tuple as gen_tuple
@@ -28,7 +34,10 @@ import flyable.data.comp_data as comp_data
 import flyable.data.lang_func as lang_func
 import flyable.data.lang_type as lang_type
 import flyable.data.type_hint as hint
+import flyable.parse.adapter as adapter
 import flyable.parse.build_in as build
+import flyable.parse.local_types as local_types
+import flyable.parse.pgo as pgo
 from flyable.code_gen import function
 from flyable.parse.variable import Variable
 import flyable.code_gen.code_gen as _gen
@@ -38,7 +47,7 @@ from flyable.data.lang_func_impl import LangFuncImpl, FuncImplType
 
 if TYPE_CHECKING:
     from flyable.parse.parser import Parser
-    from flyable.code_gen.code_gen import CodeGen
+    from flyable.code_gen.code_gen import CodeGen, CodeBlock
 
 
 class ParserVisitorAst(NodeVisitor):
@@ -83,6 +92,7 @@ class ParserVisitorAst(NodeVisitor):
                                                        code_type.get_py_obj_ptr(self.__code_gen),
                                                        signature, _gen.Linkage.INTERNAL)
 
+        code_func.set_opt_level(opt_profile.get_opt_profile(self.__data).get_function_level(self.__func.get_parent_func()))
         self.__func.set_code_func(code_func)
         self.__entry_block = self.__func.get_code_func().add_block("Entry block")
 
@@ -90,11 +100,29 @@ class ParserVisitorAst(NodeVisitor):
 
         self.__content_block = self.__builder.create_block()
         self.__builder.set_insert_block(self.__content_block)
+        if profiler.is_runtime_profiling(self.__data):
+            profiler.instrument_func(self, profiler.get_profile_name(self.__func))
         self.__setup_argument()
+        self.__setup_unboxed_locals()
+
+    def __setup_unboxed_locals(self):
+        # Locals proven to always hold the same primitive type live in a primitive alloca instead of a PyObject*
+        for name, var_type in local_types.infer_local_types(self.__func).items():
+            new_var = self.__context.add_var(name, var_type)
+            new_var.set_code_value(self.generate_entry_block_var(var_type.to_code_type(self.__code_gen), True))
 
     def __setup_argument(self):
         args = self.__func.get_parent_func().get_node().args.args
-        if self.__func.get_impl_type() == FuncImplType.TP_CALL:
+        if self.__func.get_impl_type() == FuncImplType.SPECIALIZATION:
+            # Args are received by value with their specialized type, the callable being the first one
+            for i, arg in enumerate(args):
+                arg_type = self.__func.get_arg(i)
+                arg_var = self.__context.add_var(arg.arg, arg_type)
+                arg_var.set_is_arg(True)
+                arg_var.set_code_value(self.generate_entry_block_var(arg_type.to_code_type(self.__code_gen)))
+                self.__builder.store(i + 1, arg_var.get_code_value())
+            return
+        elif self.__func.get_impl_type() == FuncImplType.TP_CALL:
             callable_value = 0
             args_value = 1  # Is a PyListObject*
             kwargs = 2
@@ -115,6 +143,12 @@ class ParserVisitorAst(NodeVisitor):
                                                [self.__builder.const_int64(i)])
                 arg_var.set_code_value(item_ptr)
 
+            # Dispatch to a specialization when the args match its types. The specializations receiving python objects
+            # only exist for the direct calls, the generic implementation already handles these args
+            for spec in self.__func.get_parent_func().specialization_impls_iter():
+                if adapter.is_specialized_signature(spec.get_args()):
+                    adapter.generate_specialization_entry(self, spec, callable_value, args_value, args_count, kwargs)
+
         # Match keyword arguments
         kwards_block = self.__builder.create_block()
         after_kwards = self.__builder.create_block()
@@ -183,6 +217,7 @@ class ParserVisitorAst(NodeVisitor):
 
         if len(targets) == 1:  # Normal assign
             self.__assign_type, self.__assign_value = self.__visit_node(node.value)
+            self.__unbox_const_assign(node.targets, node.value)
 
             if not hint.is_incremented_type(self.__assign_type):
                 ref_counter.ref_incr(self.__builder, self.__assign_type, self.__assign_value)
@@ -200,6 +235,7 @@ class ParserVisitorAst(NodeVisitor):
         self.__assign_depth += 1
         if node.value is not None:
             self.__assign_type, self.__assign_value = self.__visit_node(node.value)
+            self.__unbox_const_assign([node.target], node.value)
             self.__reset_last()
 
             if not hint.is_incremented_type(self.__assign_type):
@@ -211,12 +247,43 @@ class ParserVisitorAst(NodeVisitor):
 
         self.__assign_depth -= 1
 
+    def __unbox_const_assign(self, targets: list[expr], value: expr):
+        """
+        A constant assigned to an unboxed local is emitted as a primitive
+        """
+        if self.__assign_type.is_primitive():
+            return
+        for target in targets:
+            if isinstance(target, ast.Name):
+                found_var = self.__context.get_var(target.id)
+                primitive_const = op_call.get_primitive_const(self, value)
+                if found_var is not None and found_var.get_type().is_primitive() and primitive_const is not None:
+                    self.__assign_type, self.__assign_value = primitive_const
+                    return
+
     def visit_BinOp(self, node: BinOp) -> Any:
         left_type, left_value = self.__visit_node(node.left)
         self.__reset_last()
         right_type, right_value = self.__visit_node(node.right)
         self.__visit_node(node.op)
 
+        # A constant operating with a primitive doesn't need to be boxed
+        if left_type.is_primitive():
+            right_type, right_value = op_call.get_primitive_const(self, node.right) or (right_type, right_value)
+        elif right_type.is_primitive():
+            left_type, left_value = op_call.get_primitive_const(self, node.left) or (left_type, left_value)
+
+        if op_call.is_primitive_bin_op_valid(node.op, left_type, right_type):
+            self.__last_type, self.__last_value = op_call.bin_op(self, node.op, left_type, left_value, right_type,
+                                                                 right_value)
+            return
+        elif op_call.is_int_bin_op(node.op, left_type, right_type):
+            self.__last_type, self.__last_value = op_call.boxed_int_bin_op(self, node.op, left_type, left_value,
+                                                                           right_type, right_value)
+            return
+
+        left_type, left_value = runtime.value_to_pyobj(self, left_value, left_type)
+        right_type, right_value = runtime.value_to_pyobj(self, right_value, right_type)
         op = op_call.get_binary_op_func_to_call(node.op)
 
         bin_func_to_call = self.__code_gen.get_or_create_func(op, code_type.get_py_obj_ptr(self.__code_gen),
@@ -229,7 +296,8 @@ class ParserVisitorAst(NodeVisitor):
         ref_counter.ref_decr_incr(self, right_type, right_value)
 
     def visit_UnaryOp(self, node: UnaryOp) -> Any:
-        _, operand_value = self.__visit_node(node.operand)
+        operand_type, operand_value = self.__visit_node(node.operand)
+        operand_type, operand_value = runtime.value_to_pyobj(self, operand_value, operand_type)
 
         if isinstance(node.op, ast.UAdd):
             func_str = "PyNumber_Positive"
@@ -264,6 +332,11 @@ class ParserVisitorAst(NodeVisitor):
             types.append(type)
             values.append(value)
 
+        # Primitive values can only be combined with python objects once boxed
+        if not all(type.is_bool() for type in types):
+            for i in range(len(types)):
+                types[i], values[i] = runtime.value_to_pyobj(self, values[i], types[i])
+
         current_type = types[0]
         current_value = values[0]
         for i in range(1, len(types)):
@@ -281,6 +354,12 @@ class ParserVisitorAst(NodeVisitor):
     def visit_AugAssign(self, node: AugAssign) -> Any:
         import flyable.tool.token_change as token_change
 
+        if isinstance(node.target, ast.Name):
+            found_var = self.__context.get_var(node.target.id)
+            if found_var is not None and found_var.get_type().is_primitive():
+                self.__visit_unboxed_aug_assign(node, found_var)
+                return
+
         token_store = token_change.find_token_store(node)
         token_store.ctx = None
 
@@ -298,6 +377,7 @@ class ParserVisitorAst(NodeVisitor):
         self.__reset_last()
 
         right_type, right_value = self.__visit_node(node.value)
+        right_type, right_value = runtime.value_to_pyobj(self, right_value, right_type)
 
         # Operate value and target together
 
@@ -325,6 +405,18 @@ class ParserVisitorAst(NodeVisitor):
         # Increment the assignation if there is a need for it
         ref_counter.ref_incr(self.__builder, self.__assign_type, self.__assign_value)
 
+    def __visit_unboxed_aug_assign(self, node: AugAssign, var: Variable):
+        var_type = var.get_type()
+        left_value = self.__builder.load(var.get_code_value())
+
+        self.__reset_last()
+        right_type, right_value = self.__visit_node(node.value)
+        if not right_type.is_primitive():
+            right_type, right_value = op_call.get_primitive_const(self, node.value)
+
+        result_type, result_value = op_call.bin_op(self, node.op, var_type, left_value, right_type, right_value)
+        self.__builder.store(result_value, var.get_code_value())
+
     def visit_Expr(self, node: Expr) -> Any:
         # Represent an expression with the return value unused
         self.__reset_last()
@@ -353,6 +445,10 @@ class ParserVisitorAst(NodeVisitor):
             value_type = self.__assign_type
             value = self.__assign_value
             if found_var is not None:  # store local
+                if value_type.is_primitive() and not found_var.get_type().is_primitive():
+                    value_type, value = runtime.value_to_pyobj(self, value, value_type)
+                elif found_var.get_type().is_primitive() and found_var.get_type() != value_type:
+                    raise Exception(f"Unboxed variable {node.id} can't store a value of type {value_type}")
                 self.__builder.store(value, found_var.get_code_value())
             else:  # Store global
                 str_var = self.__code_gen.get_or_insert_str(node.id)
@@ -370,6 +466,8 @@ class ParserVisitorAst(NodeVisitor):
                 var_name = node.id
                 self.__last_value = self.__get_global_obj(var_name)
             else:
+                if found_var.get_type().is_primitive():  # Unboxed arg of a specialization
+                    self.__last_type = copy.copy(found_var.get_type())
                 self.__last_value = self.__builder.load(found_var.get_code_value())
 
     def visit_Attribute(self, node: Attribute) -> Any:
@@ -378,13 +476,7 @@ class ParserVisitorAst(NodeVisitor):
         self.__last_type, self.__last_value = self.__visit_node(node.value)
 
         if isinstance(node.ctx, ast.Load):
-            attr_name = self.__code_gen.get_or_insert_str(node.attr)
-            attr_name = self.__builder.global_var(attr_name)
-            attr_name = self.__builder.load(attr_name)
-            get_attr = self.__code_gen.get_or_create_func("PyObject_GetAttr", code_type.get_py_obj_ptr(self.__code_gen),
-                                                          [code_type.get_py_obj_ptr(self.__code_gen)] * 2,
-                                                          _gen.Linkage.EXTERNAL)
-            self.__last_value = self.__builder.call(get_attr, [self.__last_value, attr_name])
+            self.__last_value = inline_cache.load_attr(self, self.__last_value, node.attr)
             self.__last_type = lang_type.get_python_obj_type()
         elif isinstance(node.ctx, ast.Store):
             fly_obj.py_obj_set_attr(self, self.__last_value, node.attr, self.__assign_value, None)
@@ -394,6 +486,8 @@ class ParserVisitorAst(NodeVisitor):
             self.__last_type, self.__last_value = self.__visit_node(node.func.value)
             call_name = node.func.attr
         elif isinstance(node.func, ast.Name):
+            # The last value is the object of a method call, a value left by a previous node isn't one
+            self.__reset_last()
             call_name = node.func.id
         else:
             raise NotImplementedError("Call func node not supported")
@@ -410,19 +504,57 @@ class ParserVisitorAst(NodeVisitor):
             key.value = kw.arg
 
             _, key_value = self.__visit_node(key)
-            _, value = self.__visit_node(kw.value)
+            value_type, value = self.__visit_node(kw.value)
+            _, value = runtime.value_to_pyobj(self, value, value_type)
 
             kwargs[key_value] = value
 
+        raw_args = []
         for e in node.args:
             self.__reset_last()
-            type, arg = self.__visit_node(e)
-            args_types.append(type)
-            args.append(arg)
+            raw_args.append(self.__visit_node(e))
             self.__last_type = None
 
         self.__last_type = type_buffer
         self.__last_value = value_buffer
+        direct_func = self.__get_direct_call_func(node, call_name) if self.__last_value is None else None
+        if direct_func is not None:
+            spec = adapter.get_direct_call_impl(direct_func, [arg_type for arg_type, _ in raw_args], self.__parser)
+        else:
+            spec = None
+
+        if direct_func is not None and profiler.is_runtime_profiling(self.__data):
+            profiler.instrument_call(self, self.__get_site_key(node), raw_args)
+
+        if spec is not None:  # Calling a compiled function of the module, the args can be passed unboxed
+            profile = pgo.get_profile_data(self.__data)
+            if profile is not None and profile.get_call_count(self.__get_site_key(node)) >= pgo.HOT_SITE_CALLS:
+                spec.get_code_func().set_inline_hint(True)
+
+            call = self.__get_global_obj(call_name)
+            result_value = self.generate_entry_block_var(code_type.get_py_obj_ptr(self.__code_gen))
+            generic_block = self.__builder.create_block("Generic Call")
+            continue_block = self.__builder.create_block("After Direct Call")
+
+            self.__builder.store(adapter.generate_direct_call(self, spec, call, raw_args, generic_block),
+                                 result_value)
+            self.__builder.br(continue_block)
+
+            self.__builder.set_insert_block(generic_block)
+            args = [runtime.value_to_pyobj(self, arg, arg_type)[1] for arg_type, arg in raw_args]
+            self.__builder.store(caller.call_callable(self, call, call, args, kwargs), result_value)
+            self.__builder.br(continue_block)
+
+            self.__builder.set_insert_block(continue_block)
+            self.__last_type = lang_type.get_python_obj_type()
+            self.__last_value = self.__builder.load(result_value)
+            return
+
+        for arg_type, arg in raw_args:
+            arg_type, arg = runtime.value_to_pyobj(self, arg, arg_type)
+            args_types.append(arg_type)
+            args.append(arg)
+
         if self.__last_value is None:  # Calling a direct function, no method
             call = self.__get_global_obj(call_name)
             self.__last_type = lang_type.get_python_obj_type()
@@ -430,15 +562,7 @@ class ParserVisitorAst(NodeVisitor):
         else:  # Calling a possible method
             result_value = self.generate_entry_block_var(code_type.get_py_obj_ptr(self.__code_gen))
             found_attr = self.generate_entry_block_var(code_type.get_py_obj_ptr(self.__code_gen))
-            str_var = self.__code_gen.get_or_insert_str(call_name)
-            str_var = self.__builder.load(self.__builder.global_var(str_var))
-            get_method_func = self.__code_gen.get_or_create_func("_PyObject_GetMethod",
-                                                                 code_type.get_int32(),
-                                                                 ([code_type.get_py_obj_ptr(self.__code_gen)] * 2) +
-                                                                 [code_type.get_py_obj_ptr(
-                                                                     self.__code_gen).get_ptr_to()],
-                                                                 _gen.Linkage.EXTERNAL)
-            is_method = self.__builder.call(get_method_func, [self.__last_value, str_var, found_attr])
+            is_method = inline_cache.load_method(self, self.__last_value, call_name, found_attr)
 
             is_method_block = self.__builder.create_block()
             not_method_block = self.__builder.create_block()
@@ -467,21 +591,50 @@ class ParserVisitorAst(NodeVisitor):
 
     def visit_Subscript(self, node: Subscript) -> Any:
         sequence_type, sequence = self.__visit_node(node.value)
-        slice_type, slice = self.__visit_node(node.slice)
 
-        if isinstance(node.ctx, ast.Load):
-            get_item = self.__code_gen.get_or_create_func("PyObject_GetItem", code_type.get_py_obj_ptr(self.__code_gen),
-                                                          [code_type.get_py_obj_ptr(self.__code_gen)] * 2,
-                                                          _gen.Linkage.EXTERNAL)
+        # An int index reads lists and tuples directly instead of going through the mapping protocol
+        index = self.__get_const_index(node.slice)
+        if index is None:
+            slice_type, slice = self.__visit_node(node.slice)
+            if slice_type.is_int():
+                index = slice
+            else:
+                slice_type, slice = runtime.value_to_pyobj(self, slice, slice_type)
 
-            self.__last_value = self.__builder.call(get_item, [sequence, slice])
+        if isinstance(node.ctx, ast.Load):
+            if index is not None:
+                self.__last_value = gen_sequence.get_item_int(self, sequence_type, sequence, index)
+            else:
+                self.__last_value = gen_sequence.py_object_get_item(self, sequence, slice)
+            self.__last_type = lang_type.get_python_obj_type()
+            self.__last_type.add_hint(hint.TypeHintRefIncr())
         elif isinstance(node.ctx, ast.Store):
-            set_item = self.__code_gen.get_or_create_func("PyObject_SetItem", code_type.get_py_obj_ptr(self.__code_gen),
-                                                          [code_type.get_py_obj_ptr(self.__code_gen)] * 3,
-                                                          _gen.Linkage.EXTERNAL)
-
-            self.__last_value = self.__builder.call(set_item, [sequence, slice, self.__assign_value])
-        self.__last_type = lang_type.get_python_obj_type()
+            item_type, item = runtime.value_to_pyobj(self, self.__assign_value, self.__assign_type)
+            if index is not None:
+                gen_sequence.set_item_int(self, sequence_type, sequence, index, item)
+            else:
+                gen_sequence.py_object_set_item(self, sequence, slice, item)
+            # The sequence took its own reference, the boxed value is only needed for the store
+            if self.__assign_type.is_primitive():
+                ref_counter.ref_decr_incr(self, item_type, item)
+            self.__last_type, self.__last_value = lang_type.get_python_obj_type(), item
+
+        if index is None:
+            ref_counter.ref_decr_incr(self, slice_type, slice)
+
+    def __get_const_index(self, node: expr):
+        """
+        Returns the unboxed value of an index written as an int literal, or None if the index isn't one
+        """
+        negative = isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub)
+        if negative:
+            node = node.operand
+
+        if isinstance(node, ast.Constant) and type(node.value) is int:
+            value = -node.value if negative else node.value
+            if -2 ** 63 <= value < 2 ** 63:
+                return self.__builder.const_int64(value)
+        return None
 
     def visit_Slice(self, node: Slice) -> Any:
         def parse_slice_part(expression: Optional[expr]):
@@ -549,6 +702,8 @@ class ParserVisitorAst(NodeVisitor):
             self.__last_value = self.__builder.global_var(self.__code_gen.get_none())
         else:
             self.__last_type = lang_type.get_python_obj_type()
+            if self.__code_gen.has_immortal_constants():
+                self.__last_type.add_hint(hint.TypeHintImmortal())
             constant_var = self.__code_gen.get_or_insert_const(node.value)
             self.__last_value = self.__builder.load(self.__builder.global_var(constant_var))
 
@@ -608,9 +763,9 @@ class ParserVisitorAst(NodeVisitor):
         ref_counter.ref_decr_incr(self, cond_type, cond_value)
 
         if has_other_block:
-            self.__builder.cond_br(cond_value, block_go, other_block)
+            self.__profiled_cond_br(node, cond_value, block_go, other_block)
         else:
-            self.__builder.cond_br(cond_value, block_go, block_continue)
+            self.__profiled_cond_br(node, cond_value, block_go, block_continue)
 
         self.__builder.set_insert_block(block_go)
         self.__visit_node(node.body)
@@ -624,62 +779,40 @@ class ParserVisitorAst(NodeVisitor):
         self.__builder.set_insert_block(block_continue)
 
     def visit_For(self, node: For) -> Any:
-        block_for = self.__builder.create_block()
-        block_for_in = self.__builder.create_block()
-        block_else = self.__builder.create_block() if node.orelse is not None else None
-        block_continue = self.__builder.create_block()
-
-        iter_type, iter_value = self.visit_node(node.iter)
-
-        ref_counter.ref_incr(self.__builder, iter_type, iter_value)
-
-        if isinstance(node.target, ast.Name):
-            name = node.target.id
-            new_var = self.get_or_gen_var(name)
-        else:
-            raise ValueError("Exception here not supported")
-
-        iterable_type, iterator = caller.call_obj(self, "__iter__", iter_value, iter_type, [], [], {})
+        if local_types.is_range_loop(node, self.__func.get_parent_func().get_node()):
+            loop.generate_range_for(self, node)
+            return
 
-        self.__builder.br(block_for)
-        self.__builder.set_insert_block(block_for)
+        iteration = fused_iter.FusedIter(self, node.iter)
 
-        next_type, next_value = caller.call_obj(self, "__next__", iterator, iterable_type, [], [], {})
+        block_next = self.__builder.create_block("For Next")
+        block_body = self.__builder.create_block("For Body")
+        block_else = self.__builder.create_block("For Else") if len(node.orelse) > 0 else None
+        block_continue = self.__builder.create_block("After For")
 
-        null_ptr = self.__builder.const_null(code_type.get_py_obj_ptr(self.__code_gen))
+        target_var = self.__get_iteration_target_var(node.target, False)
+        store_item = lambda item_type, item: self.__store_iteration_target(node.target, target_var, item_type, item,
+                                                                           node)
 
-        test = self.__builder.eq(next_value, null_ptr)
-
-        if node.orelse is None:
-            self.__builder.cond_br(test, block_continue, block_for_in)
-        else:
-            self.__builder.cond_br(test, block_else, block_for_in)
+        self.__builder.br(block_next)
+        self.__builder.set_insert_block(block_next)
+        iteration.emit_next(store_item, self.__get_iteration_pair_store(node.target, node, False), block_body,
+                            block_else if block_else is not None else block_continue)
 
-        # Setup the for loop content
-        self.__builder.set_insert_block(block_for_in)
-        if isinstance(node.target, ast.Name):
-            self.__builder.store(next_value, new_var.get_code_value())
-        elif isinstance(node.target, ast.Tuple) or isinstance(node.target, ast.List):
-            targets = []
-            for t in node.target.elts:
-                targets.append(t)
-            unpack.unpack_assignation(self, targets, next_type, next_value, node)
+        self.__builder.set_insert_block(block_body)
         self.add_out_block(block_continue)  # In case of a break we want to jump after the for loop
         self.visit(node.body)
-        ref_counter.ref_decr(self, next_type, next_value)
         self.pop_out_block()
+        self.__builder.br(block_next)
 
-        self.__builder.br(block_for)
-
-        if node.orelse is not None:
+        if block_else is not None:
             self.__builder.set_insert_block(block_else)
-            excp.py_runtime_clear_error(self.__code_gen, self.__builder)
             self.visit(node.orelse)
             self.__builder.br(block_continue)
 
+        # A break leaves the iteration unfinished
         self.__builder.set_insert_block(block_continue)
-        ref_counter.ref_decr(self, iter_type, iter_value)
-        excp.py_runtime_clear_error(self.__code_gen, self.__builder)
+        iteration.finish()
 
     def visit_While(self, node: While) -> Any:
         block_cond = self.__builder.create_block("Condition While")
@@ -697,9 +830,9 @@ class ParserVisitorAst(NodeVisitor):
         ref_counter.ref_decr_incr(self, cond_type, cond_value)
 
         if node.orelse is None:
-            self.__builder.cond_br(cond_value, block_while_in, block_continue)
+            self.__profiled_cond_br(node, cond_value, block_while_in, block_continue)
         else:
-            self.__builder.cond_br(cond_value, block_while_in, block_else)
+            self.__profiled_cond_br(node, cond_value, block_while_in, block_else)
 
         # Setup the while loop content
         self.__builder.set_insert_block(block_while_in)
@@ -755,65 +888,103 @@ class ParserVisitorAst(NodeVisitor):
         self.__last_type, self.__last_value = caller.call_obj(self, "__iter__", iter_value, iter_type, [iter_value],
                                                               [iter_type], {})
 
-    def visit_ListComp(self, node: ListComp) -> Any:
-        result_array = gen_list.instanciate_python_list(self.__code_gen, self.__builder, self.__builder.const_int64(0))
-
-        block_continue = self.__builder.create_block()
-        prev_for_block = None
-
-        for i, e in enumerate(node.generators):
-            iter_type, iter_value = self.__visit_node(e.iter)
-            iterable_type, iterator = caller.call_obj(self, "__iter__", iter_value, iter_type, [], [], {})
+    def __visit_comprehension(self, generators: list[comprehension], add_element, reserve=None):
+        """
+        Generate the nested iterations of the generators of a comprehension, calling add_element with the innermost
+        items. When the comprehension has a single generator without condition, reserve is called with the iterable
+        """
+        block_continue = self.__builder.create_block("After Comprehension")
+        block_exhausted = block_continue
 
-            block_for = self.__builder.create_block()
-            self.__builder.br(block_for)
-            self.__builder.set_insert_block(block_for)
+        for i, e in enumerate(generators):
+            iteration = fused_iter.FusedIter(self, e.iter)
+            if reserve is not None and len(generators) == 1 and len(e.ifs) == 0:
+                reserve(*iteration.get_iterable())
 
-            next_type, next_value = caller.call_obj(self, "__next__", iterator, iterable_type, [], [], {})
+            block_next = self.__builder.create_block("Comprehension Next")
+            block_body = self.__builder.create_block("Comprehension Body")
 
-            null_ptr = self.__builder.const_null(code_type.get_py_obj_ptr(self.__code_gen))
-            excp.py_runtime_clear_error(self.__code_gen, self.__builder)
+            target_var = self.__get_iteration_target_var(e.target, True)
+            store_item = lambda item_type, item, e=e, target_var=target_var: \
+                self.__store_iteration_target(e.target, target_var, item_type, item, e)
 
-            test = self.__builder.eq(next_value, null_ptr)
-
-            block_for_in = self.__builder.create_block()
-            if i == 0:
-                self.__builder.cond_br(test, block_continue, block_for_in)
-            else:
-                self.__builder.cond_br(test, prev_for_block, block_for_in)
-
-            # inside for loop
-            self.__builder.set_insert_block(block_for_in)
-
-            if isinstance(e.target, ast.Name):
-                name = e.target.id
-                new_var = self.__func.get_context().add_var(name, iter_type)
-                alloca_value = self.generate_entry_block_var(iter_type.to_code_type(self.__code_gen))
-                new_var.set_code_value(alloca_value)
-                self.__builder.store(next_value, new_var.get_code_value())
-            elif isinstance(e.target, ast.Tuple) or isinstance(e.target, ast.List):
-                targets = []
-                for t in e.target.elts:
-                    targets.append(t)
-                unpack.unpack_assignation(self, targets, next_type, next_value, node)
+            self.__builder.br(block_next)
+            self.__builder.set_insert_block(block_next)
+            iteration.emit_next(store_item, self.__get_iteration_pair_store(e.target, e, True), block_body,
+                                block_exhausted)
+            self.__builder.set_insert_block(block_body)
 
             # validate that each if is true
-            for j, test in enumerate(e.ifs):
+            for test in e.ifs:
                 block_cond = self.__builder.create_block()
-                cond_type_test, cond_value_test = self.__visit_node(test)
-                cond_type, cond_value = cond.value_to_cond(self, cond_type_test, cond_value_test)
-                self.__builder.cond_br(cond_value, block_cond, block_for)
+                cond_type, cond_value = self.__visit_node(test)
+                cond_type, cond_value = cond.value_to_cond(self, cond_type, cond_value)
+                self.__builder.cond_br(cond_value, block_cond, block_next)
                 self.__builder.set_insert_block(block_cond)
 
-            if i == len(node.generators) - 1:
-                elt_type, elt_value = self.__visit_node(node.elt)
-                py_obj_type, py_obj = runtime.value_to_pyobj(self, elt_value, elt_type)
-                gen_list.python_list_append(self, result_array, py_obj_type, py_obj)
-                self.__builder.br(block_for)
-
-            prev_for_block = block_for
+            # An exhausted inner generator goes on with the next item of the outer one
+            block_exhausted = block_next
 
+        add_element()
+        self.__builder.br(block_exhausted)
         self.__builder.set_insert_block(block_continue)
+
+    def __get_iteration_target_var(self, target: ast.expr, comprehension_local: bool) -> Optional[Variable]:
+        """
+        Returns the variable receiving the items of an iteration when the target is a name.
+        The variables of a comprehension are local to it
+        """
+        if not isinstance(target, ast.Name):
+            return None
+        elif not comprehension_local:
+            return self.get_or_gen_var(target.id)
+
+        target_var = self.__func.get_context().add_var(target.id, lang_type.get_python_obj_type())
+        target_var.set_code_value(self.generate_entry_block_var(code_type.get_py_obj_ptr(self.__code_gen), True))
+        return target_var
+
+    def __store_iteration_target(self, target: ast.expr, target_var: Optional[Variable], item_type: LangType,
+                                 item: int, node: ast.AST):
+        """
+        Assign the item of an iteration to its target. Like an assignation, the target gets its own reference to the
+        item, the iteration keeping the one it releases
+        """
+        ref_counter.ref_incr(self.__builder, item_type, item)
+        if target_var is not None:
+            loop.store_target(self, target_var, item_type, item)
+        else:
+            unpack.do_assignation(self, target, item_type, item, node)
+
+    def __get_iteration_pair_store(self, target: ast.expr, node: ast.AST, comprehension_local: bool):
+        """
+        Returns the function assigning the key and the value of a dict item to a target unpacking it, if it does
+        """
+        pair_targets = fused_iter.get_pair_targets(target)
+        if pair_targets is None:
+            return None
+
+        # The variables are created once, the pair being stored by the dict iteration only
+        target_vars = [self.__get_iteration_target_var(e, comprehension_local) for e in pair_targets]
+
+        def store_pair(key: int, value: int):
+            for pair_target, target_var, pair_value in zip(pair_targets, target_vars, (key, value)):
+                self.__store_iteration_target(pair_target, target_var, lang_type.get_python_obj_type(), pair_value,
+                                              node)
+
+        return store_pair
+
+    def visit_ListComp(self, node: ListComp) -> Any:
+        result_array = gen_list.instanciate_python_list(self.__code_gen, self.__builder, self.__builder.const_int64(0))
+
+        def add_element():
+            elt_type, elt_value = self.__visit_node(node.elt)
+            gen_list.python_list_append(self, result_array, elt_type, elt_value)
+            ref_counter.ref_decr_incr(self, elt_type, elt_value)
+
+        # Each item of a single generator without condition ends up in the list, so its memory can be reserved
+        reserve = lambda iter_type, iter_value: gen_list.python_list_reserve_for(self, result_array, iter_type,
+                                                                                iter_value)
+        self.__visit_comprehension(node.generators, add_element, reserve)
         self.__last_type = lang_type.get_list_of_python_obj_type()
         self.__last_value = result_array
 
@@ -862,62 +1033,12 @@ class ParserVisitorAst(NodeVisitor):
         null_value = self.__builder.const_null(code_type.get_py_obj_ptr(self.__code_gen))
         result_set = gen_set.instanciate_python_set(self, null_value)
 
-        block_continue = self.__builder.create_block()
-        prev_for_block = None
-
-        for i, e in enumerate(node.generators):
-            iter_type, iter_value = self.__visit_node(e.iter)
-            iterable_type, iterator = caller.call_obj(self, "__iter__", iter_value, iter_type, [], [], {})
-
-            block_for = self.__builder.create_block()
-            self.__builder.br(block_for)
-            self.__builder.set_insert_block(block_for)
-
-            next_type, next_value = caller.call_obj(self, "__next__", iterator, iterable_type, [], [], {})
-
-            null_ptr = self.__builder.const_null(code_type.get_py_obj_ptr(self.__code_gen))
-            excp.py_runtime_clear_error(self.__code_gen, self.__builder)
-
-            test = self.__builder.eq(next_value, null_ptr)
+        def add_element():
+            elt_type, elt_value = self.__visit_node(node.elt)
+            obj_to_set_type, obj_to_set_value = runtime.value_to_pyobj(self, elt_value, elt_type)
+            gen_set.python_set_add(self, result_set, obj_to_set_value)
 
-            block_for_in = self.__builder.create_block()
-            if i == 0:
-                self.__builder.cond_br(test, block_continue, block_for_in)
-            else:
-                self.__builder.cond_br(test, prev_for_block, block_for_in)
-
-            # inside for loop
-            self.__builder.set_insert_block(block_for_in)
-
-            if isinstance(e.target, ast.Name):
-                name = e.target.id
-                new_var = self.__func.get_context().add_var(name, iter_type)
-                alloca_value = self.generate_entry_block_var(iter_type.to_code_type(self.__code_gen))
-                new_var.set_code_value(alloca_value)
-                self.__builder.store(next_value, new_var.get_code_value())
-            elif isinstance(e.target, ast.Tuple) or isinstance(e.target, ast.List):
-                targets = []
-                for t in e.target.elts:
-                    targets.append(t)
-                unpack.unpack_assignation(self, targets, next_type, next_value, node)
-
-            # validate that each if is true
-            for j, test in enumerate(e.ifs):
-                block_cond = self.__builder.create_block()
-                cond_type, cond_value = self.__visit_node(test)
-                cond_type, cond_value = cond.value_to_cond(self, cond_type, cond_value)
-                self.__builder.cond_br(cond_value, block_cond, block_for)
-                self.__builder.set_insert_block(block_cond)
-
-            if i == len(node.generators) - 1:
-                elt_type, elt_value = self.__visit_node(node.elt)
-                obj_to_set_type, obj_to_set_value = runtime.value_to_pyobj(self, elt_value, elt_type)
-                gen_set.python_set_add(self, result_set, obj_to_set_value)
-                self.__builder.br(block_for)
-
-            prev_for_block = block_for
-
-        self.__builder.set_insert_block(block_continue)
+        self.__visit_comprehension(node.generators, add_element)
         self.__last_type = lang_type.get_set_of_python_obj_type()
         self.__last_value = result_set
 
@@ -936,65 +1057,14 @@ class ParserVisitorAst(NodeVisitor):
     def visit_DictComp(self, node: DictComp) -> Any:
         result_dict = gen_dict.python_dict_new(self)
 
-        block_continue = self.__builder.create_block()
-        prev_for_block = None
-
-        for i, e in enumerate(node.generators):
-            iter_type, iter_value = self.__visit_node(e.iter)
-
-            iterable_type, iterator = caller.call_obj(self, "__iter__", iter_value, iter_type, [], [], {})
-
-            block_for = self.__builder.create_block()
-            self.__builder.br(block_for)
-            self.__builder.set_insert_block(block_for)
-
-            next_type, next_value = caller.call_obj(self, "__next__", iterator, iterable_type, [], [], {})
-
-            null_ptr = self.__builder.const_null(code_type.get_py_obj_ptr(self.__code_gen))
-            excp.py_runtime_clear_error(self.__code_gen, self.__builder)
-
-            test = self.__builder.eq(next_value, null_ptr)
-
-            block_for_in = self.__builder.create_block()
-            if i == 0:
-                self.__builder.cond_br(test, block_continue, block_for_in)
-            else:
-                self.__builder.cond_br(test, prev_for_block, block_for_in)
-
-            # inside for loop
-            self.__builder.set_insert_block(block_for_in)
-
-            if isinstance(e.target, ast.Name):
-                name = e.target.id
-                new_var = self.__func.get_context().add_var(name, iter_type)
-                alloca_value = self.generate_entry_block_var(iter_type.to_code_type(self.__code_gen))
-                new_var.set_code_value(alloca_value)
-                self.__builder.store(next_value, new_var.get_code_value())
-            elif isinstance(e.target, ast.Tuple) or isinstance(e.target, ast.List):
-                targets = []
-                for t in e.target.elts:
-                    targets.append(t)
-                unpack.unpack_assignation(self, targets, next_type, next_value, node)
-
-            # validate that each if is true
-            for j, test in enumerate(e.ifs):
-                block_cond = self.__builder.create_block()
-                cond_type, cond_value = self.__visit_node(test)
-                cond_type, cond_value = cond.value_to_cond(self, cond_type, cond_value)
-                self.__builder.cond_br(cond_value, block_cond, block_for)
-                self.__builder.set_insert_block(block_cond)
-
-            if i == len(node.generators) - 1:
-                key_type, key_value = self.__visit_node(node.key)
-                value_type, value_value = self.__visit_node(node.value)
-                obj_key_type, obj_key_value = runtime.value_to_pyobj(self, key_value, key_type)
-                obj_value_type, obj_value_value = runtime.value_to_pyobj(self, value_value, value_type)
-                gen_dict.python_dict_set_item(self, result_dict, obj_key_value, obj_value_value)
-                self.__builder.br(block_for)
-
-            prev_for_block = block_for
+        def add_element():
+            key_type, key_value = self.__visit_node(node.key)
+            value_type, value_value = self.__visit_node(node.value)
+            obj_key_type, obj_key_value = runtime.value_to_pyobj(self, key_value, key_type)
+            obj_value_type, obj_value_value = runtime.value_to_pyobj(self, value_value, value_type)
+            gen_dict.python_dict_set_item(self, result_dict, obj_key_value, obj_value_value)
 
-        self.__builder.set_insert_block(block_continue)
+        self.__visit_comprehension(node.generators, add_element)
         self.__last_type = lang_type.get_dict_of_python_obj_type()
         self.__last_value = result_dict
 
@@ -1154,20 +1224,44 @@ class ParserVisitorAst(NodeVisitor):
                 current += 1
 
     def __get_global_obj(self, name):
-        import builtins
-        if hasattr(builtins, name):
-            dict_value = function.py_function_get_builtins(self, self.__frame_ptr_value)
+        return inline_cache.load_global(self, self.__frame_ptr_value, name)
+
+    def __get_direct_call_func(self, node: Call, name: str):
+        """
+        Returns the function of the module the call can target directly, or None if the call must go through the
+        generic call protocol
+        """
+        if len(node.keywords) > 0 or any(isinstance(e, ast.Starred) for e in node.args):
+            return None
+        parent_func = self.__func.get_parent_func()
+        if local_types.is_local_name(parent_func.get_node(), name):
+            return None
+        return parent_func.get_file().get_module_func(name)
+
+    def __get_site_key(self, node: ast.AST):
+        return pgo.get_site_key(self.__func.get_parent_func().get_file(), node)
+
+    def __profiled_cond_br(self, node: ast.AST, cond_value: int, block_true: CodeBlock, block_false: CodeBlock):
+        """
+        Branch on the condition of the node. The branch is recorded when the runtime profiling is enabled, and gets
+        the weights of the profile data when there is one
+        """
+        key = self.__get_site_key(node)
+        if profiler.is_runtime_profiling(self.__data):
+            profiler.instrument_branch(self, key, cond_value)
+
+        profile = pgo.get_profile_data(self.__data)
+        weights = profile.get_branch_weights(key) if profile is not None else None
+        if weights is not None:
+            self.__builder.cond_br_weighted(cond_value, block_true, block_false, weights[0], weights[1])
         else:
-            dict_value = function.py_function_get_globals(self, self.__frame_ptr_value)
-        str_name_value = self.__builder.global_var(self.__code_gen.get_or_insert_str(name))
-        str_name_value = self.__builder.load(str_name_value)
-        return function.py_dict_get_item(self, dict_value, str_name_value)
+            self.__builder.cond_br(cond_value, block_true, block_false)
 
     def get_or_gen_var(self, var_name: str | int):
         found_var = self.__context.get_var(var_name)
         if found_var is None:
             found_var = self.__context.add_var(var_name, lang_type.get_python_obj_type())
-            found_var.set_code_value(self.generate_entry_block_var(code_type.get_py_obj_ptr(self.__code_gen)))
+            found_var.set_code_value(self.generate_entry_block_var(code_type.get_py_obj_ptr(self.__code_gen), True))
         return found_var
 
     def get_var(self, var_name):
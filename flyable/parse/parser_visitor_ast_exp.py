@@ -547,6 +547,8 @@ class ParserVisitorAst(NodeVisitor):
             self.__last_value = self.__builder.global_var(self.__code_gen.get_none())
         else:
             self.__last_type = lang_type.get_python_obj_type()
+            if self.__code_gen.has_immortal_constants():
+                self.__last_type.add_hint(hint.TypeHintImmortal())
             constant_var = self.__code_gen.get_or_insert_const(node.value)
             self.__last_value = self.__builder.load(self.__builder.global_var(constant_var))
 
@@ -0,0 +1,109 @@
+"""
+Module related to the profile guided optimization.
+
+A program compiled with the runtime profiling records how often each branch is taken, and the calls made by each call
+site to a function of its module with the types of their arguments. Compiling again with the profile data weights the
+branches, specializes the functions for the types observed and hints the hot callees for inlining.
+A site is identified by its location inside the module, so the data only applies to the code it was recorded from.
+"""
+from __future__ import annotations
+
+import ast
+import os
+from typing import TYPE_CHECKING, Optional
+
+import flyable.data.lang_type as lang_type
+import flyable.tool.profile_dump as profile_dump
+
+if TYPE_CHECKING:
+    from flyable.data.comp_data import CompData
+    from flyable.data.lang_file import LangFile
+
+SITE_KEY_SIZE = 103
+"""Size of a site key in bytes, FLYABLE_PROFILE_SITE_KEY_SIZE of the runtime without the null terminator"""
+
+MAX_BRANCH_WEIGHT = 2 ** 31 - 1
+"""Branch weights are written as int32 to the native layer"""
+
+HOT_SITE_CALLS = 1000
+"""Calls a site needs to make before its callee gets hinted for inlining"""
+
+__loaded_profiles: dict[str, tuple[float, ProfileData]] = {}
+
+
+class ProfileData:
+    """
+    Read only view of a profile recorded by a run of the program
+    """
+
+    def __init__(self, profile: profile_dump.Profile):
+        self.__profile = profile
+
+    def get_branch_weights(self, key: str) -> Optional[tuple[int, int]]:
+        """
+        Returns the weights of the true and the false branch, or None if the branch never ran
+        """
+        site = self.__profile.get_site(key)
+        if site is None or site.kind != profile_dump.SITE_BRANCH or sum(site.counts) == 0:
+            return None
+
+        # A branch never taken keeps a weight of 1, it's cold but not unreachable
+        scale = max(max(site.counts) / MAX_BRANCH_WEIGHT, 1.0)
+        return max(int(site.counts[0] / scale), 1), max(int(site.counts[1] / scale), 1)
+
+    def get_call_count(self, key: str):
+        site = self.__profile.get_site(key)
+        return site.get_calls() if site is not None and site.kind == profile_dump.SITE_CALL else 0
+
+    def get_observed_types(self, key: str, args_count: int) -> Optional[list[lang_type.LangType]]:
+        """
+        Returns the types of the arguments the call site passed, or None if the site never ran. An argument that
+        received several types is a python object
+        """
+        site = self.__profile.get_site(key)
+        if site is None or site.kind != profile_dump.SITE_CALL or site.get_calls() == 0 or \
+                len(site.args_types) != args_count:
+            return None
+
+        result = []
+        for mask in site.args_types:
+            if mask == profile_dump.TYPE_INT:
+                result.append(lang_type.get_int_type())
+            elif mask == profile_dump.TYPE_FLOAT:
+                result.append(lang_type.get_dec_type())
+            elif mask == profile_dump.TYPE_BOOL:
+                result.append(lang_type.get_bool_type())
+            else:
+                result.append(lang_type.get_python_obj_type())
+        return result
+
+
+def get_site_key(file: LangFile, node: ast.AST):
+    """
+    Returns the key identifying the site of the node in the profile. A long key keeps its end, the most specific part
+    """
+    key = f"{file.get_path()}:{node.lineno}:{node.col_offset}"
+    return key.encode("utf-8")[-SITE_KEY_SIZE:].decode("utf-8", "ignore")
+
+
+def read_profile_data(path: str):
+    """
+    Read the profile at the path. Raises an OSError or a ValueError if it can't be used
+    """
+    return ProfileData(profile_dump.read_profile(path))
+
+
+def get_profile_data(data: CompData) -> Optional[ProfileData]:
+    """
+    Returns the profile data the compilation uses, or None if the profile guided optimization is disabled.
+    The profile is only read once per process while the file doesn't change
+    """
+    path = data.get_config("profile_data")
+    if path is None:
+        return None
+
+    mtime = os.path.getmtime(path)
+    loaded = __loaded_profiles.get(path)
+    if loaded is None or loaded[0] != mtime:
+        loaded = __loaded_profiles[path] = (mtime, read_profile_data(path))
+    return loaded[1]
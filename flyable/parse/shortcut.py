@@ -45,7 +45,7 @@ class ShortcutListCallGet(ShortcutObjCall):
 
     def parse(self, visitor, caller_type, caller_value, args_type, args):
         item = gen_list.python_list_array_get_item(visitor, caller_type, caller_value, args[0])
-        return caller_type.get_content(), item
+        return lang_type.get_python_obj_type(), item
 
 
 """
@@ -62,13 +62,13 @@ class ShortcutTupleCallGet(ShortcutObjCall):
 
     def parse(self, visitor, caller_type, caller_value, args_type, args):
         item = gen_tuple.python_tuple_get_item(visitor, caller_type, caller_value, args[0])
-        return caller_type.get_content(), item
+        return lang_type.get_python_obj_type(), item
 
 
 def get_obj_call_shortcuts(type_to_test, args_to_test, name):
     shortcuts = {
         "append": [ShortcutListCallAppend()],
-        "__getitem__": [ShortcutListCallGet()]
+        "__getitem__": [ShortcutListCallGet(), ShortcutTupleCallGet()]
     }
 
     try:
@@ -0,0 +1,90 @@
+"""
+Module handling the on-disk cache of the object files generated for each source file.
+
+Every source file is compiled into its own object file. The object is stored under a key built from the source text,
+the Flyable version and everything else that changes the generated code (enabled debug flags, compiler configs).
+When a key is already present in the cache, the file doesn't need to be parsed nor generated again, only linked.
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+from typing import Iterable
+
+from flyable import FLYABLE_VERSION
+from flyable.code_gen.code_gen import get_partition_paths
+from flyable.debug.debug_flags_list import get_enabled_debug_flags, get_flag_name
+
+OBJECT_EXTENSION = ".o"
+
+
+def get_debug_flags_fingerprint() -> str:
+    """
+    Returns a stable representation of the enabled debug flags and their values
+    """
+    flags = [f"{get_flag_name(flag)}={flag.value!r}" for flag in get_enabled_debug_flags()]
+    return ";".join(sorted(flags))
+
+
+def get_module_init_name(key: str):
+    """
+    Returns the name of the external function that initializes the module compiled under the key.
+    The name is used as a symbol, so it only contains characters accepted by every linker
+    """
+    return "flyable_init_module_" + key[:32]
+
+
+class BuildCache:
+    """
+    Directory holding the object files previously generated, indexed by their build key
+    """
+
+    def __init__(self, directory: str):
+        self.__directory: str = os.path.abspath(directory)
+        os.makedirs(self.__directory, exist_ok=True)
+
+    def get_directory(self):
+        return self.__directory
+
+    def get_key(self, source: str, fingerprints: Iterable[str] = ()):
+        """
+        Build the key identifying the object generated from the source
+        """
+        hasher = hashlib.sha256()
+        for part in (FLYABLE_VERSION, get_debug_flags_fingerprint(), *fingerprints, source):
+            hasher.update(part.encode("utf-8"))
+            hasher.update(b"\0")  # Separator so two parts can't be merged into the same hash
+        return hasher.hexdigest()
+
+    def get_object_path(self, key: str):
+        return os.path.join(self.__directory, key + OBJECT_EXTENSION)
+
+    def get_object_paths(self, key: str, parts: int = 1):
+        """
+        Returns the paths of the objects stored under the key, a module being split in parts by the native layer
+        """
+        return get_partition_paths(self.get_object_path(key), parts)
+
+    def get_temp_object_path(self, key: str):
+        """
+        Path where the object is generated before being moved into the cache.
+        Moving the object once completed makes sure an interrupted build never leaves a broken entry
+        """
+        return os.path.join(self.__directory, f"{key}.{os.getpid()}.tmp{OBJECT_EXTENSION}")
+
+    def has_object(self, key: str, parts: int = 1):
+        return all(os.path.isfile(path) for path in self.get_object_paths(key, parts))
+
+    def commit_object(self, key: str, parts: int = 1):
+        """
+        Move the objects generated at the temporary path into the cache.
+        The first part is moved last, so the key only shows up in the cache once all the parts are there
+        """
+        temp_paths = get_partition_paths(self.get_temp_object_path(key), parts)
+        for temp_path, path in reversed(list(zip(temp_paths, self.get_object_paths(key, parts)))):
+            os.replace(temp_path, path)
+
+    def discard_object(self, key: str, parts: int = 1):
+        for temp_path in get_partition_paths(self.get_temp_object_path(key), parts):
+            if os.path.isfile(temp_path):
+                os.remove(temp_path)
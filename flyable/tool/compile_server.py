@@ -0,0 +1,173 @@
+"""
+Long-running compile server keeping the compiler state warm between compilations.
+
+The server keeps the native layer loaded and the modules in memory. It watches the source files it was asked to
+compile, and only reloads and recompiles the modules that changed since the last compilation. Unchanged modules come
+straight from the incremental compilation cache.
+
+Usage:
+    python -m flyable.tool.compile_server serve --cache ./build/.flyable_cache
+    python -m flyable.tool.compile_server compile test.py --output ./build/output.o
+    python -m flyable.tool.compile_server stop
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import secrets
+import sys
+import threading
+from multiprocessing.connection import Client, Listener
+from typing import Any
+
+import flyable.code_gen.library_loader as loader
+import flyable.compiler as com
+
+DEFAULT_ADDRESS = ("127.0.0.1", 7878)
+AUTH_KEY_NAME = "server.key"
+
+
+def get_auth_key(cache_dir: str, create: bool = False):
+    """
+    Returns the key authenticating the clients of the server. The key is stored inside the cache directory, so only
+    the users allowed to read the cache can talk to the server
+    """
+    key_path = os.path.join(cache_dir, AUTH_KEY_NAME)
+    if create:
+        os.makedirs(cache_dir, exist_ok=True)
+        fd = os.open(key_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(secrets.token_bytes(32))
+    with open(key_path, "rb") as f:
+        return f.read()
+
+
+class CompileServer:
+    """
+    Server answering compile requests sent through a local socket
+    """
+
+    def __init__(self, cache_dir: str, address: tuple[str, int] = DEFAULT_ADDRESS, watch_interval: float = 0.5,
+                 jobs: int = 1):
+        self.__cache_dir = cache_dir
+        self.__address = address
+        self.__watch_interval = watch_interval
+        self.__compiler = com.Compiler()
+        self.__compiler.set_cache_dir(cache_dir)
+        self.__compiler.set_jobs(jobs)
+        self.__files_mtime: dict[str, float] = {}
+        self.__lock = threading.Lock()
+        self.__stopped = threading.Event()
+
+    def serve(self):
+        # Load the native layer right away so the first compilation doesn't pay for it
+        loader.load_lib()
+
+        watcher = threading.Thread(target=self.__watch, daemon=True)
+        watcher.start()
+
+        with Listener(self.__address, authkey=get_auth_key(self.__cache_dir, create=True)) as listener:
+            while not self.__stopped.is_set():
+                with listener.accept() as conn:
+                    request = conn.recv()
+                    conn.send(self.handle_request(request))
+
+    def handle_request(self, request: dict[str, Any]) -> dict[str, Any]:
+        command = request.get("command")
+        if command == "compile":
+            return self.compile(request["files"], request["output"])
+        elif command == "stop":
+            self.__stopped.set()
+            return {"status": "stopped"}
+        return {"status": "error", "errors": [f"Unknown command {command}"]}
+
+    def compile(self, files: list[str], output: str) -> dict[str, Any]:
+        with self.__lock:
+            files = [os.path.abspath(path) for path in files]
+            self.__reload_changed_files(files)
+
+            self.__compiler.set_output_path(output)
+            self.__compiler.compile()
+
+            errors = [f"{e.message} [{e.line}, {e.row}]" for e in self.__compiler.errors_iter()]
+            return {"status": "error" if errors else "ok", "errors": errors,
+                    "objects": self.__compiler.get_output_objects()}
+
+    def __reload_changed_files(self, files: list[str]):
+        """
+        Read again the files modified since the last time they were loaded.
+        Only the files requested get compiled, the other modules are forgotten
+        """
+        for path in files:
+            mtime = os.stat(path).st_mtime
+            if self.__files_mtime.get(path) != mtime:
+                self.__files_mtime[path] = mtime
+                self.__compiler.add_file(path)
+
+        for path in list(self.__files_mtime.keys()):
+            if path not in files:
+                del self.__files_mtime[path]
+        self.__compiler.keep_files(files)
+
+    def __watch(self):
+        """
+        Reload and compile the watched files as soon as they change, so the cache is already filled when a client asks
+        for them
+        """
+        while not self.__stopped.wait(self.__watch_interval):
+            with self.__lock:
+                changed = [path for path, mtime in self.__files_mtime.items()
+                           if os.path.isfile(path) and os.stat(path).st_mtime != mtime]
+            if len(changed) > 0:
+                self.compile(list(self.__files_mtime.keys()), self.__compiler.get_output_path())
+
+
+def send_request(request: dict[str, Any], cache_dir: str, address: tuple[str, int] = DEFAULT_ADDRESS):
+    with Client(address, authkey=get_auth_key(cache_dir)) as conn:
+        conn.send(request)
+        return conn.recv()
+
+
+def __parse_address(address: str):
+    host, port = address.rsplit(":", 1)
+    return host, int(port)
+
+
+def main(argv: list[str] = None):
+    parser = argparse.ArgumentParser(prog="flyable.tool.compile_server")
+    parser.add_argument("--address", default=f"{DEFAULT_ADDRESS[0]}:{DEFAULT_ADDRESS[1]}")
+    parser.add_argument("--cache", default=os.path.join(".", "build", ".flyable_cache"))
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = commands.add_parser("serve", help="Start the compile server")
+    serve_parser.add_argument("--jobs", type=int, default=1)
+    serve_parser.add_argument("--watch-interval", type=float, default=0.5)
+
+    compile_parser = commands.add_parser("compile", help="Ask the server to compile files")
+    compile_parser.add_argument("files", nargs="+")
+    compile_parser.add_argument("--output", default="output.o")
+
+    commands.add_parser("stop", help="Stop the compile server")
+
+    args = parser.parse_args(argv)
+    address = __parse_address(args.address)
+
+    if args.command == "serve":
+        CompileServer(args.cache, address, args.watch_interval, args.jobs).serve()
+        return 0
+
+    if args.command == "compile":
+        request = {"command": "compile", "files": args.files, "output": os.path.abspath(args.output)}
+    else:
+        request = {"command": "stop"}
+
+    response = send_request(request, args.cache, address)
+    for error in response.get("errors", []):
+        print(error, file=sys.stderr)
+    for obj in response.get("objects", []):
+        print(obj)
+    return 0 if response["status"] != "error" else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
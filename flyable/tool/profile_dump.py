@@ -0,0 +1,212 @@
+"""
+Dump the counters recorded by the runtime profiler of a program compiled with the runtime profiling enabled.
+
+The flat profile lists the compiled functions from the most to the least costly. The folded stacks have one line per
+chain of calls with the cycles spent in its last function, the format expected by flamegraph.pl and speedscope.
+The sites list the branches and the call sites recorded for the profile guided optimization.
+
+Usage:
+    python -m flyable.tool.profile_dump flyable_profile.bin
+    python -m flyable.tool.profile_dump flyable_profile.bin --folded profile.folded
+    python -m flyable.tool.profile_dump flyable_profile.bin --sites
+"""
+from __future__ import annotations
+
+import argparse
+import struct
+import sys
+from dataclasses import dataclass
+
+PROFILE_MAGIC = 0x50594C46
+PROFILE_VERSION = 2
+
+# Layouts of runtime/src/profiler.h
+HEADER_STRUCT = struct.Struct("<8I")
+FUNC_STRUCT = struct.Struct("<120sQ")
+NODE_STRUCT = struct.Struct("<4I3Q")
+SITE_STRUCT = struct.Struct("<104s2I2Q8s")
+
+SITE_BRANCH = 1
+SITE_CALL = 2
+
+# Masks of the types seen for an argument of a call site
+TYPE_INT = 1
+TYPE_FLOAT = 2
+TYPE_BOOL = 4
+TYPE_LIST = 8
+TYPE_OTHER = 16
+TYPE_NAMES = [(TYPE_INT, "int"), (TYPE_FLOAT, "float"), (TYPE_BOOL, "bool"), (TYPE_LIST, "list"),
+              (TYPE_OTHER, "object")]
+
+
+@dataclass
+class ProfileNode:
+    parent: int
+    func: int
+    calls: int
+    cycles: int
+    child_cycles: int
+
+    def get_self_cycles(self):
+        # The clock can go slightly backward between cores, the self time is never negative
+        return max(self.cycles - self.child_cycles, 0)
+
+
+@dataclass
+class FlatEntry:
+    name: str
+    calls: int = 0
+    self_cycles: int = 0
+    total_cycles: int = 0
+
+
+@dataclass
+class ProfileSite:
+    key: str
+    kind: int
+    counts: tuple[int, int]  # Taken and not taken for a branch, the calls made for a call site
+    args_types: list[int]
+
+    def get_calls(self):
+        return self.counts[0]
+
+
+def format_types(mask: int):
+    return "|".join(name for bit, name in TYPE_NAMES if mask & bit) if mask != 0 else "?"
+
+
+class Profile:
+
+    def __init__(self, funcs: list[tuple[str, int]], nodes: list[ProfileNode], sites: list[ProfileSite] = None):
+        self.__funcs = funcs
+        self.__nodes = nodes
+        self.__sites = {} if sites is None else {e.key: e for e in sites}
+
+    def get_func_name(self, func: int):
+        return self.__funcs[func][0]
+
+    def get_total_cycles(self):
+        return self.__nodes[0].child_cycles if len(self.__nodes) > 0 else 0
+
+    def get_stack(self, index: int):
+        """
+        Returns the functions called to reach the node, from the outermost one
+        """
+        result = []
+        while index != 0:
+            node = self.__nodes[index]
+            result.append(node.func)
+            index = node.parent
+        result.reverse()
+        return result
+
+    def get_flat_profile(self):
+        """
+        Returns the functions from the most to the least costly. A recursive call doesn't count twice in the total
+        time of the function
+        """
+        entries = [FlatEntry(name, calls) for name, calls in self.__funcs]
+        for i, node in enumerate(self.__nodes[1:], 1):
+            entries[node.func].self_cycles += node.get_self_cycles()
+            if node.func not in self.get_stack(node.parent):
+                entries[node.func].total_cycles += node.cycles
+        return sorted(entries[1:], key=lambda e: (e.self_cycles, e.total_cycles), reverse=True)
+
+    def get_site(self, key: str):
+        return self.__sites.get(key)
+
+    def sites_iter(self):
+        return iter(self.__sites.values())
+
+    def get_folded_stacks(self):
+        result = []
+        for i, node in enumerate(self.__nodes[1:], 1):
+            if node.get_self_cycles() > 0:
+                stack = ";".join(self.get_func_name(func) for func in self.get_stack(i))
+                result.append(f"{stack} {node.get_self_cycles()}")
+        return result
+
+
+def read_profile(path: str):
+    with open(path, "rb") as f:
+        data = f.read()
+
+    if len(data) < HEADER_STRUCT.size:
+        raise ValueError(f"{path} is not a Flyable profile")
+    magic, version, funcs_count, nodes_count, max_funcs, max_nodes, sites_count, _ = HEADER_STRUCT.unpack_from(data, 0)
+    if magic != PROFILE_MAGIC:
+        raise ValueError(f"{path} is not a Flyable profile")
+    if version != PROFILE_VERSION:
+        raise ValueError(f"{path} has the profile version {version}, only the version {PROFILE_VERSION} is supported")
+
+    funcs = []
+    funcs_offset = HEADER_STRUCT.size
+    for i in range(funcs_count):
+        name, calls = FUNC_STRUCT.unpack_from(data, funcs_offset + i * FUNC_STRUCT.size)
+        funcs.append((name.split(b"\0", 1)[0].decode("utf-8", "replace"), calls))
+
+    nodes = []
+    nodes_offset = funcs_offset + max_funcs * FUNC_STRUCT.size
+    for i in range(nodes_count):
+        parent, func, _, _, calls, cycles, child_cycles = NODE_STRUCT.unpack_from(data, nodes_offset +
+                                                                                  i * NODE_STRUCT.size)
+        nodes.append(ProfileNode(parent, func, calls, cycles, child_cycles))
+
+    sites = []
+    sites_offset = nodes_offset + max_nodes * NODE_STRUCT.size
+    for i in range(sites_count):
+        key, kind, args_count, taken, not_taken, types = SITE_STRUCT.unpack_from(data, sites_offset +
+                                                                                 i * SITE_STRUCT.size)
+        key = key.split(b"\0", 1)[0].decode("utf-8", "replace")
+        sites.append(ProfileSite(key, kind, (taken, not_taken), list(types[:min(args_count, len(types))])))
+    return Profile(funcs, nodes, sites)
+
+
+def format_flat_profile(profile: Profile):
+    total = max(profile.get_total_cycles(), 1)
+    lines = [f"{'self %':>8} {'total %':>8} {'calls':>12} {'self cycles':>16} {'total cycles':>16}  name"]
+    for entry in profile.get_flat_profile():
+        if entry.calls == 0:
+            continue
+        lines.append(f"{entry.self_cycles * 100 / total:>7.2f}% {entry.total_cycles * 100 / total:>7.2f}% "
+                     f"{entry.calls:>12} {entry.self_cycles:>16} {entry.total_cycles:>16}  {entry.name}")
+    return "\n".join(lines)
+
+
+def format_sites(profile: Profile):
+    lines = [f"{'kind':<8} {'count':>12} {'not taken':>12}  key"]
+    for site in sorted(profile.sites_iter(), key=lambda e: sum(e.counts), reverse=True):
+        if site.kind == SITE_BRANCH:
+            lines.append(f"{'branch':<8} {site.counts[0]:>12} {site.counts[1]:>12}  {site.key}")
+        else:
+            types = ", ".join(format_types(e) for e in site.args_types)
+            lines.append(f"{'call':<8} {site.get_calls():>12} {'':>12}  {site.key} ({types})")
+    return "\n".join(lines)
+
+
+def main(argv: list[str] = None):
+    parser = argparse.ArgumentParser(prog="flyable.tool.profile_dump")
+    parser.add_argument("profile", help="Profile written by the program")
+    parser.add_argument("--folded", help="Write the folded stacks into this file")
+    parser.add_argument("--sites", action="store_true", help="List the recorded branches and call sites")
+    args = parser.parse_args(argv)
+
+    try:
+        profile = read_profile(args.profile)
+    except (OSError, ValueError) as e:
+        print(e, file=sys.stderr)
+        return 1
+
+    print(format_flat_profile(profile))
+    if args.sites:
+        print()
+        print(format_sites(profile))
+    if args.folded is not None:
+        with open(args.folded, "w", encoding="utf-8") as f:
+            for line in profile.get_folded_stacks():
+                f.write(line + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,21 +1,59 @@
 #include "CodeGen.hpp"
 #include <iostream>
 #include <fstream>
+#include <algorithm>
+#include <functional>
 
-void flyable_codegen_run(char* data,int size,char* path)
+static FlyableProfileCallback gProfileCallback = nullptr;
+
+static void runCodeGen(FormatReader& reader,char* path)
 {
     CodeGen gen;
     gen.init();
-    FormatReader reader(data,size);
     gen.readInput(reader);
     gen.validate();
     gen.opt();
     gen.output(std::string(path));
 }
 
-CodeGen::CodeGen() : mBuilder(mContext)
+void flyable_codegen_run(char* data,int size,char* path)
+{
+    FormatReader reader(data,size);
+    runCodeGen(reader,path);
+}
+
+void flyable_codegen_set_profile_callback(FlyableProfileCallback callback)
+{
+    gProfileCallback = callback;
+}
+
+int flyable_codegen_llvm_version()
+{
+    return LLVM_VERSION_MAJOR;
+}
+
+void flyable_codegen_run_file(char* input,char* path)
 {
+    //The file is memory mapped so the code is never fully loaded in memory by the reader
+    auto buffer = llvm::MemoryBuffer::getFile(input,false,false);
+    if(!buffer)
+    {
+        std::cout<<"Can't read Flyable code file "<<input<<" : "<<buffer.getError().message()<<std::endl;
+        return;
+    }
 
+    FormatReader reader((*buffer)->getBufferStart(),(*buffer)->getBufferSize());
+    runCodeGen(reader,path);
+}
+
+CodeGen::CodeGen() : mBuilder(mContext)
+{
+    mDebug = NO_DEBUG;
+    mOptLevel = O3;
+    mInlineThreshold = -1;
+    mVectorize = true;
+    mUnrollLoops = true;
+    mCodeGenThreads = 1;
 }
 
 void CodeGen::init()
@@ -29,81 +67,171 @@ void CodeGen::init()
     llvm::InitializeAllAsmPrinters();
 
     std::string error;
-    std::string targetTriple = "";
+    mTargetTriple = "";
 
     #ifdef _WIN32
-        targetTriple ="x86_64-unknown-windows-c";
+        mTargetTriple ="x86_64-unknown-windows-c";
     #elif __APPLE__
-        targetTriple ="arm64-apple-darwin-macho";
+        mTargetTriple ="arm64-apple-darwin-macho";
     #endif
 
-    mTarget = llvm::TargetRegistry::lookupTarget(targetTriple, error);
-
-    auto CPU = "generic";
-    auto Features = "";
-    llvm::TargetOptions opt;
-    auto RM = llvm::Optional<llvm::Reloc::Model>();
-    mTargetMachine = mTarget->createTargetMachine(targetTriple, CPU, Features, opt, RM);
+    mTarget = llvm::TargetRegistry::lookupTarget(mTargetTriple, error);
+    mTargetMachine = createTargetMachine().release();
 
     mModule->setDataLayout(mTargetMachine->createDataLayout());
-    mModule->setTargetTriple(targetTriple);
+    mModule->setTargetTriple(mTargetTriple);
 
     mLayout = new llvm::DataLayout(mModule);
 
 }
 
-void CodeGen::addOptPasses(llvm::legacy::PassManagerBase &passes,llvm::legacy::FunctionPassManager &fnPasses,llvm::TargetMachine *machine)
+std::unique_ptr<llvm::TargetMachine> CodeGen::createTargetMachine()
 {
-    llvm::PassManagerBuilder builder;
-    builder.OptLevel = 3;
-    builder.SizeLevel = 0;
-    builder.Inliner = llvm::createFunctionInliningPass(3, 0, false);
-    builder.LoopVectorize = true;
-    builder.SLPVectorize = true;
-    machine->adjustPassManager(builder);
-
-    builder.populateFunctionPassManager(fnPasses);
-    builder.populateModulePassManager(passes);
+    auto CPU = "generic";
+    auto Features = "";
+    llvm::TargetOptions opt;
+    auto RM = llvm::Optional<llvm::Reloc::Model>();
+    return std::unique_ptr<llvm::TargetMachine>(mTarget->createTargetMachine(mTargetTriple, CPU, Features, opt, RM,
+                                                                             llvm::None, getCodeGenOptLevel()));
 }
 
-void CodeGen::addLinkPasses(llvm::legacy::PassManagerBase &passes)
+llvm::CodeGenOpt::Level CodeGen::getCodeGenOptLevel()
 {
-  llvm::PassManagerBuilder builder;
-  builder.VerifyInput = true;
-  builder.Inliner = llvm::createFunctionInliningPass(3, 0, false);
-  builder.populateLTOPassManager(passes);
+    if(mOptLevel == O0)
+        return llvm::CodeGenOpt::None;
+    else if(mOptLevel == O1)
+        return llvm::CodeGenOpt::Less;
+    else if(mOptLevel == O2 || mOptLevel == OS)
+        return llvm::CodeGenOpt::Default;
+    return llvm::CodeGenOpt::Aggressive;
 }
 
+llvm::OptimizationLevel CodeGen::getOptimizationLevel()
+{
+    switch(mOptLevel)
+    {
+        case O0:
+            return llvm::OptimizationLevel::O0;
+        case O1:
+            return llvm::OptimizationLevel::O1;
+        case O2:
+            return llvm::OptimizationLevel::O2;
+        case OS:
+            return llvm::OptimizationLevel::Os;
+        default:
+            return llvm::OptimizationLevel::O3;
+    }
+}
 
 void CodeGen::opt()
 {
+    mModule->setTargetTriple(mTargetMachine->getTargetTriple().str());
+    mModule->setDataLayout(mTargetMachine->createDataLayout());
 
-    for(size_t i = 0;i < 10;++i)
+    llvm::PipelineTuningOptions tuning;
+    tuning.LoopVectorization = mVectorize;
+    tuning.SLPVectorization = mVectorize;
+    tuning.LoopUnrolling = mUnrollLoops;
+#if LLVM_VERSION_MAJOR >= 16
+    if(mInlineThreshold >= 0)
+        tuning.InlinerThreshold = mInlineThreshold;
+#endif
+
+    llvm::LoopAnalysisManager loopAnalysis;
+    llvm::FunctionAnalysisManager funcAnalysis;
+    llvm::CGSCCAnalysisManager cgsccAnalysis;
+    llvm::ModuleAnalysisManager moduleAnalysis;
+
+    llvm::PassInstrumentationCallbacks callbacks;
+    if(gProfileCallback != nullptr)
+        registerProfiling(callbacks);
+
+    llvm::PassBuilder builder(mTargetMachine,tuning,llvm::None,gProfileCallback != nullptr ? &callbacks : nullptr);
+    builder.registerModuleAnalyses(moduleAnalysis);
+    builder.registerCGSCCAnalyses(cgsccAnalysis);
+    builder.registerFunctionAnalyses(funcAnalysis);
+    builder.registerLoopAnalyses(loopAnalysis);
+    builder.crossRegisterProxies(loopAnalysis,funcAnalysis,cgsccAnalysis,moduleAnalysis);
+
+#if LLVM_VERSION_MAJOR < 16
+    //The default pipelines don't take an inliner threshold before LLVM 16. An inliner with the threshold runs before
+    //the default one, so a threshold above the default inlines more, a lower one can't prevent the default inlining
+    if(mInlineThreshold >= 0 && mOptLevel != O0)
     {
-        mModule->setTargetTriple(mTargetMachine->getTargetTriple().str());
-        mModule->setDataLayout(mTargetMachine->createDataLayout());
-
-        llvm::legacy::PassManager passes;
-        passes.add(new llvm::TargetLibraryInfoWrapperPass(mTargetMachine->getTargetTriple()));
-        passes.add(llvm::createTargetTransformInfoWrapperPass(mTargetMachine->getTargetIRAnalysis()));
-
+        int threshold = mInlineThreshold;
+        builder.registerPipelineEarlySimplificationEPCallback(
+            [threshold](llvm::ModulePassManager& passes,llvm::OptimizationLevel)
+            {
+                passes.addPass(llvm::ModuleInlinerWrapperPass(llvm::getInlineParams(threshold)));
+            });
+    }
+#endif
+
+    llvm::OptimizationLevel level = getOptimizationLevel();
+    //The reference counting markers are expanded at every level. The variables get promoted to registers first, so
+    //the increment and the decrement of a variable refer to the same value
+    llvm::FunctionPassManager refCountPasses;
+    refCountPasses.addPass(llvm::PromotePass());
+    refCountPasses.addPass(RefCountPass());
+
+    llvm::ModulePassManager passes;
+    passes.addPass(llvm::createModuleToFunctionPassAdaptor(std::move(refCountPasses)));
+    passes.addPass(mOptLevel == O0 ? builder.buildO0DefaultPipeline(level) : builder.buildPerModuleDefaultPipeline(level));
+    passes.addPass(llvm::VerifierPass());
+    passes.run(*mModule,moduleAnalysis);
+}
 
-        llvm::legacy::FunctionPassManager fnPasses(mModule);
-        fnPasses.add(llvm::createTargetTransformInfoWrapperPass(mTargetMachine->getTargetIRAnalysis()));
+void CodeGen::registerProfiling(llvm::PassInstrumentationCallbacks& callbacks)
+{
+    /*
+    The passes nest into each other, a pass manager running its passes. Each pass only counts its own time, without
+    the passes it runs, so the time of a function isn't counted twice.
+    Function and loop passes are attributed to their function, any other pass to the module.
+    */
+    callbacks.registerBeforeNonSkippedPassCallback([this](llvm::StringRef,llvm::Any)
+    {
+        mRunningPasses.push_back({std::chrono::steady_clock::now(),0.0});
+    });
 
-        addOptPasses(passes, fnPasses, mTargetMachine);
-        addLinkPasses(passes);
+    auto endPass = [this](llvm::Any ir)
+    {
+        if(mRunningPasses.empty())
+            return;
+
+        auto running = mRunningPasses.back();
+        mRunningPasses.pop_back();
+        double elapsed = std::chrono::duration<double>(std::chrono::steady_clock::now() - running.first).count();
+        if(!mRunningPasses.empty())
+            mRunningPasses.back().second += elapsed;
+
+        std::string name;
+        if(llvm::any_isa<const llvm::Function*>(ir))
+            name = llvm::any_cast<const llvm::Function*>(ir)->getName().str();
+        else if(llvm::any_isa<const llvm::Loop*>(ir))
+            name = llvm::any_cast<const llvm::Loop*>(ir)->getHeader()->getParent()->getName().str();
+        mOptTimes[name] += elapsed - running.second;
+    };
+
+    callbacks.registerAfterPassCallback([endPass](llvm::StringRef,llvm::Any ir,const llvm::PreservedAnalyses&)
+    {
+        endPass(ir);
+    });
 
-        fnPasses.doInitialization();
-        for (llvm::Function &func : *mModule)
-        {
-            fnPasses.run(func);
-        }
-        fnPasses.doFinalization();
+    //The pass invalidated its IR unit, the time can only go to the module
+    callbacks.registerAfterPassInvalidatedCallback([endPass](llvm::StringRef,const llvm::PreservedAnalyses&)
+    {
+        endPass(llvm::Any());
+    });
+}
 
-        passes.add(llvm::createVerifierPass());
-        passes.run(*mModule);
-    }
+void CodeGen::reportProfile(double codeGenTime)
+{
+    //The objects are emitted for the whole module at once, so the code generation time goes to the module entry,
+    //created if no module pass ran
+    mOptTimes[""];
+    for(auto& time : mOptTimes)
+        gProfileCallback(time.first.c_str(),time.second,time.first.empty() ? codeGenTime : 0.0);
+    mOptTimes.clear();
 }
 
 void CodeGen::output(std::string output)
@@ -138,28 +266,88 @@ void CodeGen::output(std::string output)
 
     if(!hasError)
     {
-        std::string filename = output;
+        auto start = std::chrono::steady_clock::now();
+        if(mCodeGenThreads > 1)
+            outputSplit(output);
+        else
+            outputSingle(output);
+
+        if(gProfileCallback != nullptr)
+            reportProfile(std::chrono::duration<double>(std::chrono::steady_clock::now() - start).count());
+    }
+}
+
+void CodeGen::outputSingle(std::string output)
+{
+    std::string filename = output;
+    std::error_code EC;
+    llvm::raw_fd_ostream dest(filename, EC);
+    llvm::legacy::PassManager pass;
+    if(mTargetMachine->addPassesToEmitFile(pass, dest,nullptr,llvm::CodeGenFileType::CGFT_ObjectFile))
+    {
+        std::cout<< "TheTargetMachine can't emit a file of this type"<<std::endl;
+    }
+
+    pass.run(*mModule);
+    dest.flush();
+}
+
+void CodeGen::outputSplit(std::string output)
+{
+    /*
+    The module gets split into one partition per thread, each partition being emitted into its own object.
+    Local symbols can end up referenced from another partition, so they get externalized by the split.
+    They are renamed first with a suffix unique to the output so the objects of different modules never collide.
+    */
+    std::string suffix = ".flyable." + llvm::utohexstr(std::hash<std::string>()(output));
+    for(llvm::GlobalValue& value : mModule->global_values())
+    {
+        if(value.hasLocalLinkage() && value.hasName())
+            value.setName(value.getName() + suffix);
+    }
+
+    std::vector<std::unique_ptr<llvm::raw_fd_ostream>> streams;
+    std::vector<llvm::raw_pwrite_stream*> outputs;
+    for(int i = 0;i < mCodeGenThreads;++i)
+    {
         std::error_code EC;
-        llvm::raw_fd_ostream dest(filename, EC);
-        llvm::legacy::PassManager pass;
-        if(mTargetMachine->addPassesToEmitFile(pass, dest,nullptr,llvm::CodeGenFileType::CGFT_ObjectFile))
+        streams.push_back(std::make_unique<llvm::raw_fd_ostream>(getPartitionPath(output,i),EC));
+        if(EC)
         {
-            std::cout<< "TheTargetMachine can't emit a file of this type"<<std::endl;
+            std::cout<<"Can't open the output "<<getPartitionPath(output,i)<<" : "<<EC.message()<<std::endl;
+            return;
         }
-
-        pass.run(*mModule);
-        dest.flush();
+        outputs.push_back(streams.back().get());
     }
+
+    llvm::splitCodeGen(*mModule,outputs,{},[this]() { return createTargetMachine(); },
+                       llvm::CodeGenFileType::CGFT_ObjectFile,false);
+
+    for(auto& stream : streams)
+        stream->flush();
+}
+
+std::string CodeGen::getPartitionPath(std::string output,int partition)
+{
+    //The first partition is the output itself, so a single threaded output keeps the same path
+    if(partition == 0)
+        return output;
+    return output + ".part" + std::to_string(partition) + ".o";
 }
 
 void CodeGen::readInput(FormatReader& reader)
 {
-    if(reader.readString() == "**Flyable format**")
+    //The first format has no optimization data, the defaults of the constructor are kept
+    llvm::StringRef format = reader.readString();
+    bool hasOptData = format == "**Flyable format 2**";
+    if(hasOptData || format == "**Flyable format**")
     {
         mDebug = (DebugFlags) reader.readInt32();
+        if(hasOptData)
+            readOptProfile(reader);
         readStructs(reader);
         readGlobalVars(reader);
-        readFuncs(reader);
+        readFuncs(reader,hasOptData);
     }
     else
         std::cout<<"Flyable code generation format unrecognized"<<std::endl;
@@ -183,6 +371,37 @@ void CodeGen::validate()
 
 
 
+void CodeGen::readOptProfile(FormatReader& reader)
+{
+    mOptLevel = (OptLevel) reader.readInt32();
+    mInlineThreshold = reader.readInt32();
+    mVectorize = reader.readInt32() != 0;
+    mUnrollLoops = reader.readInt32() != 0;
+
+    mTargetMachine->setOptLevel(getCodeGenOptLevel());
+
+    //Amount of threads emitting the objects
+    mCodeGenThreads = std::max(1,reader.readInt32());
+}
+
+void CodeGen::applyFuncOptLevel(llvm::Function* func,OptLevel level)
+{
+    /*
+    A module is optimized by a single pipeline, so a function can only lower its own level.
+    O0 disables the optimizations of the function and Os makes them favor the size.
+    Higher levels follow the level of the module.
+    */
+    if(level == O0)
+    {
+        func->addFnAttr(llvm::Attribute::OptimizeNone);
+        func->addFnAttr(llvm::Attribute::NoInline);
+    }
+    else if(level == OS)
+    {
+        func->addFnAttr(llvm::Attribute::OptimizeForSize);
+    }
+}
+
 void CodeGen::readStructs(FormatReader& reader)
 {
     //read all structs
@@ -196,7 +415,7 @@ void CodeGen::readStructs(FormatReader& reader)
     for(int i = 0;i < structCount;++i)
     {
         llvm::StructType* current = mStructTypes[i];
-        std::string name = reader.readString();
+        llvm::StringRef name = reader.readString();
         current->setName(name);
 
         std::vector<llvm::Type*> attr;
@@ -214,7 +433,7 @@ void CodeGen::readGlobalVars(FormatReader& reader)
     mGlobalVars.resize(varCount);
     for(size_t i = 0;i < varCount;++i)
     {
-        std::string name = reader.readString();
+        llvm::StringRef name = reader.readString();
         llvm::Type* type = readType(reader);
         auto link = readLinkage(reader);
         llvm::GlobalVariable* globalVar = new llvm::GlobalVariable(*mModule,type,false,link,nullptr,name);
@@ -234,19 +453,21 @@ void CodeGen::readGlobalVars(FormatReader& reader)
     }
 }
 
-void CodeGen::readFuncs(FormatReader& reader)
+void CodeGen::readFuncs(FormatReader& reader,bool hasOptData)
 {
     size_t funcsCount = reader.readInt32();
     mFuncs.resize(funcsCount);
     std::vector<std::vector<FormatReader>> blocks;
-    std::vector<std::vector<std::string>> blockNames;
+    std::vector<std::vector<llvm::StringRef>> blockNames;
     std::vector<std::vector<llvm::Value*>> values;
     for(size_t i = 0;i < funcsCount;++i)
     {
         blocks.push_back(std::vector<FormatReader>());
-        blockNames.push_back(std::vector<std::string>());
-        std::string name = reader.readString();
+        blockNames.push_back(std::vector<llvm::StringRef>());
+        llvm::StringRef name = reader.readString();
         auto link = readLinkage(reader);
+        OptLevel funcOptLevel = hasOptData ? (OptLevel) reader.readInt32() : DEFAULT_LEVEL;
+        int funcFlags = hasOptData ? reader.readInt32() : 0;
 
         llvm::Type* returnType = readType(reader);
         size_t argsCount = reader.readInt32();
@@ -258,6 +479,10 @@ void CodeGen::readFuncs(FormatReader& reader)
 
         llvm::FunctionType* funcType = llvm::FunctionType::get(returnType,llvm::ArrayRef<llvm::Type*>(argTypes),false);
         mFuncs[i] = llvm::Function::Create(funcType,link,name,mModule);
+        if(funcOptLevel != DEFAULT_LEVEL)
+            applyFuncOptLevel(mFuncs[i],funcOptLevel);
+        if(funcFlags & FUNC_FLAG_INLINE_HINT)
+            mFuncs[i]->addFnAttr(llvm::Attribute::InlineHint);
 
         size_t valuesCount = reader.readInt32();
         values.push_back(std::vector<llvm::Value*>(valuesCount,nullptr));
@@ -275,7 +500,7 @@ void CodeGen::readFuncs(FormatReader& reader)
     }
 }
 
-void CodeGen::readBody(llvm::Function* func,std::vector<llvm::Value*>& values,std::vector<FormatReader> &readers,std::vector<std::string>& blockNames)
+void CodeGen::readBody(llvm::Function* func,std::vector<llvm::Value*>& values,std::vector<FormatReader> &readers,std::vector<llvm::StringRef>& blockNames)
 {
     std::vector<llvm::BasicBlock*> blocks(readers.size());
     for(size_t i = 0;i < readers.size();++i)
@@ -301,7 +526,7 @@ void CodeGen::readBody(llvm::Function* func,std::vector<llvm::Value*>& values,st
                 FormatReader* current = &readers[i];
                 mBuilder.SetInsertPoint(blocks[i]);
 
-                int beforeOpcodeIndex = current->getCurrentIndex();
+                size_t beforeOpcodeIndex = current->getCurrentIndex();
 
                 std::string debugText;
                 if(mDebug == SHOW_OPCODE_ON_EXEC || mDebug == SHOW_OPCODE_ON_GEN)
@@ -309,7 +534,7 @@ void CodeGen::readBody(llvm::Function* func,std::vector<llvm::Value*>& values,st
 
                 int opcode = current->readInt32();
 
-                unsigned int beforeTryIndex = current->getCurrentIndex();
+                size_t beforeTryIndex = current->getCurrentIndex();
 
                 bool canRunBlock = tryOpcode(values,*current,opcode,i,func);
 
@@ -514,6 +739,28 @@ void CodeGen::readBody(llvm::Function* func,std::vector<llvm::Value*>& values,st
                         }
                         break;
 
+                        //Signed int operations checking for an overflow
+                        case 18:
+                        case 19:
+                        case 20:
+                        {
+                            llvm::Value* left = values[current->readInt32()];
+                            llvm::Value* right = values[current->readInt32()];
+
+                            llvm::Intrinsic::ID intrinsic;
+                            if(opcode == 18)
+                                intrinsic = llvm::Intrinsic::sadd_with_overflow;
+                            else if(opcode == 19)
+                                intrinsic = llvm::Intrinsic::ssub_with_overflow;
+                            else
+                                intrinsic = llvm::Intrinsic::smul_with_overflow;
+
+                            llvm::Value* result = mBuilder.CreateBinaryIntrinsic(intrinsic, left, right);
+                            values[current->readInt32()] = mBuilder.CreateExtractValue(result, 0);
+                            values[current->readInt32()] = mBuilder.CreateExtractValue(result, 1);
+                        }
+                        break;
+
                         case 100:
                         {
                             int valueId = current->readInt32();
@@ -552,6 +799,18 @@ void CodeGen::readBody(llvm::Function* func,std::vector<llvm::Value*>& values,st
                         }
                         break;
 
+                        case 154:
+                        {
+                            llvm::Value* value = values[current->readInt32()];
+                            llvm::BasicBlock* blockTrue = blocks[current->readInt32()];
+                            llvm::BasicBlock* blockFalse = blocks[current->readInt32()];
+                            uint32_t weightTrue = (uint32_t) current->readInt32();
+                            uint32_t weightFalse = (uint32_t) current->readInt32();
+                            llvm::MDNode* weights = llvm::MDBuilder(mContext).createBranchWeights(weightTrue,weightFalse);
+                            mBuilder.CreateCondBr(value,blockTrue,blockFalse,weights);
+                        }
+                        break;
+
                         case 152:
                         {
                             int elementId = current->readInt32();
@@ -793,8 +1052,8 @@ void CodeGen::readBody(llvm::Function* func,std::vector<llvm::Value*>& values,st
 
                         case 3001:
                         {
-                            std::string txt = current->readString();
-                            values[current->readInt32()] = mBuilder.CreateGlobalString(llvm::StringRef(txt));
+                            llvm::StringRef txt = current->readString();
+                            values[current->readInt32()] = mBuilder.CreateGlobalString(txt);
                         }
                         break;
 
@@ -806,6 +1065,17 @@ void CodeGen::readBody(llvm::Function* func,std::vector<llvm::Value*>& values,st
                         }
                         break;
 
+                        case 4000:
+                        case 4001:
+                        {
+                            //Markers expanded by the RefCountPass once the increments and decrements got paired
+                            llvm::Value* value = mBuilder.CreatePointerCast(values[current->readInt32()],llvm::Type::getInt8PtrTy(mContext));
+                            llvm::FunctionType* markerType = llvm::FunctionType::get(llvm::Type::getVoidTy(mContext),llvm::ArrayRef<llvm::Type*>({llvm::Type::getInt8PtrTy(mContext)}),false);
+                            auto marker = mModule->getOrInsertFunction(opcode == 4000 ? FLYABLE_INCREF_MARKER : FLYABLE_DECREF_MARKER,markerType);
+                            mBuilder.CreateCall(marker,{value});
+                        }
+                        break;
+
                         case 9997:
                         {
                             llvm::Type* phiType= readType(*current);
@@ -891,7 +1161,7 @@ void CodeGen::readBody(llvm::Function* func,std::vector<llvm::Value*>& values,st
 
 }
 
-bool CodeGen::tryOpcode(std::vector<llvm::Value*> values,FormatReader& reader,int opcode,int blockId,llvm::Function* currentFunction)
+bool CodeGen::tryOpcode(std::vector<llvm::Value*>& values,FormatReader& reader,int opcode,int blockId,llvm::Function* currentFunction)
 {
     if(OpCodesInfo.count(opcode) > 0)
     {
@@ -957,7 +1227,7 @@ bool CodeGen::tryOpcode(std::vector<llvm::Value*> values,FormatReader& reader,in
 
 std::string CodeGen::readDebugStack(FormatReader& reader)
 {
-    std::string result= "\n" + reader.readString();
+    std::string result= "\n" + reader.readString().str();
     result += "\0";
     return result;
 }
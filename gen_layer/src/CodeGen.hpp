@@ -12,11 +12,13 @@
 #include "llvm/IR/GlobalVariable.h"
 #include "llvm/IR/PassManager.h"
 #include "llvm/IR/Attributes.h"
+#include "llvm/IR/MDBuilder.h"
 #include "llvm/Support/raw_os_ostream.h"
 #include "llvm/Support/raw_ostream.h"
 #include "llvm/Bitcode/BitcodeWriter.h"
 #include "llvm/Support/TargetSelect.h"
 #include "llvm/Support/FileSystem.h"
+#include "llvm/Support/MemoryBuffer.h"
 #include "llvm/MC/TargetRegistry.h"
 #include "llvm/IR/LegacyPassManager.h"
 #include "llvm/IR/Verifier.h"
@@ -29,9 +31,22 @@
 #include "llvm/Target/TargetMachine.h"
 #include "llvm/Analysis/TargetLibraryInfo.h"
 #include "llvm/Analysis/TargetTransformInfo.h"
-#include "llvm/Transforms/IPO/PassManagerBuilder.h"
+#include "llvm/Passes/PassBuilder.h"
+#include "llvm/Config/llvm-config.h"
+#include "llvm/Analysis/InlineCost.h"
+#include "llvm/Transforms/IPO/Inliner.h"
+#include "llvm/Passes/OptimizationLevel.h"
+#include "llvm/CodeGen/ParallelCG.h"
+#include "llvm/ADT/StringExtras.h"
+#include "llvm/ADT/Any.h"
+#include "llvm/IR/PassInstrumentation.h"
+#include "llvm/Analysis/LoopInfo.h"
+#include "llvm/Transforms/Utils/Mem2Reg.h"
+#include <chrono>
+#include <map>
 
 #include "OpCode.hpp"
+#include "RefCountPass.hpp"
 
 #ifdef _WIN32
     #define EXPORT_FUNC __declspec(dllexport) _cdecl
@@ -40,9 +55,17 @@
 #endif // _WIN32
 
 
+//Receives the name of a function with its optimization and code generation time in seconds
+//An empty name reports the time that can't be attributed to a single function, the code generation time of the module
+//is only reported with it
+typedef void (*FlyableProfileCallback)(const char* name,double optTime,double codeGenTime);
+
 extern "C"
 {
     EXPORT_FUNC void flyable_codegen_run(char* data,int size,char* output);
+    EXPORT_FUNC void flyable_codegen_run_file(char* input,char* output);
+    EXPORT_FUNC void flyable_codegen_set_profile_callback(FlyableProfileCallback callback);
+    EXPORT_FUNC int flyable_codegen_llvm_version();
 };
 
 enum TypePrimitive
@@ -60,6 +83,22 @@ enum TypePrimitive
     ARRAY = 10
 };
 
+enum OptLevel
+{
+    DEFAULT_LEVEL = -1,
+    O0 = 0,
+    O1 = 1,
+    O2 = 2,
+    O3 = 3,
+    OS = 4
+};
+
+//Flags written with each function, must match the FUNC_FLAG constants of flyable/code_gen/code_gen.py
+enum FuncFlags
+{
+    FUNC_FLAG_INLINE_HINT = 1
+};
+
 enum DebugFlags
 {
     NO_DEBUG = 0,
@@ -79,12 +118,22 @@ public:
 
 private:
 
+    void readOptProfile(FormatReader& reader);
+    void applyFuncOptLevel(llvm::Function* func,OptLevel level);
+    std::unique_ptr<llvm::TargetMachine> createTargetMachine();
+    llvm::CodeGenOpt::Level getCodeGenOptLevel();
+    llvm::OptimizationLevel getOptimizationLevel();
+    void registerProfiling(llvm::PassInstrumentationCallbacks& callbacks);
+    void reportProfile(double codeGenTime);
+    void outputSingle(std::string output);
+    void outputSplit(std::string output);
+    std::string getPartitionPath(std::string output,int partition);
     void readStructs(FormatReader& reader);
     void readGlobalVars(FormatReader& reader);
-    void readFuncs(FormatReader& reader);
-    void readBody(llvm::Function* func,std::vector<llvm::Value*>&values,std::vector<FormatReader> &readers,std::vector<std::string>& blockNames);
+    void readFuncs(FormatReader& reader,bool hasOptData);
+    void readBody(llvm::Function* func,std::vector<llvm::Value*>&values,std::vector<FormatReader> &readers,std::vector<llvm::StringRef>& blockNames);
 
-    bool tryOpcode(std::vector<llvm::Value*> values,FormatReader& reader,int opcode,int blockId,llvm::Function* currentFunc);
+    bool tryOpcode(std::vector<llvm::Value*>& values,FormatReader& reader,int opcode,int blockId,llvm::Function* currentFunc);
     std::string readDebugStack(FormatReader& reader);
 
     llvm::CallingConv::ID readConv(FormatReader& reader);
@@ -102,16 +151,25 @@ private:
     llvm::Type* readType(FormatReader& reader);
     llvm::GlobalValue::LinkageTypes readLinkage(FormatReader& reader);
 
-    void addOptPasses(llvm::legacy::PassManagerBase &passes,llvm::legacy::FunctionPassManager &fnPasses,llvm::TargetMachine *machine);
-    void addLinkPasses(llvm::legacy::PassManagerBase &passes);
-
     llvm::LLVMContext mContext;
     llvm::DataLayout* mLayout;
     llvm::Module* mModule;
     const llvm::Target* mTarget;
+    std::string mTargetTriple;
     llvm::TargetMachine* mTargetMachine;
     llvm::IRBuilder<> mBuilder;
     DebugFlags mDebug;
+
+    OptLevel mOptLevel;
+    int mInlineThreshold;
+    bool mVectorize;
+    bool mUnrollLoops;
+    int mCodeGenThreads;
+
+    //Time spent by the passes on each function, the empty name holding the module passes
+    std::map<std::string,double> mOptTimes;
+    //Start time of the running passes, and the time spent in the passes they run
+    std::vector<std::pair<std::chrono::steady_clock::time_point,double>> mRunningPasses;
 };
 
 
@@ -3,85 +3,74 @@
 
 FormatReader::FormatReader()
 {
+    mData = nullptr;
+    mSize = 0;
     mCurrentIndex = 0;
 }
 
-FormatReader::FormatReader(char* data,int size)
+FormatReader::FormatReader(const char* data,size_t size)
 {
-    mData = std::vector<char>(data,data + size);
+    mData = data;
+    mSize = size;
     mCurrentIndex = 0;
 }
 
 int FormatReader::readInt32()
 {
-    int* result = (int*) &mData[mCurrentIndex];
-    mCurrentIndex += sizeof(int);
-    return *result;
+    return read<int>();
 }
 
 long long FormatReader::readInt64()
 {
-    long long* result = (long long*) &mData[mCurrentIndex];
-    mCurrentIndex += sizeof(long long);
-    return *result;
+    return read<long long>();
 }
 
 float FormatReader::readFloat()
 {
-    float* result = (float*) &mData[mCurrentIndex];
-    mCurrentIndex += sizeof(float);
-    return *result;
+    return read<float>();
 }
 
 double FormatReader::readDouble()
 {
-    double* result = (double*) &mData[mCurrentIndex];
-    mCurrentIndex += sizeof(double);
-    return *result;
+    return read<double>();
 }
 
-std::string FormatReader::readString()
+llvm::StringRef FormatReader::readString()
 {
-    std::string result = "";
-    int size = readInt32();
-    for(int i = 0;i < size;++i)
-        result += mData[mCurrentIndex + i];
+    size_t size = readInt32();
+    llvm::StringRef result(mData + mCurrentIndex,size);
     mCurrentIndex += size;
     return result;
 }
 
-FormatReader FormatReader::sub(int size)
+FormatReader FormatReader::sub(size_t size)
 {
-    FormatReader result;
-    auto first = mData.begin() + mCurrentIndex;
-    auto end = first + size;
-    result.mData = std::vector<char>(first,end);
+    FormatReader result(mData + mCurrentIndex,size);
     mCurrentIndex += size;
     return result;
 }
 
-char* FormatReader::getData()
+const char* FormatReader::getData()
 {
-    return &mData[0];
+    return mData;
 }
 
-int FormatReader::getDataSize()
+size_t FormatReader::getDataSize()
 {
-    return mData.size();
+    return mSize;
 }
 
-void FormatReader::setCurrentIndex(unsigned int index)
+void FormatReader::setCurrentIndex(size_t index)
 {
     mCurrentIndex = index;
 }
 
-unsigned int FormatReader::getCurrentIndex()
+size_t FormatReader::getCurrentIndex()
 {
     return mCurrentIndex;
 }
 
 bool FormatReader::atEnd()
 {
-    return mCurrentIndex >= mData.size();
+    return mCurrentIndex >= mSize;
 }
-
@@ -1,33 +1,52 @@
 #ifndef FormatReader_HPP_INCLUDED
 #define FormatReader_HPP_INCLUDED
-#include <vector>
-#include <string>
+#include <cstddef>
+#include <cstring>
+#include "llvm/ADT/StringRef.h"
+
+/*
+Reader of the code sent by the compiler.
+The reader is only a view on the data, nothing gets copied. A sub reader and a string read are views on the same data,
+which must outlive them. The code is read straight from the buffer sent by the compiler or from the mapped file.
+*/
 
 class FormatReader
 {
 public:
 
     FormatReader();
-    FormatReader(char* data,int size);
+    FormatReader(const char* data,size_t size);
 
     int readInt32();
     long long readInt64();
     float readFloat();
     double readDouble();
-    std::string readString();
+    llvm::StringRef readString();
 
-    FormatReader sub(int size);
+    FormatReader sub(size_t size);
 
-    char* getData();
-    int getDataSize();
-    void setCurrentIndex(unsigned int index);
-    unsigned int getCurrentIndex();
+    const char* getData();
+    size_t getDataSize();
+    void setCurrentIndex(size_t index);
+    size_t getCurrentIndex();
 
     bool atEnd();
 
 private:
-    std::vector<char> mData;
-    unsigned int mCurrentIndex;
+
+    //The data isn't aligned, so it's copied out instead of read through a cast pointer
+    template<typename T>
+    T read()
+    {
+        T result;
+        std::memcpy(&result,mData + mCurrentIndex,sizeof(T));
+        mCurrentIndex += sizeof(T);
+        return result;
+    }
+
+    const char* mData;
+    size_t mSize;
+    size_t mCurrentIndex;
 };
 
 
@@ -36,10 +36,14 @@ std::map<int,std::vector<OpCodeFeedInfo>> OpCodesInfo =
     {15,{VALUE_FEED, ASSIGN_FEED}},
     {16,{VALUE_FEED, VALUE_FEED, ASSIGN_FEED}},
     {17,{VALUE_FEED, ASSIGN_FEED}},
+    {18,{VALUE_FEED, VALUE_FEED, ASSIGN_FEED, ASSIGN_FEED}},
+    {19,{VALUE_FEED, VALUE_FEED, ASSIGN_FEED, ASSIGN_FEED}},
+    {20,{VALUE_FEED, VALUE_FEED, ASSIGN_FEED, ASSIGN_FEED}},
     {100,{VALUE_FEED, VALUE_FEED, ASSIGN_FEED}},
     {101,{VALUE_FEED, ASSIGN_FEED}},
     {150,{BLOCK_FEED}},
     {151,{VALUE_FEED, BLOCK_FEED,BLOCK_FEED}},
+    {154,{VALUE_FEED, BLOCK_FEED, BLOCK_FEED, DATA_32BITS, DATA_32BITS}},
     {152,{VALUE_FEED, VALUE_FEED, VALUE_FEED, ASSIGN_FEED}},
     {153,{TYPE_FEED,VALUE_FEED, MULT_VALUES_FEED, ASSIGN_FEED}},
     {170,{DATA_32BITS, MULT_VALUES_FEED, ASSIGN_FEED}},
@@ -66,6 +70,8 @@ std::map<int,std::vector<OpCodeFeedInfo>> OpCodesInfo =
     {3000,{DATA_32BITS,ASSIGN_FEED}},
     {3001,{DATA_STR,ASSIGN_FEED}},
     {3002,{DATA_32BITS,ASSIGN_FEED}},
+    {4000,{VALUE_FEED}},
+    {4001,{VALUE_FEED}},
     {9997,{TYPE_FEED,MULT_VALUES_FEED,MULT_BLOCK_FEED,ASSIGN_FEED}},
     {9998,{TYPE_FEED,ASSIGN_FEED}},
     {9999,{TYPE_FEED,ASSIGN_FEED}},
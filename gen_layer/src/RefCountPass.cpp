@@ -0,0 +1,223 @@
+#include "RefCountPass.hpp"
+#include <algorithm>
+#include <set>
+#include "llvm/Analysis/PostDominators.h"
+#include "llvm/IR/CFG.h"
+#include "llvm/IR/Dominators.h"
+#include "llvm/IR/IRBuilder.h"
+#include "llvm/IR/IntrinsicInst.h"
+#include "llvm/IR/Module.h"
+#include "llvm/Transforms/Utils/BasicBlockUtils.h"
+
+namespace
+{
+    enum MarkerKind
+    {
+        NOT_MARKER = 0,
+        INCREF_MARKER = 1,
+        DECREF_MARKER = 2
+    };
+
+    MarkerKind getMarkerKind(const llvm::Instruction& inst)
+    {
+        auto* call = llvm::dyn_cast<llvm::CallInst>(&inst);
+        if(call == nullptr || call->getCalledFunction() == nullptr)
+            return NOT_MARKER;
+
+        llvm::StringRef name = call->getCalledFunction()->getName();
+        if(name == FLYABLE_INCREF_MARKER)
+            return INCREF_MARKER;
+        else if(name == FLYABLE_DECREF_MARKER)
+            return DECREF_MARKER;
+        return NOT_MARKER;
+    }
+
+    std::vector<llvm::CallInst*> getMarkers(llvm::Function& func)
+    {
+        std::vector<llvm::CallInst*> result;
+        for(llvm::BasicBlock& block : func)
+            for(llvm::Instruction& inst : block)
+                if(getMarkerKind(inst) != NOT_MARKER)
+                    result.push_back(llvm::cast<llvm::CallInst>(&inst));
+        return result;
+    }
+
+    llvm::Value* getObject(llvm::CallInst* marker)
+    {
+        return marker->getArgOperand(0)->stripPointerCasts();
+    }
+
+    //A call can release an object or read a reference counter, the counters must be exact there
+    bool isReleasePoint(const llvm::Instruction& inst)
+    {
+        return llvm::isa<llvm::CallBase>(inst) && !llvm::isa<llvm::IntrinsicInst>(inst);
+    }
+
+    //The reference counter is the first field of an object, so its address strips down to the object
+    llvm::Value* getAccessedObject(llvm::Instruction& inst)
+    {
+        if(auto* load = llvm::dyn_cast<llvm::LoadInst>(&inst))
+            return load->getPointerOperand()->stripPointerCasts();
+        else if(auto* store = llvm::dyn_cast<llvm::StoreInst>(&inst))
+            return store->getPointerOperand()->stripPointerCasts();
+        return nullptr;
+    }
+
+    //Blocks reachable from the successors of the start without going through the stop block
+    std::set<llvm::BasicBlock*> getReachable(llvm::BasicBlock* start,llvm::BasicBlock* stop)
+    {
+        std::set<llvm::BasicBlock*> result;
+        std::vector<llvm::BasicBlock*> toVisit(llvm::succ_begin(start),llvm::succ_end(start));
+        while(!toVisit.empty())
+        {
+            llvm::BasicBlock* current = toVisit.back();
+            toVisit.pop_back();
+            if(current == stop || !result.insert(current).second)
+                continue;
+            toVisit.insert(toVisit.end(),llvm::succ_begin(current),llvm::succ_end(current));
+        }
+        return result;
+    }
+}
+
+llvm::PreservedAnalyses RefCountPass::run(llvm::Function& func,llvm::FunctionAnalysisManager& analysis)
+{
+    if(getMarkers(func).empty())
+        return llvm::PreservedAnalyses::all();
+
+    //Cancelling a pair across blocks can free another pair, so the blocks get scanned again until nothing changes
+    std::map<llvm::BasicBlock*,BlockScan> scans;
+    bool changed = true;
+    while(changed)
+    {
+        for(llvm::BasicBlock& block : func)
+            cancelInBlock(block,scans[&block]);
+        changed = cancelAcrossBlocks(func,scans,analysis);
+    }
+
+    for(llvm::CallInst* marker : getMarkers(func))
+    {
+        if(getMarkerKind(*marker) == INCREF_MARKER)
+            lowerIncref(marker);
+        else
+            lowerDecref(marker);
+    }
+    return llvm::PreservedAnalyses::none();
+}
+
+void RefCountPass::cancelInBlock(llvm::BasicBlock& block,BlockScan& scan)
+{
+    scan = BlockScan();
+    std::vector<llvm::CallInst*> cancelled;
+    for(llvm::Instruction& inst : block)
+    {
+        MarkerKind kind = getMarkerKind(inst);
+        if(kind == INCREF_MARKER)
+        {
+            scan.pendingIncrefs.push_back(llvm::cast<llvm::CallInst>(&inst));
+            continue;
+        }
+        else if(kind == DECREF_MARKER)
+        {
+            auto* decref = llvm::cast<llvm::CallInst>(&inst);
+            auto found = std::find_if(scan.pendingIncrefs.rbegin(),scan.pendingIncrefs.rend(),[decref](llvm::CallInst* e)
+            {
+                return getObject(e) == getObject(decref);
+            });
+
+            if(found != scan.pendingIncrefs.rend())
+            {
+                cancelled.push_back(*found);
+                cancelled.push_back(decref);
+                scan.pendingIncrefs.erase(std::next(found).base());
+                continue;
+            }
+
+            //A decrement can deallocate an object releasing other objects
+            if(!scan.hasReleasePoint)
+                scan.leadingDecref = decref;
+        }
+        else if(!isReleasePoint(inst))
+        {
+            //Reading or writing the counter of a pending object needs the exact count
+            llvm::Value* accessed = getAccessedObject(inst);
+            if(accessed == nullptr || std::none_of(scan.pendingIncrefs.begin(),scan.pendingIncrefs.end(),
+                                                   [accessed](llvm::CallInst* e) { return getObject(e) == accessed; }))
+                continue;
+        }
+
+        scan.hasReleasePoint = true;
+        scan.pendingIncrefs.clear();
+    }
+
+    for(llvm::CallInst* marker : cancelled)
+        marker->eraseFromParent();
+}
+
+bool RefCountPass::cancelAcrossBlocks(llvm::Function& func,std::map<llvm::BasicBlock*,BlockScan>& scans,
+                                      llvm::FunctionAnalysisManager& analysis)
+{
+    //Only calls get removed, so the analyses stay valid for the whole pairing
+    auto& dominators = analysis.getResult<llvm::DominatorTreeAnalysis>(func);
+    auto& postDominators = analysis.getResult<llvm::PostDominatorTreeAnalysis>(func);
+
+    for(auto& from : scans)
+    {
+        auto& pending = from.second.pendingIncrefs;
+        for(auto incref = pending.rbegin();incref != pending.rend();++incref)
+        {
+            for(auto& to : scans)
+            {
+                llvm::CallInst* decref = to.second.leadingDecref;
+                if(to.first == from.first || decref == nullptr || getObject(decref) != getObject(*incref))
+                    continue;
+
+                if(!dominators.isReachableFromEntry(to.first) || !dominators.dominates(from.first,to.first) ||
+                   !postDominators.dominates(to.first,from.first) || !isBorrowable(from.first,to.first,scans))
+                    continue;
+
+                (*incref)->eraseFromParent();
+                decref->eraseFromParent();
+                return true;
+            }
+        }
+    }
+    return false;
+}
+
+bool RefCountPass::isBorrowable(llvm::BasicBlock* from,llvm::BasicBlock* to,std::map<llvm::BasicBlock*,BlockScan>& scans)
+{
+    //Each increment must meet exactly one decrement, without a loop running one of them again
+    std::set<llvm::BasicBlock*> between = getReachable(from,to);
+    if(between.count(from) > 0 || getReachable(to,from).count(to) > 0)
+        return false;
+
+    for(llvm::BasicBlock* block : between)
+        if(scans[block].hasReleasePoint)
+            return false;
+    return true;
+}
+
+void RefCountPass::lowerIncref(llvm::CallInst* call)
+{
+    llvm::IRBuilder<> builder(call);
+    llvm::Value* counter = builder.CreatePointerCast(call->getArgOperand(0),builder.getInt64Ty()->getPointerTo());
+    llvm::Value* count = builder.CreateLoad(builder.getInt64Ty(),counter);
+    builder.CreateStore(builder.CreateAdd(count,builder.getInt64(1)),counter);
+    call->eraseFromParent();
+}
+
+void RefCountPass::lowerDecref(llvm::CallInst* call)
+{
+    llvm::IRBuilder<> builder(call);
+    llvm::Value* counter = builder.CreatePointerCast(call->getArgOperand(0),builder.getInt64Ty()->getPointerTo());
+    llvm::Value* count = builder.CreateSub(builder.CreateLoad(builder.getInt64Ty(),counter),builder.getInt64(1));
+    builder.CreateStore(count,counter);
+
+    llvm::Instruction* deallocEnd = llvm::SplitBlockAndInsertIfThen(builder.CreateICmpEQ(count,builder.getInt64(0)),
+                                                                    call,false);
+    builder.SetInsertPoint(deallocEnd);
+    auto dealloc = call->getModule()->getOrInsertFunction("_Py_Dealloc",builder.getVoidTy(),builder.getInt8PtrTy());
+    builder.CreateCall(dealloc,{call->getArgOperand(0)});
+    call->eraseFromParent();
+}
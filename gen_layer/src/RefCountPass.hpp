@@ -0,0 +1,49 @@
+#ifndef REFCOUNTPASS_HPP_INCLUDED
+#define REFCOUNTPASS_HPP_INCLUDED
+
+#include <map>
+#include <vector>
+#include "llvm/IR/PassManager.h"
+#include "llvm/IR/Function.h"
+#include "llvm/IR/Instructions.h"
+
+/*
+Optimization of the reference counting of the generated code.
+The generated code increments and decrements the reference counters through calls to marker functions. An increment
+followed by a decrement of the same object cancels out when nothing in between can release an object or read a
+reference counter, the count being only temporarily higher. Inside a block, it pairs the decrement with the last
+increment of the object. Across blocks, an increment cancels with a decrement when the increment dominates it, the
+decrement post dominates the increment and no block in between can release an object, so the object is only borrowed
+from its owner during that lifetime.
+The remaining markers are then expanded inline, a decrement deallocating the object once its counter reaches zero.
+The pass must always run since the markers aren't defined anywhere.
+*/
+
+#define FLYABLE_INCREF_MARKER "flyable.incref"
+#define FLYABLE_DECREF_MARKER "flyable.decref"
+
+class RefCountPass : public llvm::PassInfoMixin<RefCountPass>
+{
+public:
+    llvm::PreservedAnalyses run(llvm::Function& func,llvm::FunctionAnalysisManager& analysis);
+
+    //Also run on the functions without optimizations
+    static bool isRequired() { return true; }
+
+private:
+    struct BlockScan
+    {
+        std::vector<llvm::CallInst*> pendingIncrefs; //Increments with no release point after them
+        llvm::CallInst* leadingDecref = nullptr; //Decrement with no release point before it
+        bool hasReleasePoint = false;
+    };
+
+    void cancelInBlock(llvm::BasicBlock& block,BlockScan& scan);
+    bool cancelAcrossBlocks(llvm::Function& func,std::map<llvm::BasicBlock*,BlockScan>& scans,
+                            llvm::FunctionAnalysisManager& analysis);
+    bool isBorrowable(llvm::BasicBlock* from,llvm::BasicBlock* to,std::map<llvm::BasicBlock*,BlockScan>& scans);
+    void lowerIncref(llvm::CallInst* call);
+    void lowerDecref(llvm::CallInst* call);
+};
+
+#endif // REFCOUNTPASS_HPP_INCLUDED
@@ -41,10 +41,17 @@ def get_module_paths(directory_name: str) -> str:
     return paths
 
 
-def main(source: str, output_dir: str = ".", exec_name: str = "a"):
+def main(source: str, output_dir: str = ".", exec_name: str = "a", incremental: bool = False, jobs: int = None):
     add_step("Compiling")
     compiler = com.Compiler()
 
+    if incremental:
+        # Unchanged modules are reused from the cache and only get linked
+        compiler.set_cache_dir(os.path.join(output_dir, ".flyable_cache"))
+        # Modules are compiled one at a time unless more jobs are asked
+        if jobs is not None:
+            compiler.set_jobs(jobs)
+
     if os.path.isfile(source):
         compiler.add_file(source)
     else:
@@ -66,7 +73,8 @@ def main(source: str, output_dir: str = ".", exec_name: str = "a"):
         # Now link the code
         # On windows, since no compiler is provided we link with the linker provided with flyable
         link_path = constants.LINKER_EXEC if platform.system() == "Windows" else "gcc"
-        linker_args = [link_path, "-flto", "output.o", constants.PYTHON_3_11_PATH, constants.RUNTIME_PATH]
+        objects = [os.path.abspath(obj) for obj in compiler.get_output_objects()]
+        linker_args = [link_path, "-flto", *objects, constants.PYTHON_3_11_PATH, constants.RUNTIME_PATH]
 
         if platform.system() == "Windows":
             linker_args.append(constants.PYTHON_3_11_DLL_PATH)
@@ -1,10 +1,26 @@
 #include "flyable.h"
 #include "internal/pycore_frame.h"
+#include <marshal.h>
 
 extern PyObject* _PyEval_EvalFrameDefault(PyThreadState* ts, _PyInterpreterFrame* f, int throwflag);
 
-FlyableImpl* FlyableImpls = NULL;
-int FlyableImplsCount = 0;
+//Open addressing table of the implementations, indexed by the hash of their name. The capacity is a power of two
+static FlyableImpl** FlyableImpls = NULL;
+static size_t FlyableImplsCapacity = 0;
+static size_t FlyableImplsCount = 0;
+
+//The functions of a module get patched once it's executed, and the frame evaluator is removed until another module
+//gets executed
+static int FlyableEagerPatching = 0;
+
+//Count of module frames being executed. Their functions can be called before the module is patched
+static int FlyableModulesRunning = 0;
+
+//Index of the code objects extra data remembering the implementation matched by the code, -1 until requested
+static Py_ssize_t FlyableCodeExtraIndex = -1;
+
+//Marks in the extra data of a code object that no implementation matches the code
+static char FlyableNoImpl;
 
 static PyInterpreterState* inter()
 {
@@ -16,6 +32,57 @@ void flyable_init()
     _PyInterpreterState_SetEvalFrameFunc(inter(), flyable_evalFrame);
 }
 
+//Executing the code of a module, as the imports do, installs the frame evaluator back to patch the module
+static int flyable_audit_hook(const char* event, PyObject* args, void* userData)
+{
+    if (strcmp(event, "exec") != 0 || !PyTuple_Check(args) || PyTuple_GET_SIZE(args) != 1)
+        return 0;
+
+    PyObject* code = PyTuple_GET_ITEM(args, 0);
+    if (PyCode_Check(code) && (((PyCodeObject*) code)->co_flags & CO_OPTIMIZED) == 0)
+        _PyInterpreterState_SetEvalFrameFunc(inter(), flyable_evalFrame);
+    return 0;
+}
+
+void flyable_init_eager()
+{
+    FlyableEagerPatching = 1;
+    //CPython 3.11 has no watcher on the functions creation, the modules executed later are caught by their exec event
+    PySys_AddAuditHook(flyable_audit_hook, NULL);
+    flyable_init();
+}
+
+PyObject* flyable_init_constants(const char* data, Py_ssize_t size)
+{
+    PyObject* result = PyMarshal_ReadObjectFromString(data, size);
+    if (result == NULL || !PyTuple_CheckExact(result))
+    {
+        PyErr_Print();
+        Py_FatalError("Flyable: the constants of the compiled code can't be loaded");
+    }
+
+    //The tuple and its content are never deallocated, the constants stay valid for the whole program
+    Py_SET_REFCNT(result, Py_REFCNT(result) + FLYABLE_IMMORTAL_REFCNT);
+    for (Py_ssize_t i = 0; i < PyTuple_GET_SIZE(result); ++i)
+    {
+        PyObject* constant = PyTuple_GET_ITEM(result, i);
+        if (PyUnicode_CheckExact(constant))
+        {
+            //Names get compared by identity in the dictionaries lookups
+            PyUnicode_InternInPlace(&constant);
+            PyTuple_SET_ITEM(result, i, constant);
+        }
+        Py_SET_REFCNT(constant, Py_REFCNT(constant) + FLYABLE_IMMORTAL_REFCNT);
+    }
+    return result;
+}
+
+//A module frame runs the body of a module, with the globals as locals
+static int flyable_is_module_frame(_PyInterpreterFrame* frame)
+{
+    return (frame->f_code->co_flags & CO_OPTIMIZED) == 0 && frame->f_locals == frame->f_globals;
+}
+
 PyObject* flyable_evalFrame(PyThreadState* ts, PyFrameObject* f, int throwflag)
 {
     //The call to flyable eval frame is done because the pointers to the call are not switch yet
@@ -28,80 +95,184 @@ PyObject* flyable_evalFrame(PyThreadState* ts, PyFrameObject* f, int throwflag)
         }
     }
 
-    //When the pointer is switch, we do the call normally
-    return _PyEval_EvalFrameDefault(ts,f, throwflag);
+    if (!FlyableEagerPatching || ff == NULL || !flyable_is_module_frame(ff))
+    {
+        //When the pointer is switch, we do the call normally
+        return _PyEval_EvalFrameDefault(ts,f, throwflag);
+    }
+
+    //The frame is released by the evaluation, the globals are kept alive to patch the module afterward
+    PyObject* globals = Py_NewRef(ff->f_globals);
+    ++FlyableModulesRunning;
+    PyObject* result = _PyEval_EvalFrameDefault(ts, f, throwflag);
+    --FlyableModulesRunning;
+    if (result != NULL)
+        flyable_patch_module(globals);
+    Py_DECREF(globals);
+
+    //The functions of the executed modules are all patched, the frames don't have anything left to patch
+    if (FlyableModulesRunning == 0)
+        _PyInterpreterState_SetEvalFrameFunc(inter(), NULL);
+    return result;
 }
 
 
-void flyable_add_impl(char* name, void* tp, void* vec)
+static size_t flyable_hash_name(const char* name, Py_ssize_t size)
+{
+    //FNV-1a
+    size_t hash = 14695981039346656037ULL;
+    for (Py_ssize_t i = 0; i < size; ++i)
+    {
+        hash ^= (unsigned char) name[i];
+        hash *= 1099511628211ULL;
+    }
+    return hash;
+}
+
+static void flyable_insert_impl(FlyableImpl** table, size_t capacity, FlyableImpl* impl)
+{
+    size_t i = impl->hash & (capacity - 1);
+    while (table[i] != NULL)
+        i = (i + 1) & (capacity - 1);
+    table[i] = impl;
+}
+
+static FlyableImpl* flyable_find_impl_by_name(const char* name, Py_ssize_t size)
 {
     if (FlyableImplsCount == 0)
+        return NULL;
+
+    size_t hash = flyable_hash_name(name, size);
+    for (size_t i = hash & (FlyableImplsCapacity - 1); FlyableImpls[i] != NULL; i = (i + 1) & (FlyableImplsCapacity - 1))
     {
-        FlyableImpls = (FlyableImpl*) malloc(sizeof(FlyableImpl));
-        FlyableImplsCount = 1;
+        FlyableImpl* current = FlyableImpls[i];
+        if (current->hash == hash && strcmp(current->name, name) == 0)
+            return current;
     }
-    else
+    return NULL;
+}
+
+void flyable_add_impl(char* name, void* tp, void* vec)
+{
+    //The first implementation registered under a name keeps it
+    if (flyable_find_impl_by_name(name, strlen(name)) != NULL)
+        return;
+
+    //Keep the load factor under 1/2 so the probing stays short
+    if ((FlyableImplsCount + 1) * 2 > FlyableImplsCapacity)
     {
-        ++FlyableImplsCount;
-        FlyableImpls = (FlyableImpl*) realloc(FlyableImpls, sizeof(FlyableImpl) * FlyableImplsCount);
+        size_t newCapacity = FlyableImplsCapacity == 0 ? 64 : FlyableImplsCapacity * 2;
+        FlyableImpl** newTable = (FlyableImpl**) calloc(newCapacity, sizeof(FlyableImpl*));
+        for (size_t i = 0; i < FlyableImplsCapacity; ++i)
+            if (FlyableImpls[i] != NULL)
+                flyable_insert_impl(newTable, newCapacity, FlyableImpls[i]);
+        free(FlyableImpls);
+        FlyableImpls = newTable;
+        FlyableImplsCapacity = newCapacity;
     }
 
-    FlyableImpl* newImpl = &FlyableImpls[FlyableImplsCount - 1];
+    FlyableImpl* newImpl = (FlyableImpl*) malloc(sizeof(FlyableImpl));
     newImpl->name = name;
+    newImpl->hash = flyable_hash_name(name, strlen(name));
     newImpl->tp_call = tp;
     newImpl->vec_call = vec;
+
+    //The type of the patched functions, a function type calling the flyable implementation
+    PyTypeObject* implType = &newImpl->type;
+    memcpy((void*)implType, (void*)&PyFunction_Type, sizeof(PyFunction_Type));
+    implType->tp_name = "Flyable function";
+    implType->tp_vectorcall = vec;
+    implType->tp_call = tp;
+    implType->tp_flags = implType->tp_flags | _Py_TPFLAGS_HAVE_VECTORCALL;
+    implType->tp_vectorcall_offset = offsetof(PyFunctionObject, vectorcall);
+
+    flyable_insert_impl(FlyableImpls, FlyableImplsCapacity, newImpl);
+    ++FlyableImplsCount;
 }
 
-//Get an object and try to match it to replace the given pointers
-int flyable_set_implementation(PyObject* object)
+//Returns the implementation matching the function, looking first at the result remembered by its code object
+static FlyableImpl* flyable_find_impl(PyFunctionObject* funcObj)
 {
-    for (int i = 0; i < FlyableImplsCount; ++i)
+    if (FlyableCodeExtraIndex == -1)
     {
-        FlyableImpl* currentImpl = &FlyableImpls[i];
-        PyTypeObject* implType = &FlyableImpls[i].type;
-
-        if (PyMethod_Check(object))
+        FlyableCodeExtraIndex = _PyEval_RequestCodeExtraIndex(NULL);
+        if (FlyableCodeExtraIndex == -1)
         {
-            PyMethodObject* method = (PyMethodObject*)object;
-            object = method->im_func;
+            PyErr_Clear();
+            return NULL;
         }
+    }
 
-        if (PyFunction_Check(object))
-        {
-            PyFunctionObject* funcObj = (PyFunctionObject*)object;
-            PyTypeObject* callType = object->ob_type;
+    void* extra = NULL;
+    if (_PyCode_GetExtra(funcObj->func_code, FlyableCodeExtraIndex, &extra) == 0 && extra != NULL)
+        return extra == &FlyableNoImpl ? NULL : (FlyableImpl*) extra;
 
+    FlyableImpl* result = NULL;
+    Py_ssize_t size;
+    const char* name = PyUnicode_AsUTF8AndSize(funcObj->func_qualname, &size);
+    if (name != NULL)
+        result = flyable_find_impl_by_name(name, size);
+    else
+        PyErr_Clear();
 
-            if (PyUnicode_CompareWithASCIIString(funcObj->func_qualname, currentImpl->name) == 0)
-            {
-                memcpy((void*)implType, (void*)&PyFunction_Type, sizeof(PyFunction_Type));
-                implType->tp_name = "Flyable function";
+    if (_PyCode_SetExtra(funcObj->func_code, FlyableCodeExtraIndex, result != NULL ? (void*) result : &FlyableNoImpl) != 0)
+        PyErr_Clear();
+    return result;
+}
 
-                //Change the function type so it refers to a flyable type
-                Py_SET_TYPE(funcObj, implType);
-                Py_INCREF(implType);
+//Get an object and try to match it to replace the given pointers
+int flyable_set_implementation(PyObject* object)
+{
+    if (PyMethod_Check(object))
+    {
+        PyMethodObject* method = (PyMethodObject*)object;
+        object = method->im_func;
+    }
 
-                //Change the type funcs so it refers to flyable calls
-                implType->tp_vectorcall = currentImpl->vec_call;
-                implType->tp_call = currentImpl->tp_call;
+    if (!PyFunction_Check(object))
+        return 0;
 
-                //Make sure the types indicates that it supportes vec call
-                implType->tp_flags = implType->tp_flags & _Py_TPFLAGS_HAVE_VECTORCALL;
+    PyFunctionObject* funcObj = (PyFunctionObject*)object;
+    FlyableImpl* currentImpl = flyable_find_impl(funcObj);
+    if (currentImpl == NULL || Py_TYPE(funcObj) == &currentImpl->type)
+        return 0;
 
-                //Set the type vector offset
-                currentImpl->type.tp_vectorcall_offset = (char*) &funcObj->vectorcall -  (char*) funcObj;
+    //Change the function type so it refers to a flyable type
+    Py_SET_TYPE(funcObj, &currentImpl->type);
+    Py_INCREF(&currentImpl->type);
 
-                //Set the vector call using the offset
-                char** offset = (char**)funcObj;
-                offset += callType->tp_vectorcall_offset;
-                *offset = (char*) currentImpl->vec_call;
-                funcObj->vectorcall = currentImpl->vec_call;
-                return 1;
-            }
-        }
+    funcObj->vectorcall = currentImpl->vec_call;
+    return 1;
+}
+
+static void flyable_patch_dict(PyObject* dict)
+{
+    Py_ssize_t pos = 0;
+    PyObject* key;
+    PyObject* value;
+    while (PyDict_Next(dict, &pos, &key, &value))
+    {
+        if (PyFunction_Check(value))
+            flyable_set_implementation(value);
     }
+}
 
-    return 0;
+//Patch all the functions of an executed module, including the methods of its classes
+void flyable_patch_module(PyObject* globals)
+{
+    if (!PyDict_Check(globals))
+        return;
+
+    flyable_patch_dict(globals);
+
+    Py_ssize_t pos = 0;
+    PyObject* key;
+    PyObject* value;
+    while (PyDict_Next(globals, &pos, &key, &value))
+    {
+        if (PyType_Check(value) && ((PyTypeObject*) value)->tp_dict != NULL)
+            flyable_patch_dict(((PyTypeObject*) value)->tp_dict);
+    }
 }
 
 void flyable_debug_print_int64(long long value)
@@ -7,12 +7,22 @@
 
 void flyable_init();
 
+void flyable_init_eager();
+
+//Count added to the reference counter of an immortal object. Unpaired decrements can never bring it down to zero
+#define FLYABLE_IMMORTAL_REFCNT ((Py_ssize_t) 1 << 60)
+
+//Create all the constants of the compiled code from a marshalled tuple and make them immortal. Returns the tuple
+PyObject* flyable_init_constants(const char* data, Py_ssize_t size);
+
 PyObject* flyable_evalFrame(PyThreadState* ts, PyFrameObject* f, int throwflag);
 
 //Represents the implementation of a flyable object
+//Each implementation is allocated on its own since the patched functions keep a pointer to its type
 typedef struct FlyableImpl{
     PyTypeObject type;
     char* name;
+    size_t hash;
     void* tp_call;
     void* vec_call;
 }FlyableImpl;
@@ -22,6 +32,8 @@ void flyable_add_impl(char* name, void* tp, void* vec);
 
 int flyable_set_implementation(PyObject* object);
 
+void flyable_patch_module(PyObject* globals);
+
 void flyable_debug_print_int64(long long value);
 
 void flyable_debug_print_cstr(char* debug);
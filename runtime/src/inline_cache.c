@@ -0,0 +1,183 @@
+#include "inline_cache.h"
+#include <structmember.h>
+#include "internal/pycore_dict.h"
+#include "internal/pycore_object.h"
+
+static PyDictKeysObject* shared_keys(PyTypeObject* type)
+{
+    return ((PyHeapTypeObject*) type)->ht_cached_keys;
+}
+
+//Index of the name in the shared keys of a type, or -1 if the instances never stored it
+static Py_ssize_t find_shared_key(PyDictKeysObject* keys, PyObject* name)
+{
+    if (!DK_IS_UNICODE(keys))
+        return -1;
+
+    PyDictUnicodeEntry* entries = DK_UNICODE_ENTRIES(keys);
+    for (Py_ssize_t i = 0; i < keys->dk_nentries; ++i)
+    {
+        PyObject* key = entries[i].me_key;
+        if (key == name || (key != NULL && PyUnicode_Compare(key, name) == 0))
+            return i;
+    }
+    return -1;
+}
+
+static int is_method_descriptor(PyObject* value)
+{
+    return value != NULL && PyType_HasFeature(Py_TYPE(value), Py_TPFLAGS_METHOD_DESCRIPTOR);
+}
+
+//Resolve the attribute for the type of the object and store the result into the cache
+static FlyableAttrCacheEntry* fill_entry(FlyableAttrCache* cache, PyObject* obj, PyObject* name)
+{
+    PyTypeObject* type = Py_TYPE(obj);
+    if (type->tp_getattro != PyObject_GenericGetAttr || !PyUnicode_CheckExact(name))
+        return NULL;
+
+    //The lookup assigns a version to the type when it doesn't have one
+    PyObject* descr = _PyType_Lookup(type, name);
+    if (!PyType_HasFeature(type, Py_TPFLAGS_VALID_VERSION_TAG))
+        return NULL;
+
+    FlyableAttrCacheEntry entry = {type, type->tp_version_tag, FLYABLE_ATTR_CACHE_EMPTY, 0, descr, 0};
+    if (descr != NULL && Py_IS_TYPE(descr, &PyMemberDescr_Type) &&
+        ((PyMemberDescrObject*) descr)->d_member->type == T_OBJECT_EX &&
+        !(((PyMemberDescrObject*) descr)->d_member->flags & READ_RESTRICTED))
+    {
+        entry.kind = FLYABLE_ATTR_CACHE_SLOT;
+        entry.index = ((PyMemberDescrObject*) descr)->d_member->offset;
+    }
+    else if (descr != NULL && Py_TYPE(descr)->tp_descr_set != NULL)
+    {
+        entry.kind = FLYABLE_ATTR_CACHE_DATA_DESCRIPTOR;
+    }
+    else if (type->tp_dictoffset == 0)
+    {
+        if (descr == NULL)
+            return NULL;
+        entry.kind = is_method_descriptor(descr) ? FLYABLE_ATTR_CACHE_METHOD_NO_DICT : FLYABLE_ATTR_CACHE_TYPE_VALUE_NO_DICT;
+    }
+    else if (PyType_HasFeature(type, Py_TPFLAGS_MANAGED_DICT) && shared_keys(type) != NULL &&
+             *_PyObject_ValuesPointer(obj) != NULL)
+    {
+        PyDictKeysObject* keys = shared_keys(type);
+        Py_ssize_t index = find_shared_key(keys, name);
+        if (index >= 0)
+        {
+            entry.kind = FLYABLE_ATTR_CACHE_INSTANCE_VALUE;
+            entry.index = index;
+        }
+        else if (descr != NULL)
+        {
+            //Shared keys only grow, the name can't be in the instances while the count is unchanged
+            entry.kind = is_method_descriptor(descr) ? FLYABLE_ATTR_CACHE_METHOD : FLYABLE_ATTR_CACHE_TYPE_VALUE;
+            entry.keys_entries = keys->dk_nentries;
+        }
+        else
+        {
+            return NULL;
+        }
+    }
+    else
+    {
+        return NULL;
+    }
+
+    FlyableAttrCacheEntry* result = &cache->entries[cache->next];
+    cache->next = (cache->next + 1) % FLYABLE_ATTR_CACHE_SIZE;
+    *result = entry;
+    return result;
+}
+
+static FlyableAttrCacheEntry* find_entry(FlyableAttrCache* cache, PyObject* obj, PyObject* name)
+{
+    PyTypeObject* type = Py_TYPE(obj);
+    for (int i = 0; i < FLYABLE_ATTR_CACHE_SIZE; ++i)
+    {
+        FlyableAttrCacheEntry* entry = &cache->entries[i];
+        if (entry->kind != FLYABLE_ATTR_CACHE_EMPTY && entry->type == type && entry->version == type->tp_version_tag)
+            return entry;
+    }
+    return fill_entry(cache, obj, name);
+}
+
+//The type values are only valid when the instance can't shadow them
+static int is_type_value_visible(FlyableAttrCacheEntry* entry, PyObject* obj)
+{
+    switch (entry->kind)
+    {
+        case FLYABLE_ATTR_CACHE_TYPE_VALUE_NO_DICT:
+        case FLYABLE_ATTR_CACHE_METHOD_NO_DICT:
+            return 1;
+
+        case FLYABLE_ATTR_CACHE_TYPE_VALUE:
+        case FLYABLE_ATTR_CACHE_METHOD:
+            return *_PyObject_ValuesPointer(obj) != NULL && shared_keys(entry->type)->dk_nentries == entry->keys_entries;
+    }
+    return 0;
+}
+
+//Load the attribute through the entry. Returns 0 if the entry can't resolve it for this object
+static int load_entry(FlyableAttrCacheEntry* entry, PyObject* obj, PyObject** result)
+{
+    PyObject* value;
+    switch (entry->kind)
+    {
+        case FLYABLE_ATTR_CACHE_SLOT:
+            value = *(PyObject**) ((char*) obj + entry->index);
+            if (value == NULL)
+                return 0;
+            *result = Py_NewRef(value);
+            return 1;
+
+        case FLYABLE_ATTR_CACHE_INSTANCE_VALUE:
+        {
+            PyDictValues* values = *_PyObject_ValuesPointer(obj);
+            if (values == NULL || values->values[entry->index] == NULL)
+                return 0;
+            *result = Py_NewRef(values->values[entry->index]);
+            return 1;
+        }
+
+        case FLYABLE_ATTR_CACHE_DATA_DESCRIPTOR:
+            *result = Py_TYPE(entry->value)->tp_descr_get(entry->value, obj, (PyObject*) entry->type);
+            return 1;
+    }
+
+    if (!is_type_value_visible(entry, obj))
+        return 0;
+
+    descrgetfunc get = Py_TYPE(entry->value)->tp_descr_get;
+    *result = get != NULL ? get(entry->value, obj, (PyObject*) entry->type) : Py_NewRef(entry->value);
+    return 1;
+}
+
+PyObject* flyable_attr_cache_load(FlyableAttrCache* cache, PyObject* obj, PyObject* name)
+{
+    FlyableAttrCacheEntry* entry = find_entry(cache, obj, name);
+    PyObject* result;
+    if (entry != NULL && load_entry(entry, obj, &result))
+        return result;
+    return PyObject_GetAttr(obj, name);
+}
+
+int flyable_attr_cache_load_method(FlyableAttrCache* cache, PyObject* obj, PyObject* name, PyObject** method)
+{
+    FlyableAttrCacheEntry* entry = find_entry(cache, obj, name);
+    if (entry != NULL)
+    {
+        //Methods are returned unbound so the call doesn't allocate a bound method
+        if ((entry->kind == FLYABLE_ATTR_CACHE_METHOD || entry->kind == FLYABLE_ATTR_CACHE_METHOD_NO_DICT) &&
+            is_type_value_visible(entry, obj))
+        {
+            *method = Py_NewRef(entry->value);
+            return 1;
+        }
+
+        if (load_entry(entry, obj, method))
+            return 0;
+    }
+    return _PyObject_GetMethod(obj, name, method);
+}
@@ -0,0 +1,39 @@
+#ifndef INLINE_CACHE_H_INCLUDED
+#define INLINE_CACHE_H_INCLUDED
+#include <Python.h>
+
+#define FLYABLE_ATTR_CACHE_SIZE 4
+
+//How an entry resolves the attribute. Must match AttrCacheKind in flyable/code_gen/inline_cache.py
+typedef enum FlyableAttrCacheKind {
+    FLYABLE_ATTR_CACHE_EMPTY = 0,
+    FLYABLE_ATTR_CACHE_SLOT = 1, //Object stored at an offset of the instance (__slots__, members)
+    FLYABLE_ATTR_CACHE_INSTANCE_VALUE = 2, //Value stored in the inline values of the instance
+    FLYABLE_ATTR_CACHE_DATA_DESCRIPTOR = 3, //Data descriptor of the type, it takes precedence over the instance
+    FLYABLE_ATTR_CACHE_TYPE_VALUE = 4, //Attribute of the type, the instance values must not shadow it
+    FLYABLE_ATTR_CACHE_TYPE_VALUE_NO_DICT = 5, //Attribute of the type, the instances don't have a dict
+    FLYABLE_ATTR_CACHE_METHOD = 6, //Same as TYPE_VALUE with a method descriptor
+    FLYABLE_ATTR_CACHE_METHOD_NO_DICT = 7 //Same as TYPE_VALUE_NO_DICT with a method descriptor
+} FlyableAttrCacheKind;
+
+//A type resolved by an inline cache. The entry is valid as long as the version of the type doesn't change
+typedef struct FlyableAttrCacheEntry {
+    PyTypeObject* type;
+    unsigned int version;
+    int kind;
+    Py_ssize_t index; //Offset of a slot, or index in the instance values
+    PyObject* value; //Borrowed attribute of the type, kept alive by the type while its version is the same
+    Py_ssize_t keys_entries; //Count of shared keys of the type when a value of the type was cached
+} FlyableAttrCacheEntry;
+
+//Inline cache of an attribute access site, generated by the compiler as a global zero initialized
+typedef struct FlyableAttrCache {
+    FlyableAttrCacheEntry entries[FLYABLE_ATTR_CACHE_SIZE];
+    int next; //Entry replaced on the next miss
+} FlyableAttrCache;
+
+PyObject* flyable_attr_cache_load(FlyableAttrCache* cache, PyObject* obj, PyObject* name);
+
+int flyable_attr_cache_load_method(FlyableAttrCache* cache, PyObject* obj, PyObject* name, PyObject** method);
+
+#endif // INLINE_CACHE_H_INCLUDED
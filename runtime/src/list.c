@@ -0,0 +1,50 @@
+#include "list.h"
+
+int flyable_list_resize(PyListObject* list, Py_ssize_t newSize)
+{
+    Py_ssize_t allocated = list->allocated;
+
+    //Enough memory is already allocated and the list doesn't shrink to less than half of it
+    if (allocated >= newSize && newSize >= (allocated >> 1))
+    {
+        Py_SET_SIZE(list, newSize);
+        return 0;
+    }
+
+    //Same growth pattern as CPython: 0, 4, 8, 16, 24, 32, 40, 52, 64, 76, ...
+    size_t newAllocated = ((size_t) newSize + ((size_t) newSize >> 3) + 6) & ~(size_t) 3;
+    //Without enough room for the new size, grow to exactly the new size
+    if (newSize - Py_SIZE(list) > (Py_ssize_t) (newAllocated - newSize))
+        newAllocated = ((size_t) newSize + 3) & ~(size_t) 3;
+
+    if (newSize == 0)
+        newAllocated = 0;
+
+    PyObject** items = NULL;
+    if (newAllocated <= (size_t) PY_SSIZE_T_MAX / sizeof(PyObject*))
+        items = (PyObject**) PyMem_Realloc(list->ob_item, newAllocated * sizeof(PyObject*));
+
+    if (items == NULL && newAllocated > 0)
+    {
+        PyErr_NoMemory();
+        return -1;
+    }
+
+    list->ob_item = items;
+    Py_SET_SIZE(list, newSize);
+    list->allocated = (Py_ssize_t) newAllocated;
+    return 0;
+}
+
+void flyable_list_reserve(PyListObject* list, Py_ssize_t capacity)
+{
+    if (capacity <= list->allocated || (size_t) capacity > (size_t) PY_SSIZE_T_MAX / sizeof(PyObject*))
+        return;
+
+    PyObject** items = (PyObject**) PyMem_Realloc(list->ob_item, (size_t) capacity * sizeof(PyObject*));
+    if (items == NULL)
+        return;
+
+    list->ob_item = items;
+    list->allocated = capacity;
+}
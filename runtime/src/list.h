@@ -0,0 +1,18 @@
+#ifndef LIST_H_INCLUDED
+#define LIST_H_INCLUDED
+#include <Python.h>
+
+/*
+List routines used by the inlined list code. The generated code reads and writes the size, the capacity and the items
+of the list directly, and only calls the runtime when the list needs more memory.
+*/
+
+//Resize the list to the new size, over allocating like CPython so appending stays amortized O(1).
+//Returns 0 on success, -1 with a MemoryError set on failure. The items past the old size aren't initialized
+int flyable_list_resize(PyListObject* list, Py_ssize_t newSize);
+
+//Grow the memory of the list so it holds at least the capacity without resizing, the size doesn't change.
+//The reservation is only an optimization: it leaves the list as is if the memory can't be allocated
+void flyable_list_reserve(PyListObject* list, Py_ssize_t capacity);
+
+#endif // LIST_H_INCLUDED
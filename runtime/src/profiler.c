@@ -0,0 +1,266 @@
+#include "profiler.h"
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+
+#ifdef _WIN32
+    #include <intrin.h>
+#else
+    #include <fcntl.h>
+    #include <sys/mman.h>
+    #include <time.h>
+    #include <unistd.h>
+    #if defined(__x86_64__)
+        #include <x86intrin.h>
+    #endif
+#endif
+
+#define FLYABLE_PROFILE_DEFAULT_PATH "flyable_profile.bin"
+#define FLYABLE_PROFILE_MAX_DEPTH 1024
+#define FLYABLE_PROFILE_NOT_RECORDED UINT32_MAX
+
+typedef struct FlyableProfileFrame {
+    uint32_t node; //Node of the call, FLYABLE_PROFILE_NOT_RECORDED when the table is full
+    uint32_t context; //Last recorded node of the stack, the parent of the calls made by the function
+    uint64_t start;
+} FlyableProfileFrame;
+
+static FlyableProfileHeader* FlyableProfile = NULL;
+static FlyableProfileFunc* FlyableProfileFuncs = NULL;
+static FlyableProfileNode* FlyableProfileNodes = NULL;
+static FlyableProfileSite* FlyableProfileSites = NULL;
+static int FlyableProfileDisabled = 0;
+
+//Each thread has its own calls, the table itself is only updated while holding the GIL
+static _Thread_local FlyableProfileFrame FlyableProfileStack[FLYABLE_PROFILE_MAX_DEPTH];
+static _Thread_local int FlyableProfileDepth = 0;
+
+static uint64_t flyable_profiler_read_cycles()
+{
+#if defined(_M_X64) || defined(__x86_64__)
+    return __rdtsc();
+#elif defined(__aarch64__)
+    uint64_t value;
+    __asm__ volatile("mrs %0, cntvct_el0" : "=r"(value));
+    return value;
+#else
+    struct timespec time;
+    clock_gettime(CLOCK_MONOTONIC, &time);
+    return (uint64_t) time.tv_sec * 1000000000ULL + (uint64_t) time.tv_nsec;
+#endif
+}
+
+static size_t flyable_profiler_size()
+{
+    return sizeof(FlyableProfileHeader) + sizeof(FlyableProfileFunc) * FLYABLE_PROFILE_MAX_FUNCS +
+           sizeof(FlyableProfileNode) * FLYABLE_PROFILE_MAX_NODES + sizeof(FlyableProfileSite) * FLYABLE_PROFILE_MAX_SITES;
+}
+
+static const char* flyable_profiler_path()
+{
+    const char* path = getenv("FLYABLE_PROFILE");
+    return path != NULL && path[0] != '\0' ? path : FLYABLE_PROFILE_DEFAULT_PATH;
+}
+
+#ifdef _WIN32
+//Without a shared mapping, the table is written once the program exits
+static void flyable_profiler_save()
+{
+    FILE* file = fopen(flyable_profiler_path(), "wb");
+    if (file == NULL)
+        return;
+    fwrite(FlyableProfile, 1, flyable_profiler_size(), file);
+    fclose(file);
+}
+#endif
+
+static void* flyable_profiler_map()
+{
+    size_t size = flyable_profiler_size();
+#ifdef _WIN32
+    void* result = calloc(1, size);
+    if (result != NULL)
+        atexit(flyable_profiler_save);
+    return result;
+#else
+    int file = open(flyable_profiler_path(), O_RDWR | O_CREAT | O_TRUNC, 0644);
+    if (file < 0)
+        return NULL;
+
+    void* result = NULL;
+    if (ftruncate(file, (off_t) size) == 0)
+    {
+        result = mmap(NULL, size, PROT_READ | PROT_WRITE, MAP_SHARED, file, 0);
+        if (result == MAP_FAILED)
+            result = NULL;
+    }
+    close(file); //The mapping stays valid once the file is closed
+    return result;
+#endif
+}
+
+static int flyable_profiler_init()
+{
+    if (FlyableProfile != NULL)
+        return 1;
+    if (FlyableProfileDisabled)
+        return 0;
+
+    char* table = (char*) flyable_profiler_map();
+    if (table == NULL)
+    {
+        fprintf(stderr, "Flyable profiler: can't map %s, the profiling is disabled\n", flyable_profiler_path());
+        FlyableProfileDisabled = 1;
+        return 0;
+    }
+
+    FlyableProfileFuncs = (FlyableProfileFunc*) (table + sizeof(FlyableProfileHeader));
+    FlyableProfileNodes = (FlyableProfileNode*) (FlyableProfileFuncs + FLYABLE_PROFILE_MAX_FUNCS);
+    FlyableProfileSites = (FlyableProfileSite*) (FlyableProfileNodes + FLYABLE_PROFILE_MAX_NODES);
+
+    //The function 0 and the node 0 are the root, outside any instrumented function
+    strcpy(FlyableProfileFuncs[0].name, "<root>");
+    FlyableProfile = (FlyableProfileHeader*) table;
+    FlyableProfile->maxFuncs = FLYABLE_PROFILE_MAX_FUNCS;
+    FlyableProfile->maxNodes = FLYABLE_PROFILE_MAX_NODES;
+    FlyableProfile->maxSites = FLYABLE_PROFILE_MAX_SITES;
+    FlyableProfile->funcsCount = 1;
+    FlyableProfile->nodesCount = 1;
+    FlyableProfile->version = FLYABLE_PROFILE_VERSION;
+    FlyableProfile->magic = FLYABLE_PROFILE_MAGIC; //Written last, a reader only trusts a table with the magic
+    return 1;
+}
+
+static int32_t flyable_profiler_register(const char* name)
+{
+    if (FlyableProfile->funcsCount >= FLYABLE_PROFILE_MAX_FUNCS)
+        return -1;
+
+    int32_t id = (int32_t) FlyableProfile->funcsCount;
+    strncpy(FlyableProfileFuncs[id].name, name, FLYABLE_PROFILE_NAME_SIZE - 1);
+    ++FlyableProfile->funcsCount;
+    return id;
+}
+
+static uint32_t flyable_profiler_get_node(uint32_t parent, uint32_t func)
+{
+    FlyableProfileNode* parentNode = &FlyableProfileNodes[parent];
+    uint32_t* link = &parentNode->firstChild;
+    while (*link != 0)
+    {
+        if (FlyableProfileNodes[*link].func == func)
+            return *link;
+        link = &FlyableProfileNodes[*link].nextSibling;
+    }
+
+    if (FlyableProfile->nodesCount >= FLYABLE_PROFILE_MAX_NODES)
+        return FLYABLE_PROFILE_NOT_RECORDED;
+
+    uint32_t result = FlyableProfile->nodesCount++;
+    FlyableProfileNodes[result].parent = parent;
+    FlyableProfileNodes[result].func = func;
+    *link = result;
+    return result;
+}
+
+void flyable_profiler_enter(int32_t* id, const char* name)
+{
+    int depth = FlyableProfileDepth++;
+    if (depth >= FLYABLE_PROFILE_MAX_DEPTH || !flyable_profiler_init())
+        return;
+
+    if (*id == 0)
+        *id = flyable_profiler_register(name);
+
+    FlyableProfileFrame* frame = &FlyableProfileStack[depth];
+    uint32_t parent = depth > 0 ? FlyableProfileStack[depth - 1].context : 0;
+    frame->node = *id > 0 ? flyable_profiler_get_node(parent, (uint32_t) *id) : FLYABLE_PROFILE_NOT_RECORDED;
+    frame->context = frame->node != FLYABLE_PROFILE_NOT_RECORDED ? frame->node : parent;
+    frame->start = flyable_profiler_read_cycles();
+}
+
+void flyable_profiler_exit()
+{
+    int depth = --FlyableProfileDepth;
+    if (depth < 0)
+    {
+        FlyableProfileDepth = 0;
+        return;
+    }
+
+    if (depth >= FLYABLE_PROFILE_MAX_DEPTH || FlyableProfile == NULL)
+        return;
+
+    FlyableProfileFrame* frame = &FlyableProfileStack[depth];
+    if (frame->node == FLYABLE_PROFILE_NOT_RECORDED)
+        return;
+
+    uint64_t elapsed = flyable_profiler_read_cycles() - frame->start;
+    FlyableProfileNode* node = &FlyableProfileNodes[frame->node];
+    ++node->calls;
+    node->cycles += elapsed;
+    ++FlyableProfileFuncs[node->func].calls;
+    FlyableProfileNodes[node->parent].childCycles += elapsed;
+}
+
+//Returns the site of the id slot, registering it on the first call. Returns NULL if the site can't be recorded
+static FlyableProfileSite* flyable_profiler_get_site(int32_t* id, const char* key, FlyableProfileSiteKind kind)
+{
+    if (*id == 0)
+    {
+        if (!flyable_profiler_init() || FlyableProfile->sitesCount >= FLYABLE_PROFILE_MAX_SITES)
+        {
+            *id = -1;
+            return NULL;
+        }
+
+        FlyableProfileSite* site = &FlyableProfileSites[FlyableProfile->sitesCount];
+        strncpy(site->key, key, FLYABLE_PROFILE_SITE_KEY_SIZE - 1);
+        site->kind = kind;
+        *id = (int32_t) ++FlyableProfile->sitesCount; //The slot keeps the index + 1 since 0 means not registered
+    }
+    return *id > 0 ? &FlyableProfileSites[*id - 1] : NULL;
+}
+
+void flyable_profiler_branch(int32_t* id, const char* key, int32_t taken)
+{
+    FlyableProfileSite* site = flyable_profiler_get_site(id, key, FLYABLE_PROFILE_SITE_BRANCH);
+    if (site != NULL)
+        ++site->counts[taken ? 0 : 1];
+}
+
+void flyable_profiler_call(int32_t* id, const char* key, int32_t argsCount)
+{
+    FlyableProfileSite* site = flyable_profiler_get_site(id, key, FLYABLE_PROFILE_SITE_CALL);
+    if (site != NULL)
+    {
+        ++site->counts[0];
+        site->argsCount = (uint32_t) argsCount;
+    }
+}
+
+void flyable_profiler_call_arg_mask(int32_t* id, int32_t index, int32_t mask)
+{
+    //The site got registered by the call
+    if (*id > 0 && index >= 0 && index < FLYABLE_PROFILE_MAX_SITE_ARGS)
+        FlyableProfileSites[*id - 1].argTypes[index] |= (uint8_t) mask;
+}
+
+void flyable_profiler_call_arg(int32_t* id, int32_t index, PyObject* arg)
+{
+    int32_t mask = FLYABLE_PROFILE_TYPE_OTHER;
+    if (PyBool_Check(arg))
+        mask = FLYABLE_PROFILE_TYPE_BOOL;
+    else if (PyLong_CheckExact(arg))
+    {
+        int overflow;
+        PyLong_AsLongLongAndOverflow(arg, &overflow);
+        mask = overflow == 0 ? FLYABLE_PROFILE_TYPE_INT : FLYABLE_PROFILE_TYPE_OTHER;
+    }
+    else if (PyFloat_CheckExact(arg))
+        mask = FLYABLE_PROFILE_TYPE_FLOAT;
+    else if (PyList_CheckExact(arg))
+        mask = FLYABLE_PROFILE_TYPE_LIST;
+
+    flyable_profiler_call_arg_mask(id, index, mask);
+}
@@ -0,0 +1,91 @@
+#ifndef PROFILER_H_INCLUDED
+#define PROFILER_H_INCLUDED
+#include <Python.h>
+#include <stdint.h>
+
+/*
+Profiler of the compiled functions, enabled when the compiler instruments the generated code.
+Every instrumented function calls flyable_profiler_enter when it starts and flyable_profiler_exit before it returns.
+The counters are kept in a calling context tree stored inside a shared memory table, mapped from the file named by
+the FLYABLE_PROFILE environment variable (flyable_profile.bin by default). The table can be read while the program
+runs, and stays in the file once it exits. The layout must match flyable/tool/profile_dump.py
+
+The table also holds the sites recorded for the profile guided optimization: how often each branch is taken, and
+the calls made by each call site with the types of their arguments. A site is identified by a key built by the
+compiler from its location, so the next compilation can find it back.
+*/
+
+#define FLYABLE_PROFILE_MAGIC 0x50594C46 //"FLYP"
+#define FLYABLE_PROFILE_VERSION 2
+#define FLYABLE_PROFILE_NAME_SIZE 120
+#define FLYABLE_PROFILE_MAX_FUNCS 4096
+#define FLYABLE_PROFILE_MAX_NODES 65536
+#define FLYABLE_PROFILE_SITE_KEY_SIZE 104
+#define FLYABLE_PROFILE_MAX_SITE_ARGS 8
+#define FLYABLE_PROFILE_MAX_SITES 16384
+
+typedef struct FlyableProfileHeader {
+    uint32_t magic;
+    uint32_t version;
+    uint32_t funcsCount;
+    uint32_t nodesCount;
+    uint32_t maxFuncs;
+    uint32_t maxNodes;
+    uint32_t sitesCount;
+    uint32_t maxSites;
+} FlyableProfileHeader;
+
+typedef struct FlyableProfileFunc {
+    char name[FLYABLE_PROFILE_NAME_SIZE];
+    uint64_t calls;
+} FlyableProfileFunc;
+
+//A function called from a specific chain of calls. The node 0 is the root, outside any instrumented function
+typedef struct FlyableProfileNode {
+    uint32_t parent;
+    uint32_t func;
+    uint32_t firstChild;
+    uint32_t nextSibling;
+    uint64_t calls;
+    uint64_t cycles; //Cycles spent in the function, including the functions it called
+    uint64_t childCycles; //Cycles spent in the instrumented functions it called
+} FlyableProfileNode;
+
+typedef enum FlyableProfileSiteKind {
+    FLYABLE_PROFILE_SITE_BRANCH = 1,
+    FLYABLE_PROFILE_SITE_CALL = 2
+} FlyableProfileSiteKind;
+
+//Types seen for an argument of a call site
+typedef enum FlyableProfileTypeMask {
+    FLYABLE_PROFILE_TYPE_INT = 1, //Int fitting 64 bits
+    FLYABLE_PROFILE_TYPE_FLOAT = 2,
+    FLYABLE_PROFILE_TYPE_BOOL = 4,
+    FLYABLE_PROFILE_TYPE_LIST = 8,
+    FLYABLE_PROFILE_TYPE_OTHER = 16
+} FlyableProfileTypeMask;
+
+typedef struct FlyableProfileSite {
+    char key[FLYABLE_PROFILE_SITE_KEY_SIZE];
+    uint32_t kind;
+    uint32_t argsCount;
+    uint64_t counts[2]; //Branch taken and not taken, or calls made by a call site
+    uint8_t argTypes[FLYABLE_PROFILE_MAX_SITE_ARGS]; //Mask of the types seen for each argument of a call site
+} FlyableProfileSite;
+
+//The id slot is a zero initialized global of the function, filled with its id on the first call
+void flyable_profiler_enter(int32_t* id, const char* name);
+
+void flyable_profiler_exit();
+
+//The site id slots follow the same rules as the function id slots
+void flyable_profiler_branch(int32_t* id, const char* key, int32_t taken);
+
+void flyable_profiler_call(int32_t* id, const char* key, int32_t argsCount);
+
+void flyable_profiler_call_arg(int32_t* id, int32_t index, PyObject* arg);
+
+//Record the type of an argument already known when compiling, mask being a FlyableProfileTypeMask
+void flyable_profiler_call_arg_mask(int32_t* id, int32_t index, int32_t mask);
+
+#endif // PROFILER_H_INCLUDED